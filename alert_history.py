@@ -0,0 +1,220 @@
+import datetime
+import os
+import threading
+from datetime import timezone
+
+import numpy as np
+
+from alert_levels import NIVEIS
+
+# --- Histórico de Eventos de Alerta ---
+# Cada mudança de nível (chuva 72h ou solo) de uma estação vira um registro
+# fixo de 23 bytes (DTYPE_EVENTO) anexado a DIRETORIO/<estacao>/alertas.bin.
+# Em memória fica um array por estação em ordem de timestamp (o da leitura que
+# disparou a mudança): o índice é a própria estação + busca binária no tempo.
+# Workers leitores não avaliam alertas; eles leem só os bytes novos do arquivo
+# quando o tamanho muda.
+#
+# Retenção: expurgar() tira os eventos anteriores ao corte e reescreve o
+# arquivo (novo inode, então os leitores recarregam do começo). O último
+# evento de cada tipo antes do corte fica, porque ele define o nível em vigor.
+#
+# A faixa de linha do tempo dos gráficos não desenha um retângulo por evento:
+# intervalos_de_nivel() divide o período em até MAX_FAIXAS_TIMELINE partes,
+# pega o pior nível de cada uma e junta as vizinhas de mesmo nível.
+
+TIPOS_ALERTA = ("chuva", "solo")
+DTYPE_EVENTO = np.dtype([
+    ("timestamp", "<i8"),
+    ("tipo", "u1"),               # Índice em TIPOS_ALERTA
+    ("de", "i1"),                 # Índices em NIVEIS
+    ("para", "i1"),
+    ("valores", "<f4", (3,)),     # Chuva: (acumulado 72h, NaN, NaN); solo: umidades de 1/2/3 m
+])
+NOME_ARQUIVO = "alertas.bin"
+MAX_FAIXAS_TIMELINE = 300
+
+
+class HistoricoAlertas:
+    def __init__(self, diretorio=None):
+        """`diretorio` None: só em memória."""
+        self.diretorio = diretorio
+        self._eventos = {}  # estacao -> array DTYPE_EVENTO em ordem de timestamp
+        self._bytes_lidos = {}  # estacao -> (inode, bytes já carregados) do arquivo
+        self._lock = threading.Lock()
+        self.recarregar()
+
+    def _caminho(self, estacao):
+        return os.path.join(self.diretorio, estacao, NOME_ARQUIVO)
+
+    def recarregar(self):
+        """Carrega o que outro processo anexou aos arquivos desde a última leitura."""
+        if self.diretorio is None:
+            return
+        presentes = set(os.listdir(self.diretorio)) if os.path.isdir(self.diretorio) else set()
+        with self._lock:
+            for estacao in list(self._eventos):
+                if estacao not in presentes or not os.path.exists(self._caminho(estacao)):
+                    self._eventos.pop(estacao)  # Arquivo apagado (reinício da simulação)
+                    self._bytes_lidos.pop(estacao, None)
+        for estacao in presentes:
+            try:
+                info = os.stat(self._caminho(estacao))
+            except FileNotFoundError:
+                continue
+            tamanho = info.st_size // DTYPE_EVENTO.itemsize * DTYPE_EVENTO.itemsize
+            with self._lock:
+                arquivo, lidos = self._bytes_lidos.get(estacao, (None, 0))
+                if arquivo != info.st_ino:  # Arquivo novo ou recriado: lê do começo
+                    lidos = 0
+                    self._eventos.pop(estacao, None)
+                elif tamanho == lidos:
+                    continue
+                novos = np.fromfile(self._caminho(estacao), dtype=DTYPE_EVENTO,
+                                    count=(tamanho - lidos) // DTYPE_EVENTO.itemsize, offset=lidos)
+                eventos = np.concatenate((self._eventos.get(estacao, novos[:0]), novos))
+                if np.any(np.diff(eventos["timestamp"]) < 0):
+                    eventos = eventos[np.argsort(eventos["timestamp"], kind="stable")]
+                self._eventos[estacao] = eventos
+                self._bytes_lidos[estacao] = (info.st_ino, tamanho)
+
+    def registrar(self, estacao, tipo, de, para, timestamp, valores=()):
+        """Anexa a mudança de nível `de` -> `para` (nomes de NIVEIS) de `tipo` ("chuva"/"solo")."""
+        evento = np.zeros(1, dtype=DTYPE_EVENTO)
+        evento["timestamp"] = int(timestamp)
+        evento["tipo"] = TIPOS_ALERTA.index(tipo)
+        evento["de"] = NIVEIS.index(de)
+        evento["para"] = NIVEIS.index(para)
+        evento["valores"] = np.nan
+        evento["valores"][0, :len(valores)] = valores
+        with self._lock:
+            eventos = self._eventos.get(estacao, np.zeros(0, dtype=DTYPE_EVENTO))
+            posicao = np.searchsorted(eventos["timestamp"], evento["timestamp"][0], side="right")
+            self._eventos[estacao] = np.concatenate((eventos[:posicao], evento, eventos[posicao:]))
+            if self.diretorio is not None:
+                os.makedirs(os.path.dirname(self._caminho(estacao)), exist_ok=True)
+                with open(self._caminho(estacao), "ab") as arquivo:
+                    arquivo.write(evento.tobytes())
+                    self._bytes_lidos[estacao] = (os.fstat(arquivo.fileno()).st_ino, arquivo.tell())
+
+    def expurgar(self, corte_epoch):
+        """Remove os eventos anteriores a `corte_epoch` (menos o último de cada tipo). Devolve quantos saíram."""
+        removidos = 0
+        with self._lock:
+            for estacao, eventos in list(self._eventos.items()):
+                antigos = int(np.searchsorted(eventos["timestamp"], corte_epoch, side="left"))
+                manter = np.zeros(antigos, dtype=bool)
+                for tipo in range(len(TIPOS_ALERTA)):
+                    do_tipo = np.flatnonzero(eventos["tipo"][:antigos] == tipo)
+                    if len(do_tipo):
+                        manter[do_tipo[-1]] = True
+                if manter.all():
+                    continue
+                restantes = np.concatenate((eventos[:antigos][manter], eventos[antigos:]))
+                removidos += antigos - int(np.count_nonzero(manter))
+                self._eventos[estacao] = restantes
+                if self.diretorio is not None:
+                    caminho = self._caminho(estacao)
+                    temporario = caminho + ".tmp"
+                    restantes.tofile(temporario)
+                    os.replace(temporario, caminho)
+                    self._bytes_lidos[estacao] = (os.stat(caminho).st_ino, restantes.nbytes)
+        return removidos
+
+    def limpar(self):
+        with self._lock:
+            if self.diretorio is not None:
+                for estacao in self._eventos:
+                    if os.path.exists(self._caminho(estacao)):
+                        os.remove(self._caminho(estacao))
+            self._eventos = {}
+            self._bytes_lidos = {}
+
+    def estacoes(self):
+        return sorted(self._eventos)
+
+    def eventos(self, estacao, inicio=None, fim=None, tipo=None):
+        """Eventos de [inicio, fim] da estação, em ordem de timestamp (view; não modificar)."""
+        eventos = self._eventos.get(estacao, np.zeros(0, dtype=DTYPE_EVENTO))
+        timestamps = eventos["timestamp"]
+        eventos = eventos[np.searchsorted(timestamps, inicio, side="left") if inicio is not None else 0:
+                          np.searchsorted(timestamps, fim, side="right") if fim is not None else len(eventos)]
+        if tipo is not None:
+            eventos = eventos[eventos["tipo"] == TIPOS_ALERTA.index(tipo)]
+        return eventos
+
+    def nivel_em(self, estacao, tipo, timestamp):
+        """Índice do nível em vigor em `timestamp` (Livre antes do primeiro evento)."""
+        anteriores = self.eventos(estacao, fim=timestamp, tipo=tipo)
+        return int(anteriores["para"][-1]) if len(anteriores) else 0
+
+    def ultimo_nivel(self, estacao, tipo):
+        eventos = self.eventos(estacao, tipo=tipo)
+        return NIVEIS[eventos["para"][-1]] if len(eventos) else NIVEIS[0]
+
+    def consultar(self, estacao=None, tipo=None, inicio=None, fim=None, limite=50, pagina=1):
+        """Página de eventos, mais recentes primeiro (todas as estações se `estacao` for None)."""
+        estacoes = [estacao] if estacao is not None else self.estacoes()
+        partes = [(nome, self.eventos(nome, inicio, fim, tipo)) for nome in estacoes]
+        total = sum(len(eventos) for _, eventos in partes)
+        if len(partes) == 1:
+            nomes = np.full(total, estacoes[0], dtype=object)
+            eventos = partes[0][1]
+        else:
+            nomes = np.concatenate([np.full(len(e), nome, dtype=object) for nome, e in partes] or [np.zeros(0, object)])
+            eventos = np.concatenate([e for _, e in partes] or [np.zeros(0, dtype=DTYPE_EVENTO)])
+            ordem = np.argsort(eventos["timestamp"], kind="stable")
+            nomes, eventos = nomes[ordem], eventos[ordem]
+        limite = max(1, int(limite))
+        pagina = max(1, int(pagina))
+        # Mais recentes primeiro: a página p cobre as posições [total - p*limite, total - (p-1)*limite)
+        fim_pagina = max(total - (pagina - 1) * limite, 0)
+        inicio_pagina = max(fim_pagina - limite, 0)
+        itens = [_evento_para_dict(nome, evento)
+                 for nome, evento in zip(nomes[inicio_pagina:fim_pagina][::-1], eventos[inicio_pagina:fim_pagina][::-1])]
+        return {"total": total, "pagina": pagina, "limite": limite, "paginas": -(-total // limite), "itens": itens}
+
+    def bytes_em_disco(self):
+        return sum(lidos for _, lidos in self._bytes_lidos.values())
+
+
+def _evento_para_dict(estacao, evento):
+    tipo = TIPOS_ALERTA[evento["tipo"]]
+    valores = [None if np.isnan(v) else round(float(v), 2) for v in evento["valores"]]
+    dado = {"estacao": estacao,
+            "timestamp": datetime.datetime.fromtimestamp(int(evento["timestamp"]), tz=timezone.utc).isoformat(),
+            "tipo": tipo, "de": NIVEIS[evento["de"]], "para": NIVEIS[evento["para"]]}
+    if tipo == "chuva":
+        dado["acumulado_72h"] = valores[0]
+    else:
+        dado["umidade_1m_perc"], dado["umidade_2m_perc"], dado["umidade_3m_perc"] = valores
+    return dado
+
+
+def intervalos_de_nivel(historico, estacao, tipo, inicio, fim, faixas=MAX_FAIXAS_TIMELINE):
+    """Intervalos (inicio, fim, índice do nível) acima de Livre em [inicio, fim], com no máximo `faixas` partes.
+
+    Cada parte fica com o pior nível em vigor nela; partes vizinhas de mesmo nível viram um intervalo.
+    """
+    inicio, fim = int(inicio), int(fim)
+    if fim <= inicio:
+        return []
+    faixas = max(1, min(int(faixas), fim - inicio))
+    largura = (fim - inicio) / faixas
+    limites = inicio + np.arange(faixas + 1) * largura
+    eventos = historico.eventos(estacao, inicio, fim, tipo)
+
+    # Nível no início de cada parte (último evento antes dele) e o maior nível que começa dentro dela
+    pior = np.full(faixas, historico.nivel_em(estacao, tipo, inicio), dtype=np.int64)
+    if len(eventos):
+        antes = np.searchsorted(eventos["timestamp"], limites[:-1], side="right")
+        para = eventos["para"].astype(np.int64)
+        pior = np.where(antes > 0, para[np.maximum(antes, 1) - 1], pior)
+        parte = np.minimum(((eventos["timestamp"] - inicio) / largura).astype(np.int64), faixas - 1)
+        np.maximum.at(pior, parte, para)
+
+    # Junta partes vizinhas de mesmo nível
+    muda = np.flatnonzero(np.diff(pior)) + 1
+    comecos = np.concatenate(([0], muda))
+    finais = np.concatenate((muda, [faixas]))
+    return [(float(limites[a]), float(limites[b]), int(pior[a])) for a, b in zip(comecos, finais) if pior[a] > 0]
@@ -0,0 +1,75 @@
+import numpy as np
+
+from simulator import UMIDADE_BASE_1M, UMIDADE_BASE_2M, UMIDADE_BASE_3M
+
+# --- Níveis Operacionais (Chuva 72h e Umidade do Solo) ---
+# Fonte única dos limiares, usada pela API, pelo dashboard, pelo monitor de
+# alertas e pelos relatórios (que rodam também em processos separados).
+
+NIVEIS = ("Livre", "Atenção", "Alerta", "Paralização")
+CORES = ("green", "gold", "orange", "red")
+
+LIMIARES_CHUVA_72H = (51, 70, 90)  # Atenção, Alerta, Paralização
+LIMIAR_SOLO_1M = UMIDADE_BASE_1M + 5.0
+LIMIAR_SOLO_2M = UMIDADE_BASE_2M + 5.0
+LIMIAR_SOLO_3M = UMIDADE_BASE_3M + 1.0
+
+
+# --- Função Auxiliar para Calcular Nível de Umidade ---
+def calculate_soil_alert(current_data):
+    soil_alert_level = "Livre";
+    soil_alert_color = "green"
+    is_above_1m, is_above_2m, is_above_3m = False, False, False
+    if len(current_data):
+        last_data = current_data[-1]
+        current_1m = float(last_data['umidade_1m_perc'])
+        current_2m = float(last_data['umidade_2m_perc'])
+        current_3m = float(last_data['umidade_3m_perc'])
+        is_above_1m = current_1m >= LIMIAR_SOLO_1M
+        is_above_2m = current_2m >= LIMIAR_SOLO_2M
+        is_above_3m = current_3m >= LIMIAR_SOLO_3M
+
+    if is_above_1m and is_above_2m and is_above_3m:
+        soil_alert_level, soil_alert_color = "Paralização", "red"
+    elif is_above_2m and is_above_3m:
+        soil_alert_level, soil_alert_color = "Alerta", "orange"
+    elif is_above_1m and is_above_2m:
+        soil_alert_level, soil_alert_color = "Alerta", "orange"
+    elif is_above_3m:
+        soil_alert_level, soil_alert_color = "Atenção", "gold"
+    elif is_above_1m:
+        soil_alert_level, soil_alert_color = "Atenção", "gold"
+    return soil_alert_level, soil_alert_color
+
+
+# --- Funções Auxiliares para o Nível de Chuva e Alturas das Barras do Mapa ---
+def calculate_rain_alert(accumulated_72h):
+    indice = sum(accumulated_72h >= limiar for limiar in LIMIARES_CHUVA_72H)
+    return NIVEIS[indice], CORES[indice]
+
+
+def soil_height_percent(level):
+    if level == "Atenção":
+        return 50
+    elif level == "Alerta":
+        return 75
+    elif level == "Paralização":
+        return 100
+    return 15
+
+
+# --- Versões Vetorizadas (índice em NIVEIS por leitura) ---
+def soil_alert_indices(umidade_1m, umidade_2m, umidade_3m):
+    acima_1m = np.asarray(umidade_1m) >= LIMIAR_SOLO_1M
+    acima_2m = np.asarray(umidade_2m) >= LIMIAR_SOLO_2M
+    acima_3m = np.asarray(umidade_3m) >= LIMIAR_SOLO_3M
+    indices = np.zeros(acima_1m.shape, dtype=np.int8)
+    indices[acima_1m | acima_3m] = 1
+    indices[(acima_2m & acima_3m) | (acima_1m & acima_2m)] = 2
+    indices[acima_1m & acima_2m & acima_3m] = 3
+    return indices
+
+
+def rain_alert_indices(accumulated_72h):
+    acumulado = np.asarray(accumulated_72h)
+    return sum((acumulado >= limiar).astype(np.int8) for limiar in LIMIARES_CHUVA_72H)
@@ -0,0 +1,306 @@
+"""Geração de relatórios PDF em lote (diários e semanais) para todas as estações.
+
+A agregação (passagem única sobre os blocos de leituras) roda no processo que
+tem os dados; só o ResumoRelatorio, com tamanho limitado, vai para o pool de
+processos, onde ficam gráficos (kaleido) e montagem do PDF. Cada worker
+inicializa kaleido e estilos uma única vez (reports.preparar_renderizacao).
+
+Os PDFs vão para DIRETORIO/<estacao>/ e cada lote grava um manifest JSON.
+
+Uso (lendo da memória compartilhada de um produtor em execução):
+    python batch_reports.py --diretorio relatorios --periodos diario,semanal --processos 4
+Para medir a vazão sem servidor, com histórico simulado:
+    python batch_reports.py --simular-dias 60 --repeticoes 5 --processos 1,2,4
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timezone
+
+from logs import configurar_logs, obter_logger
+from profiling import fase
+from reports import AcumuladorRelatorio, SEGUNDOS_DIA, construir_pdf, preparar_renderizacao
+from windows import INTERVALO_LEITURA_SEG, JANELA_CHUVA_72H_SEG
+
+PERIODOS = {"diario": 1, "semanal": 7}
+# Histórico que o simulador precisa ver (janela de 72h + 1 h de folga)
+LEITURAS_HISTORICO_SIMULADOR = JANELA_CHUVA_72H_SEG // INTERVALO_LEITURA_SEG + 6
+NOME_MANIFEST = "manifest.json"
+
+log = obter_logger("relatorios")
+
+
+class JobRelatorio:
+    __slots__ = ("estacao", "periodo", "inicio", "fim")
+
+    def __init__(self, estacao, periodo, inicio, fim):
+        self.estacao = estacao
+        self.periodo = periodo
+        self.inicio = inicio  # datas (UTC), inclusivas
+        self.fim = fim
+
+    def nome_arquivo(self):
+        return os.path.join(self.estacao, f"{self.periodo}_{self.inicio.isoformat()}_a_{self.fim.isoformat()}.pdf")
+
+    def epochs(self):
+        inicio = datetime.datetime(self.inicio.year, self.inicio.month, self.inicio.day, tzinfo=timezone.utc)
+        return int(inicio.timestamp()), int(inicio.timestamp()) + ((self.fim - self.inicio).days + 1) * SEGUNDOS_DIA - 1
+
+
+def jobs_para(estacoes, periodos, ultimo_dia, semanas_fechadas=False):
+    """Relatórios de cada estação/período terminando em `ultimo_dia`.
+
+    Com semanas_fechadas=True (job agendado), o semanal só sai quando
+    `ultimo_dia` é domingo, cobrindo a semana de segunda a domingo.
+    """
+    jobs = []
+    for estacao in estacoes:
+        for periodo in periodos:
+            dias = PERIODOS[periodo]
+            if semanas_fechadas and periodo == "semanal" and ultimo_dia.weekday() != 6:
+                continue
+            jobs.append(JobRelatorio(estacao, periodo, ultimo_dia - datetime.timedelta(days=dias - 1), ultimo_dia))
+    return jobs
+
+
+def dias_completos(registros):
+    """(primeiro, último) dia UTC inteiramente coberto pelas leituras, ou None."""
+    if not len(registros):
+        return None
+    primeira = datetime.datetime.fromtimestamp(int(registros["timestamp"][0]), tz=timezone.utc)
+    ultima = datetime.datetime.fromtimestamp(int(registros["timestamp"][-1]), tz=timezone.utc)
+    primeiro_dia = primeira.date() if (primeira.hour, primeira.minute) == (0, 0) else primeira.date() + datetime.timedelta(days=1)
+    # O dia da última leitura só está completo se ela for a das 23:50
+    ultimo_dia = ultima.date() if (ultima.hour, ultima.minute) == (23, 50) else ultima.date() - datetime.timedelta(days=1)
+    return (primeiro_dia, ultimo_dia) if primeiro_dia <= ultimo_dia else None
+
+
+def _renderizar(resumo, inicio, fim, estacao, caminho):
+    # Roda no worker: estilos/kaleido já estão prontos (initializer)
+    inicio_render = time.perf_counter()
+    pdf_bytes = construir_pdf(resumo, inicio, fim, estacao=estacao)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(pdf_bytes)
+    os.replace(temporario, caminho)
+    return len(pdf_bytes), (time.perf_counter() - inicio_render) * 1000
+
+
+class GeradorLote:
+    """Pool de processos persistente para renderizar relatórios."""
+
+    def __init__(self, diretorio, processos=None):
+        self.diretorio = diretorio
+        self.processos = processos or max(1, (os.cpu_count() or 2) - 1)
+        self._pool = None
+        self._em_andamento = set()  # Arquivos enviados ao pool e ainda sem manifest
+        self._lock = threading.Lock()
+
+    def _obter_pool(self):
+        if self._pool is None:
+            # "spawn": o processo pai tem threads (uvicorn, agendador), fork não é seguro.
+            # Os workers são persistentes, então o custo de subir cada um só é pago uma vez.
+            self._pool = ProcessPoolExecutor(max_workers=self.processos,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=preparar_renderizacao)
+        return self._pool
+
+    def aquecer(self):
+        """Sobe todos os workers (cada um inicializa kaleido e estilos)."""
+        pool = self._obter_pool()
+        for futuro in [pool.submit(time.sleep, 0.5) for _ in range(self.processos)]:
+            futuro.result()
+
+    def ja_gerado(self, job):
+        return os.path.exists(os.path.join(self.diretorio, job.nome_arquivo()))
+
+    def em_andamento(self, job):
+        with self._lock:
+            return job.nome_arquivo() in self._em_andamento
+
+    def gerar(self, jobs, fonte_blocos):
+        """Gera os PDFs dos jobs e grava o manifest do lote. Retorna o manifest.
+
+        `fonte_blocos(estacao, inicio_epoch, fim_epoch, aquecimento_seg)` devolve
+        os blocos de leituras da estação em ordem cronológica.
+        """
+        return self.enviar(jobs, fonte_blocos).result()
+
+    def enviar(self, jobs, fonte_blocos):
+        """Agrega os jobs aqui e envia a renderização ao pool sem esperar por ela.
+
+        Retorna um Future do manifest, resolvido (e gravado) quando o último PDF do lote termina.
+        """
+        pool = self._obter_pool()
+        inicio_lote = time.perf_counter()
+        pendentes = []
+        for job in jobs:
+            inicio_epoch, fim_epoch = job.epochs()
+            inicio_agregacao = time.perf_counter()
+            with fase("agregacao"):
+                acumulador = AcumuladorRelatorio(inicio_epoch, fim_epoch)
+                for bloco in fonte_blocos(job.estacao, inicio_epoch, fim_epoch, JANELA_CHUVA_72H_SEG):
+                    acumulador.adicionar(bloco)
+                resumo = acumulador.resumo()
+            entrada = {"estacao": job.estacao, "periodo": job.periodo, "inicio": job.inicio.isoformat(),
+                       "fim": job.fim.isoformat(), "arquivo": job.nome_arquivo(), "leituras": resumo.leituras,
+                       "agregacao_ms": round((time.perf_counter() - inicio_agregacao) * 1000, 2)}
+            futuro = None
+            if resumo.leituras:
+                futuro = pool.submit(_renderizar, resumo, job.inicio, job.fim, job.estacao,
+                                     os.path.join(self.diretorio, job.nome_arquivo()))
+                with self._lock:
+                    self._em_andamento.add(job.nome_arquivo())
+            else:
+                entrada["erro"] = "sem dados no período"
+            pendentes.append((entrada, futuro))
+
+        lote = Future()
+        futuros = [futuro for _, futuro in pendentes if futuro is not None]
+        restantes = [len(futuros)]
+
+        def ao_terminar(_):
+            # Roda na thread de controle do pool; o último PDF do lote fecha o manifest
+            with self._lock:
+                restantes[0] -= 1
+                if restantes[0]:
+                    return
+            try:
+                lote.set_result(self._concluir(pendentes, inicio_lote))
+            except Exception as e:
+                lote.set_exception(e)
+
+        if not futuros:
+            lote.set_result(self._concluir(pendentes, inicio_lote))
+        for futuro in futuros:
+            futuro.add_done_callback(ao_terminar)
+        return lote
+
+    def _concluir(self, pendentes, inicio_lote):
+        entradas = []
+        for entrada, futuro in pendentes:
+            if futuro is not None:
+                try:
+                    entrada["bytes"], render_ms = futuro.result()
+                    entrada["render_ms"] = round(render_ms, 2)
+                except Exception as e:
+                    entrada["erro"] = f"{type(e).__name__}: {e}"
+                    log.error("Falha no relatório em lote %s: %s", entrada['arquivo'], e)
+            entradas.append(entrada)
+        with self._lock:
+            self._em_andamento.difference_update(entrada["arquivo"] for entrada in entradas)
+
+        duracao_seg = time.perf_counter() - inicio_lote
+        gerados = sum(1 for entrada in entradas if "erro" not in entrada)
+        manifest = {
+            "gerado_em": datetime.datetime.now(timezone.utc).isoformat(),
+            "processos": self.processos,
+            "relatorios": gerados,
+            "falhas": len(entradas) - gerados,
+            "duracao_seg": round(duracao_seg, 3),
+            "relatorios_por_minuto": round(gerados * 60 / duracao_seg, 1) if duracao_seg > 0 else None,
+            "itens": entradas,
+        }
+        self._gravar_manifest(manifest)
+        return manifest
+
+    def _gravar_manifest(self, manifest):
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = os.path.join(self.diretorio, NOME_MANIFEST)
+        # Um manifest por lote (histórico), e o último também em manifest.json
+        historico = os.path.join(self.diretorio, f"manifest_{manifest['gerado_em'].replace(':', '')}.json")
+        for destino in (historico, caminho):
+            temporario = destino + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(manifest, arquivo, ensure_ascii=False, indent=2)
+            os.replace(temporario, destino)
+
+    def desligar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# --- CLI ---
+def _dados_memoria_compartilhada(nome):
+    from shared_store import SharedRingBuffer
+    buffer = SharedRingBuffer.anexar(nome)
+    try:
+        _, registros = buffer.ler_registros()  # Cópia: continua válida depois de fechar o segmento
+        return registros
+    finally:
+        buffer.fechar()
+
+
+def _dados_simulados(dias):
+    from readings import para_array
+    from simulator import SensorSimulator
+    simulador = SensorSimulator()
+    inicio = datetime.datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio -= datetime.timedelta(days=dias)
+    historico = []
+    for i in range(dias * 24 * 6):
+        historico.append(simulador.gerar_novo_dado(None, inicio + datetime.timedelta(minutes=10 * i), historico[-LEITURAS_HISTORICO_SIMULADOR:]))
+    return para_array(historico)
+
+
+def main(argv=None):
+    from readings import iterar_blocos
+    configurar_logs()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--diretorio", default=os.environ.get("DIRETORIO_RELATORIOS", "relatorios"))
+    parser.add_argument("--periodos", default="diario,semanal")
+    parser.add_argument("--processos", default=None, help="Número de processos (ou lista, ex.: 1,2,4)")
+    parser.add_argument("--data", default=None, help="Último dia dos relatórios (AAAA-MM-DD); padrão: último dia completo")
+    parser.add_argument("--estacoes", default=os.environ.get("ESTACAO_ID", "encosta-01"))
+    parser.add_argument("--memoria", default=os.environ.get("NOME_MEMORIA_COMPARTILHADA", "monitoramento_sensores"))
+    parser.add_argument("--simular-dias", type=int, default=0, help="Usa histórico simulado em vez da memória compartilhada")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Repete os jobs (medição de vazão)")
+    args = parser.parse_args(argv)
+
+    registros = _dados_simulados(args.simular_dias) if args.simular_dias else _dados_memoria_compartilhada(args.memoria)
+    if not len(registros):
+        log.warning("Sem leituras disponíveis.")
+        return
+    completos = dias_completos(registros)
+    if args.data:
+        ultimo_dia = datetime.date.fromisoformat(args.data)
+    elif completos:
+        ultimo_dia = completos[1]
+    else:
+        log.warning("Nenhum dia completo nas leituras; use --data.")
+        return
+    periodos = [p.strip() for p in args.periodos.split(",") if p.strip()]
+    estacoes = [e.strip() for e in args.estacoes.split(",") if e.strip()]
+
+    # Histórico único: todas as estações leem o mesmo armazenamento
+    def fonte_blocos(estacao, inicio_epoch, fim_epoch, aquecimento_seg):
+        return iterar_blocos(registros, inicio_epoch, fim_epoch, 6 * 24 * 7, aquecimento_seg)
+
+    # Cada repetição recua uma semana (arquivos distintos, mesmo custo por relatório)
+    jobs = [job for repeticao in range(args.repeticoes)
+            for job in jobs_para(estacoes, periodos, ultimo_dia - datetime.timedelta(days=7 * repeticao))]
+
+    for processos in [int(p) for p in args.processos.split(",")] if args.processos else [None]:
+        gerador = GeradorLote(args.diretorio, processos)
+        try:
+            inicio = time.perf_counter()
+            gerador.aquecer()  # Sobe o pool fora da medição
+            log.info("Pool com %d processo(s) pronto em %.1fs.", gerador.processos, time.perf_counter() - inicio)
+            manifest = gerador.gerar(jobs, fonte_blocos)
+        finally:
+            gerador.desligar()
+        log.info("%d processo(s): %d relatórios, %d falhas, %ss -> %s relatórios/min.", manifest['processos'],
+                 manifest['relatorios'], manifest['falhas'], manifest['duracao_seg'], manifest['relatorios_por_minuto'],
+                 extra={"campos": {"processos": manifest['processos'], "relatorios": manifest['relatorios'],
+                                   "relatorios_por_minuto": manifest['relatorios_por_minuto']}})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Mede a latência do dashboard sob carga concorrente.
+
+Com o servidor rodando (`python main.py`), dispara em paralelo:
+  - N clientes simulando o dcc.Interval (callbacks dos gráficos),
+  - R clientes gerando relatórios PDF em loop,
+  - 1 cliente consultando /health (reflete a latência do loop asyncio).
+
+Uso: python bench_dashboard.py [--url http://127.0.0.1:8000] [--clientes 16] [--relatorios 2] [--segundos 20]
+"""
+import argparse
+import asyncio
+import datetime
+import time
+
+import httpx
+
+PAYLOAD_GRAFICOS = {
+    "output": "..graph-pluviometria.figure...rain-alert-display.children..."
+              "report-date-picker.max_date_allowed...report-date-picker.min_date_allowed..",
+    "outputs": [{"id": "graph-pluviometria", "property": "figure"},
+                {"id": "rain-alert-display", "property": "children"},
+                {"id": "report-date-picker", "property": "max_date_allowed"},
+                {"id": "report-date-picker", "property": "min_date_allowed"}],
+    "inputs": [{"id": "interval-main", "property": "n_intervals", "value": 1},
+               {"id": "periodo-dropdown", "property": "value", "value": 72}],
+    "changedPropIds": ["interval-main.n_intervals"],
+}
+
+PAYLOAD_UMIDADE = {
+    "output": "..graph-umidade.figure...soil-alert-display.children..",
+    "outputs": [{"id": "graph-umidade", "property": "figure"},
+                {"id": "soil-alert-display", "property": "children"}],
+    "inputs": [{"id": "interval-main", "property": "n_intervals", "value": 1},
+               {"id": "periodo-dropdown", "property": "value", "value": 72}],
+    "changedPropIds": ["interval-main.n_intervals"],
+}
+
+
+def _payload_relatorio():
+    hoje = datetime.datetime.now(datetime.timezone.utc).date()
+    inicio = hoje - datetime.timedelta(days=7)
+    return {
+        "output": "download-pdf-report.data",
+        "outputs": {"id": "download-pdf-report", "property": "data"},
+        "inputs": [{"id": "btn-generate-report", "property": "n_clicks", "value": 1}],
+        "state": [{"id": "report-date-picker", "property": "start_date", "value": inicio.isoformat()},
+                  {"id": "report-date-picker", "property": "end_date", "value": hoje.isoformat()}],
+        "changedPropIds": ["btn-generate-report.n_clicks"],
+    }
+
+
+def _resumo(nome, latencias_ms, erros):
+    if not latencias_ms:
+        print(f"{nome:<12} sem amostras (erros={erros})")
+        return
+    ordenadas = sorted(latencias_ms)
+
+    def p(q):
+        return ordenadas[min(len(ordenadas) - 1, int(q / 100.0 * (len(ordenadas) - 1)))]
+
+    print(f"{nome:<12} n={len(ordenadas):<5} p50={p(50):8.1f} ms  p95={p(95):8.1f} ms  "
+          f"p99={p(99):8.1f} ms  max={ordenadas[-1]:8.1f} ms  erros={erros}")
+
+
+async def _cliente(client, metodo, caminho, payload, fim, latencias, erros, pausa):
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        try:
+            if metodo == "POST":
+                resposta = await client.post(caminho, json=payload)
+            else:
+                resposta = await client.get(caminho)
+            if resposta.status_code == 200:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            else:
+                erros[0] += 1
+        except httpx.HTTPError:
+            erros[0] += 1
+        await asyncio.sleep(pausa)
+
+
+async def executar(url, clientes, relatorios, segundos):
+    limites = httpx.Limits(max_connections=clientes + relatorios + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=120.0, limits=limites) as client:
+        fim = time.perf_counter() + segundos
+        resultados = {nome: ([], [0]) for nome in ("callbacks", "relatorio", "health")}
+        tarefas = []
+        for i in range(clientes):
+            payload = PAYLOAD_GRAFICOS if i % 2 == 0 else PAYLOAD_UMIDADE
+            tarefas.append(_cliente(client, "POST", "/dashboard/_dash-update-component", payload, fim,
+                                    *resultados["callbacks"], pausa=0.0))
+        for _ in range(relatorios):
+            tarefas.append(_cliente(client, "POST", "/dashboard/_dash-update-component", _payload_relatorio(), fim,
+                                    *resultados["relatorio"], pausa=0.0))
+        tarefas.append(_cliente(client, "GET", "/health", None, fim, *resultados["health"], pausa=0.05))
+        await asyncio.gather(*tarefas)
+    print(f"--- {clientes} clientes de callback, {relatorios} de relatório, {segundos}s ---")
+    for nome, (latencias, erros) in resultados.items():
+        _resumo(nome, latencias, erros[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--relatorios", type=int, default=2)
+    parser.add_argument("--segundos", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(executar(args.url, args.clientes, args.relatorios, args.segundos))
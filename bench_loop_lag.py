@@ -0,0 +1,108 @@
+"""Mede o atraso (lag) do loop asyncio causado pelos logs, antes e depois da fila.
+
+Uma corrotina sonda dorme 1 ms repetidamente e registra quanto acordou atrasada.
+Ao mesmo tempo, rajadas de mensagens no padrão do envio de alertas/SMS são
+escritas do próprio loop em:
+  - "print": print síncrono (comportamento anterior);
+  - "logs":  logs.py (QueueHandler + QueueListener, JSON lines).
+O destino é um pipe lido devagar por outro processo (stdout de um coletor de
+logs lento ou terminal travado). Com o pipe cheio, o print bloqueia o loop.
+
+Uso: python bench_loop_lag.py [--segundos 5] [--rajada 40] [--leitor-kb-s 256]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+# Leitor lento: consome o pipe a uma taxa fixa (KB/s)
+LEITOR_LENTO = """
+import sys, time
+taxa = float(sys.argv[1]) * 1024
+while True:
+    bloco = sys.stdin.buffer.read1(4096)
+    if not bloco:
+        break
+    time.sleep(len(bloco) / taxa)
+"""
+
+PAYLOAD_EXEMPLO = {"Sender": "RiskGeo", "Receivers": "5511987654321",
+                   "Content": "ALERTA PARALIZACAO (Chuva): Acum. 72h=91.3mm. Nivel ant: Alerta. Hora: 10:40"}
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100.0 * (len(ordenados) - 1)))] if ordenados else 0.0
+
+
+async def _sonda(lags_ms, fim):
+    while time.perf_counter() < fim:
+        antes = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags_ms.append(max(0.0, (time.perf_counter() - antes - 0.001) * 1000))
+
+
+async def _rajadas(escrever, tamanho, fim):
+    enviadas = 0
+    while time.perf_counter() < fim:
+        for i in range(tamanho):
+            escrever(i)
+            enviadas += 1
+        await asyncio.sleep(0.01)
+    return enviadas
+
+
+async def _medir(modo, segundos, rajada, destino):
+    if modo == "print":
+        def escrever(i):
+            print("--- LOG DE SMS (FUNÇÃO INVOCADA) ---", file=destino)
+            print(f"Payload (Form Data) a ser enviado para a API SMS: {PAYLOAD_EXEMPLO} #{i}", file=destino)
+    else:
+        import logs
+        logs.configurar_logs(nivel="DEBUG", destino=destino)
+        log = logs.obter_logger("bench")
+
+        def escrever(i):
+            log.info("Envio de SMS solicitado.", extra={"campos": {"mensagem": PAYLOAD_EXEMPLO["Content"]}})
+            log.info("Enviando requisição para a API da Comtele. #%d", i, extra={"campos": {"payload": PAYLOAD_EXEMPLO}})
+
+    lags_ms = []
+    fim = time.perf_counter() + segundos
+    _, enviadas = await asyncio.gather(_sonda(lags_ms, fim), _rajadas(escrever, rajada, fim))
+    resultado = {"modo": modo, "amostras": len(lags_ms), "mensagens": enviadas * 2,
+                 "lag_p50_ms": _percentil(lags_ms, 50), "lag_p99_ms": _percentil(lags_ms, 99),
+                 "lag_max_ms": max(lags_ms) if lags_ms else 0.0}
+    if modo == "logs":
+        import logs
+        resultado["descartadas"] = logs.estatisticas_logs()["descartados_fila_cheia"]
+        logs.parar_logs()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--rajada", type=int, default=40, help="Alertas por rajada (2 mensagens cada), a cada 10 ms")
+    parser.add_argument("--leitor-kb-s", type=float, default=256.0, help="Taxa do leitor lento do pipe")
+    args = parser.parse_args()
+
+    for modo in ("print", "logs"):
+        leitor = subprocess.Popen([sys.executable, "-c", LEITOR_LENTO, str(args.leitor_kb_s)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        destino = os.fdopen(leitor.stdin.fileno(), "w", buffering=1, encoding="utf-8", closefd=False)
+        try:
+            r = asyncio.run(_medir(modo, args.segundos, args.rajada, destino))
+        finally:
+            destino.close()
+            leitor.stdin.close()
+            leitor.kill()
+            leitor.wait()
+        extra = f" descartadas={r['descartadas']}" if "descartadas" in r else ""
+        print(f"{r['modo']:<6} lag p50={r['lag_p50_ms']:.2f} ms  p99={r['lag_p99_ms']:.2f} ms  "
+              f"max={r['lag_max_ms']:.2f} ms  amostras={r['amostras']}  mensagens={r['mensagens']}{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Na raiz do projeto: o pytest põe este diretório no sys.path e os testes importam os módulos planos.
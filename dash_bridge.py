@@ -0,0 +1,236 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from profiling import rastrear
+
+# --- Ponte ASGI -> WSGI para o Dash com Executores Dedicados ---
+# Substitui o WSGIMiddleware (que usa um único pool de threads compartilhado
+# com o resto da aplicação). Cada classe de requisição do Dash roda no seu
+# próprio ThreadPoolExecutor com fila limitada, assim um relatório PDF lento
+# nunca ocupa as threads dos callbacks de atualização dos gráficos e o loop
+# asyncio (simulador/monitor) nunca espera por nenhum deles.
+
+AMOSTRAS_LATENCIA = 512
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+class ClasseExecutor:
+    """Pool de threads limitado para uma classe de requisições, com métricas de fila."""
+
+    def __init__(self, nome, max_threads, max_fila):
+        self.nome = nome
+        self.max_threads = max_threads
+        self.max_fila = max_fila
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix=f"dash-{nome}")
+        self._lock = threading.Lock()
+        self.na_fila = 0
+        self.em_execucao = 0
+        self.max_fila_observada = 0
+        self.concluidas = 0
+        self.rejeitadas = 0
+        self.erros = 0
+        self._espera_ms = deque(maxlen=AMOSTRAS_LATENCIA)
+        self._execucao_ms = deque(maxlen=AMOSTRAS_LATENCIA)
+
+    def tentar_reservar(self):
+        """Reserva uma vaga na fila; False se a fila está cheia (requisição deve ser rejeitada)."""
+        with self._lock:
+            if self.na_fila >= self.max_fila:
+                self.rejeitadas += 1
+                return False
+            self.na_fila += 1
+            self.max_fila_observada = max(self.max_fila_observada, self.na_fila)
+            return True
+
+    def _executar(self, funcao, enfileirada_em, nome):
+        inicio = time.perf_counter()
+        espera_ms = (inicio - enfileirada_em) * 1000
+        with self._lock:
+            self.na_fila -= 1
+            self.em_execucao += 1
+            self._espera_ms.append(espera_ms)
+        try:
+            # O rastreamento conta desde a entrada na fila; a espera aparece como fase "fila"
+            with rastrear("dash", nome or self.nome, inicio=enfileirada_em) as rastreamento:
+                rastreamento.fases["fila"] = espera_ms
+                return funcao()
+        except Exception:
+            with self._lock:
+                self.erros += 1
+            raise
+        finally:
+            with self._lock:
+                self.em_execucao -= 1
+                self.concluidas += 1
+                self._execucao_ms.append((time.perf_counter() - inicio) * 1000)
+
+    async def executar(self, funcao, nome=None):
+        """Roda `funcao` no pool (a vaga deve ter sido reservada com tentar_reservar)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._executar, funcao, time.perf_counter(), nome)
+
+    def metricas(self):
+        with self._lock:
+            espera = list(self._espera_ms)
+            execucao = list(self._execucao_ms)
+            return {
+                "threads": self.max_threads,
+                "max_fila": self.max_fila,
+                "na_fila": self.na_fila,
+                "em_execucao": self.em_execucao,
+                "max_fila_observada": self.max_fila_observada,
+                "concluidas": self.concluidas,
+                "rejeitadas": self.rejeitadas,
+                "erros": self.erros,
+                "espera_ms_p50": round(_percentil(espera, 50), 2),
+                "espera_ms_p95": round(_percentil(espera, 95), 2),
+                "execucao_ms_p50": round(_percentil(execucao, 50), 2),
+                "execucao_ms_p95": round(_percentil(execucao, 95), 2),
+                "execucao_ms_max": round(max(execucao), 2) if execucao else 0.0,
+            }
+
+    def desligar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _montar_environ(scope, corpo):
+    # Mesmo mapeamento do starlette.middleware.wsgi.build_environ
+    script_name = scope.get("root_path", "").encode("utf8").decode("latin1")
+    path_info = scope["path"].encode("utf8").decode("latin1")
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": script_name,
+        "PATH_INFO": path_info,
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(corpo),
+        "wsgi.errors": sys.stdout,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    server = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"] = server[0]
+    environ["SERVER_PORT"] = str(server[1])
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for nome, valor in scope.get("headers", []):
+        nome = nome.decode("latin1")
+        if nome == "content-length":
+            chave = "CONTENT_LENGTH"
+        elif nome == "content-type":
+            chave = "CONTENT_TYPE"
+        else:
+            chave = f"HTTP_{nome}".upper().replace("-", "_")
+        valor = valor.decode("latin1")
+        if chave in environ:
+            valor = environ[chave] + "," + valor
+        environ[chave] = valor
+    return environ
+
+
+def _chamar_wsgi(wsgi_app, environ):
+    """Executa a app WSGI inteira numa thread do pool e devolve (status, headers, corpo)."""
+    resposta = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        if exc_info and resposta:
+            raise exc_info[1].with_traceback(exc_info[2])
+        resposta["status"] = int(status.split(" ", 1)[0])
+        resposta["headers"] = [(k.strip().encode("latin1").lower(), v.strip().encode("latin1"))
+                               for k, v in response_headers]
+
+    resultado = wsgi_app(environ, start_response)
+    try:
+        corpo = b"".join(resultado)
+    finally:
+        if hasattr(resultado, "close"):
+            resultado.close()
+    return resposta.get("status", 500), resposta.get("headers", []), corpo
+
+
+class DashExecutorBridge:
+    """App ASGI que despacha as requisições do Dash para executores por classe de callback.
+
+    `classes_callback` mapeia o nome da classe para trechos de id de Output; um
+    callback `_dash-update-component` cujo corpo contenha um desses trechos vai
+    para o executor da classe. Os demais callbacks vão para "callbacks" e o
+    restante (layout, assets, dependências) para "estatico".
+    """
+
+    def __init__(self, wsgi_app, limites, classes_callback=None):
+        self.wsgi_app = wsgi_app
+        self.classes_callback = classes_callback or {}
+        self.executores = {nome: ClasseExecutor(nome, threads, fila) for nome, (threads, fila) in limites.items()}
+        for obrigatoria in ("callbacks", "estatico"):
+            if obrigatoria not in self.executores:
+                raise ValueError(f"Classe de executor obrigatória ausente: {obrigatoria}")
+
+    def _classificar(self, scope, corpo):
+        if scope["method"] == "POST" and scope["path"].endswith("_dash-update-component"):
+            for nome, trechos in self.classes_callback.items():
+                if any(trecho.encode() in corpo for trecho in trechos):
+                    return nome
+            return "callbacks"
+        return "estatico"
+
+    @staticmethod
+    def _nome_rastreamento(scope, corpo):
+        # Callbacks são identificados pelos Outputs (ex.: "..graph-umidade.figure...soil-alert-display.children..")
+        if scope["method"] == "POST" and scope["path"].endswith("_dash-update-component"):
+            try:
+                return f"callback {json.loads(corpo).get('output', '?')}"
+            except (ValueError, AttributeError):
+                return "callback ?"
+        return f"{scope['method']} {scope['path']}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        partes = []
+        while True:
+            mensagem = await receive()
+            partes.append(mensagem.get("body", b""))
+            if not mensagem.get("more_body", False):
+                break
+        corpo = b"".join(partes)
+
+        executor = self.executores[self._classificar(scope, corpo)]
+        if not executor.tentar_reservar():
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"retry-after", b"2")]})
+            await send({"type": "http.response.body",
+                        "body": f"Fila '{executor.nome}' cheia, tente novamente.".encode("utf-8")})
+            return
+
+        environ = _montar_environ(scope, corpo)
+        status, headers, corpo_resposta = await executor.executar(lambda: _chamar_wsgi(self.wsgi_app, environ),
+                                                                  self._nome_rastreamento(scope, corpo))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": corpo_resposta})
+
+    def metricas(self):
+        return {nome: executor.metricas() for nome, executor in self.executores.items()}
+
+    def desligar(self):
+        for executor in self.executores.values():
+            executor.desligar()
@@ -0,0 +1,215 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# --- Logs Estruturados ---
+# Quem loga só formata a mensagem e a coloca numa fila limitada (QueueHandler,
+# put sem bloqueio). Uma thread (QueueListener) faz o resto: redação de
+# segredos e telefones, supressão de erros repetidos e escrita em JSON lines
+# (um objeto por linha) no stdout. Com stdout lento ou cheio, o loop asyncio
+# não espera a escrita; se a fila encher, os registros excedentes são
+# descartados e contados.
+#
+# Campos estruturados vão em extra={"campos": {...}}.
+
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO").upper()
+LOG_FORMATO = os.environ.get("LOG_FORMATO", "json").lower()  # "json" ou "texto"
+TAMANHO_FILA_LOGS = int(os.environ.get("TAMANHO_FILA_LOGS", 10000))
+JANELA_REPETICAO_SEG = float(os.environ.get("JANELA_REPETICAO_LOGS_SEG", 60))
+MAX_REPETICOES_POR_JANELA = 3  # Cópias iguais de um WARNING/ERRO antes de suprimir
+NOME_RAIZ = "monitoramento"
+
+REDIGIDO = "***"
+# Campos estruturados cujo valor nunca vai para o log
+CHAVES_SENSIVEIS = re.compile(r"(api[_-]?key|token|senha|password|secret|auth|numbers|telefone|phone)", re.I)
+# Telefones com formatação (+55, DDD entre parênteses, hífen ou espaço); sequências puras
+# de dígitos (timestamps epoch, contagens) não são tocadas
+PADRAO_TELEFONE = re.compile(
+    r"(?:\+\d{1,3}[\s-]?)?\(?\b\d{2}\)?[\s-]?9?\d{4}[\s-]\d{4}\b|\+\d{10,13}\b|\(\d{2}\)\s?9?\d{8}\b")
+
+_segredos = set()
+_lock_segredos = threading.Lock()
+_listener = None
+_handler_fila = None
+
+
+def registrar_segredo(valor):
+    """Valor literal (chave de API, token, telefone configurado) a ser redigido de qualquer mensagem."""
+    if valor and len(str(valor)) >= 4:
+        with _lock_segredos:
+            _segredos.add(str(valor))
+
+
+def redigir(texto):
+    with _lock_segredos:
+        segredos = sorted(_segredos, key=len, reverse=True)
+    for segredo in segredos:
+        if segredo in texto:
+            texto = texto.replace(segredo, REDIGIDO)
+    return PADRAO_TELEFONE.sub(REDIGIDO, texto)
+
+
+def redigir_campos(valor, chave=None):
+    if chave is not None and CHAVES_SENSIVEIS.search(chave):
+        return REDIGIDO
+    if isinstance(valor, dict):
+        return {k: redigir_campos(v, str(k)) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [redigir_campos(v) for v in valor]
+    if isinstance(valor, str):
+        return redigir(valor)
+    return valor
+
+
+class FiltroRedacao(logging.Filter):
+    def filter(self, record):
+        record.msg = redigir(record.getMessage())
+        record.args = None
+        if getattr(record, "campos", None):
+            record.campos = redigir_campos(record.campos)
+        if record.exc_text:
+            record.exc_text = redigir(record.exc_text)
+        return True
+
+
+class FiltroRepeticao(logging.Filter):
+    """Suprime WARNING/ERRO idênticos além de MAX_REPETICOES_POR_JANELA por janela.
+
+    Ao reaparecer numa janela nova, o registro leva em `suprimidas` quantas cópias
+    foram descartadas na janela anterior. Roda só na thread do listener.
+    """
+
+    def __init__(self, janela_seg=JANELA_REPETICAO_SEG, maximo=MAX_REPETICOES_POR_JANELA):
+        super().__init__()
+        self.janela_seg = janela_seg
+        self.maximo = maximo
+        self._vistos = {}  # chave -> [inicio da janela, contagem, suprimidas]
+        self.total_suprimidas = 0
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        agora = time.monotonic()
+        chave = (record.name, record.levelno, record.getMessage())
+        estado = self._vistos.get(chave)
+        if estado is None or agora - estado[0] >= self.janela_seg:
+            if estado is not None and estado[2]:
+                record.suprimidas = estado[2]
+            self._vistos[chave] = [agora, 1, 0]
+            if len(self._vistos) > 1000:
+                self._vistos = {k: v for k, v in self._vistos.items() if agora - v[0] < self.janela_seg}
+            return True
+        estado[1] += 1
+        if estado[1] <= self.maximo:
+            return True
+        estado[2] += 1
+        self.total_suprimidas += 1
+        return False
+
+
+class FormatadorJSON(logging.Formatter):
+    def format(self, record):
+        entrada = {
+            "ts": datetime.datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "campos", None):
+            entrada.update(record.campos)
+        if getattr(record, "suprimidas", 0):
+            entrada["repeticoes_suprimidas"] = record.suprimidas
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entrada["excecao"] = record.exc_text
+        return json.dumps(entrada, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        texto = super().format(record)
+        if getattr(record, "campos", None):
+            texto += " " + json.dumps(record.campos, ensure_ascii=False, default=str)
+        if getattr(record, "suprimidas", 0):
+            texto += f" (+{record.suprimidas} repetições suprimidas)"
+        return texto
+
+
+class HandlerFilaSemBloqueio(QueueHandler):
+    """QueueHandler que descarta (e conta) em vez de bloquear quando a fila está cheia."""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def prepare(self, record):
+        # Formata a mensagem agora (os args podem mudar depois), mas mantém os campos extras
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configurar_logs(nivel=None, formato=None, destino=None):
+    """Liga a fila + listener no logger raiz do projeto. Idempotente."""
+    global _listener, _handler_fila
+    if _listener is not None:
+        return
+    destino_handler = logging.StreamHandler(destino or sys.stdout)
+    destino_handler.setFormatter(FormatadorTexto() if (formato or LOG_FORMATO) == "texto" else FormatadorJSON())
+    destino_handler.addFilter(FiltroRedacao())
+    destino_handler.addFilter(FiltroRepeticao())
+
+    _handler_fila = HandlerFilaSemBloqueio(queue.Queue(maxsize=TAMANHO_FILA_LOGS))
+    raiz = logging.getLogger(NOME_RAIZ)
+    raiz.setLevel(nivel or LOG_NIVEL)
+    raiz.addHandler(_handler_fila)
+    raiz.propagate = False
+    _listener = QueueListener(_handler_fila.queue, destino_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(parar_logs)
+
+
+def parar_logs():
+    """Esvazia a fila e para o listener (no encerramento do processo)."""
+    global _listener, _handler_fila
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger(NOME_RAIZ).removeHandler(_handler_fila)
+    _listener = None
+    _handler_fila = None
+
+
+def estatisticas_logs():
+    if _handler_fila is None:
+        return {"ativo": False}
+    filtro = next((f for h in _listener.handlers for f in h.filters if isinstance(f, FiltroRepeticao)), None)
+    return {"ativo": True, "nivel": logging.getLevelName(logging.getLogger(NOME_RAIZ).level),
+            "na_fila": _handler_fila.queue.qsize(), "descartados_fila_cheia": _handler_fila.descartados,
+            "repeticoes_suprimidas": filtro.total_suprimidas if filtro else 0}
+
+
+def obter_logger(nome):
+    return logging.getLogger(f"{NOME_RAIZ}.{nome}")
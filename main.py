@@ -1,8 +1,8 @@
 import asyncio
-from fastapi import FastAPI
-from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi import FastAPI, Depends, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse
 from collections import deque
 import uvicorn
 # Importa as constantes necessárias do simulator
@@ -12,6 +12,27 @@ from simulator import (
     UMIDADE_SATURACAO,
     UMIDADE_BASE_1M, UMIDADE_BASE_2M
 )
+from shared_store import NOME_PADRAO, SegmentoFechado, SharedRingBuffer
+from dash_bridge import DashExecutorBridge
+from status_cache import StatusCache, etag_corresponde
+from scheduler import Agendador, TarefaPeriodica
+from alert_levels import CORES, calculate_soil_alert, calculate_rain_alert, soil_height_percent
+from alert_history import TIPOS_ALERTA, HistoricoAlertas, intervalos_de_nivel
+from nowcast import TAMANHO_ESTADO, estado_do_simulador, prever
+from logs import configurar_logs, estatisticas_logs, obter_logger, registrar_segredo
+from profiling import (
+    AmostradorPerfil, MiddlewareRastreamento, estender_orcamento, fase, formatar_colapsado, funcoes_mais_frequentes,
+    rastreamentos_lentos
+)
+from quality import CAMPOS_UMIDADE, ControleQualidade, chuva_valida, contar_flags, ultima_leitura_valida
+from stations import Estacao, RegistroEstacoes, ler_bbox
+from windows import JANELA_CHUVA_72H_SEG, JanelasAgregadas, limites_janela
+from resampling import ordenar_e_deduplicar, reamostrar, selecionar_periodo
+from retention import ArquivoDiario, PoliticaRetencao, agregar_por_hora
+from readings import (
+    DTYPE_LEITURA, Leitura, LeituraInvalida, ArmazemLeituras, iterar_blocos, para_array, para_dataframe, registros_para_dicts, epoch_para_iso,
+    timestamp_para_epoch
+)
 from contextlib import asynccontextmanager
 import os
 import datetime
@@ -24,13 +45,12 @@ import math
 import httpx  # Para requisições de API assíncronas
 import json  # Para formatar o log do payload
 import uuid
-# Imports para o PDF em memória
-from io import BytesIO
-import plotly.io as pio
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
+import secrets
+import threading
+import time
+# Relatório PDF montado a partir de agregação incremental
+from reports import AcumuladorRelatorio, construir_pdf
+from batch_reports import GeradorLote, PERIODOS, dias_completos, jobs_para
 
 # --- Dash/Plotly Imports ---
 import dash
@@ -43,24 +63,108 @@ from dash_bootstrap_components import Button
 
 # --- Configuração da Aplicação ---
 MAX_PONTOS_DADOS = 576
+MAX_EVENTOS_POR_PAGINA = 500  # /api/alerts
 INTERVALO_ATUALIZACAO_BACKEND_SEG = 2
 INTERVALO_ATUALIZACAO_FRONTEND_MS = 2000
 NUM_DADOS_INICIAIS = 10
 PONTOS_POR_HORA = 6
 INTERVALO_MONITOR_ALERTA_SEG = 10
+INTERVALO_LEITURA_SIMULADA_SEG = 10 * 60
+
+# --- Compressão do Tempo Simulado ---
+# Segundos simulados por segundo real. Padrão: 60 min simulados a cada 2 s (1800x); 0 = o mais rápido possível.
+FATOR_COMPRESSAO_PADRAO = 60 * 60 / INTERVALO_ATUALIZACAO_BACKEND_SEG
+FATOR_COMPRESSAO_MAXIMO = 0
+# Máximo de leituras geradas por tick com fator fixo (cada tick publica um único lote para status/alertas/workers)
+MAX_PONTOS_POR_LOTE = int(os.environ.get("MAX_PONTOS_POR_LOTE", 6 * 24 * 7))
+# No modo máximo, cada tick gera leituras até gastar esta fração do intervalo
+FRACAO_TICK_MODO_MAXIMO = 0.8
+# Leituras por bloco na geração de relatórios (memória de pico independe do período)
+TAMANHO_BLOCO_RELATORIO = int(os.environ.get("TAMANHO_BLOCO_RELATORIO", 6 * 24 * 7))
+# Relatórios diários/semanais em lote (ver batch_reports.py); desativados por padrão
+RELATORIOS_AGENDADOS = os.environ.get("RELATORIOS_AGENDADOS", "0") == "1"
+DIRETORIO_RELATORIOS = os.environ.get("DIRETORIO_RELATORIOS", "relatorios")
+PROCESSOS_RELATORIOS = int(os.environ.get("PROCESSOS_RELATORIOS", 2))
+INTERVALO_RELATORIOS_LOTE_SEG = int(os.environ.get("INTERVALO_RELATORIOS_LOTE_SEG", 60))
+MAX_DIAS_PENDENTES_RELATORIOS = 7  # Dias completos mais recentes verificados a cada execução
+# Membros do conjunto do nowcast (ver nowcast.py)
+MEMBROS_NOWCAST = int(os.environ.get("MEMBROS_NOWCAST", 500))
+# Histórico que o simulador consulta (janela de 72 h da lógica de chuva + folga)
+TAMANHO_HISTORICO_SIMULACAO = 72 * PONTOS_POR_HORA + PONTOS_POR_HORA
+# Política quando uma execução atrasa além do próximo prazo: "recuperar" ou "pular" (ver scheduler.py)
+POLITICA_SIMULACAO = os.environ.get("POLITICA_SIMULACAO", "recuperar")
+POLITICA_ALERTAS = os.environ.get("POLITICA_ALERTAS", "pular")
+ESTACAO_ID = os.environ.get("ESTACAO_ID", "encosta-01")
+# Cadastro das estações do mapa (ver stations.py); sem o arquivo, só a estação simulada
+ARQUIVO_ESTACOES = os.environ.get("ARQUIVO_ESTACOES", "estacoes.json")
+ESTACAO_LAT = float(os.environ.get("ESTACAO_LAT", -23.55))
+ESTACAO_LON = float(os.environ.get("ESTACAO_LON", -45.35))
+
+# --- Retenção do Histórico (ver retention.py) ---
+# Dias em resolução total na memória (mínimo de 4: gráficos de 96h e janelas de 72h)
+RETENCAO_DIAS_MEMORIA = max(int(os.environ.get("RETENCAO_DIAS_MEMORIA", 7)), 4)
+RETENCAO_DIAS_ROLLUP = int(os.environ.get("RETENCAO_DIAS_ROLLUP", 365))  # Rollups horários em memória
+DIRETORIO_HISTORICO = os.environ.get("DIRETORIO_HISTORICO", "historico")
+RETENCAO_DIAS_DISCO = int(os.environ.get("RETENCAO_DIAS_DISCO", 90))  # 0 desativa a camada em disco
+# Eventos de alerta: mesma retenção do disco; só em memória, a dos rollups
+RETENCAO_DIAS_ALERTAS = RETENCAO_DIAS_DISCO if RETENCAO_DIAS_DISCO > 0 else RETENCAO_DIAS_ROLLUP
+# A retenção roda como tarefa própria do agendador, fora do caminho de ingestão
+INTERVALO_RETENCAO_SEG = int(os.environ.get("INTERVALO_RETENCAO_SEG", 30))
+
+# --- Modo de Execução (multi-worker) ---
+# "unico": um processo faz tudo (padrão, compatível com o Procfile)
+# "produtor": processo único com simulação e alertas, publica na memória compartilhada (ver produtor.py)
+# "leitor": workers HTTP/Dash sem estado, apenas leem da memória compartilhada
+MODO_EXECUCAO = os.environ.get("MODO_EXECUCAO", "unico").lower()
+NOME_MEMORIA_COMPARTILHADA = os.environ.get("NOME_MEMORIA_COMPARTILHADA", NOME_PADRAO)
+# Padrão: o mesmo limite da camada em memória (PoliticaRetencao.capacidade_memoria)
+CAPACIDADE_MEMORIA_COMPARTILHADA = int(os.environ.get("CAPACIDADE_MEMORIA_COMPARTILHADA",
+                                                      (RETENCAO_DIAS_MEMORIA + 2) * PONTOS_POR_HORA * 24))
+INTERVALO_VERIFICACAO_REINICIO_SEG = 1
+
+# --- Executores do Dash: (threads, tamanho máximo da fila) por classe de requisição ---
+LIMITES_EXECUTORES_DASH = {
+    "relatorio": (int(os.environ.get("THREADS_DASH_RELATORIO", 1)), int(os.environ.get("FILA_DASH_RELATORIO", 4))),
+    "callbacks": (int(os.environ.get("THREADS_DASH_CALLBACKS", 4)), int(os.environ.get("FILA_DASH_CALLBACKS", 64))),
+    "estatico": (int(os.environ.get("THREADS_DASH_ESTATICO", 2)), int(os.environ.get("FILA_DASH_ESTATICO", 64))),
+}
+# Trechos de id de Output que identificam cada classe de callback pesado
+CLASSES_CALLBACK_DASH = {
+    "relatorio": ("download-pdf-report",),
+}
 
 # --- Armazenamento de Dados e Simulador ---
-data_store = deque()
+data_store = ArmazemLeituras()  # Array estruturado (readings.DTYPE_LEITURA)
 simulator = SensorSimulator()
 simulated_time_utc = None
+historico_simulacao = deque(maxlen=TAMANHO_HISTORICO_SIMULACAO)  # Últimas leituras vistas pelo simulador
+fator_compressao = float(os.environ.get("FATOR_COMPRESSAO_TEMPO", FATOR_COMPRESSAO_PADRAO))
+credito_simulado_seg = 0.0  # Tempo simulado devido e ainda não gerado
+ultimo_tick_simulacao = None
+estatisticas_simulacao = {"pontos_gerados": 0, "ultimo_lote": 0, "pontos_por_seg": 0.0, "pontos_descartados": 0}
+buffer_compartilhado = None  # SharedRingBuffer (produtor: escrita, leitor: leitura)
+_lock_buffer_leitor = threading.Lock()  # Anexar/soltar o buffer no leitor (ver _obter_buffer_leitor)
+versao_dados_local = 0  # Incrementado a cada alteração do data_store (modos "unico"/"produtor")
+status_cache = StatusCache()
+controle_qc = ControleQualidade()  # Estado incremental do QC por estação (quality.py)
+estado_modelo_atual = None  # Estado do simulador na última leitura registrada (nowcast.CAMPOS_ESTADO)
+cache_nowcast = (None, None)  # (versão das leituras, resultado)
+cache_janelas_chuva = (None, None)  # (versão das leituras, JanelasAgregadas da chuva válida)
+amostrador_perfil = AmostradorPerfil()
+registro_estacoes = RegistroEstacoes.carregar(ARQUIVO_ESTACOES, Estacao(ESTACAO_ID, ESTACAO_ID, ESTACAO_LAT, ESTACAO_LON))
+arquivo_historico = (ArquivoDiario(DIRETORIO_HISTORICO, ESTACAO_ID, RETENCAO_DIAS_DISCO)
+                     if RETENCAO_DIAS_DISCO > 0 else None)
+politica_retencao = PoliticaRetencao(RETENCAO_DIAS_MEMORIA, RETENCAO_DIAS_ROLLUP, arquivo_historico)
+# Mudanças de nível (alert_history.py): em disco só com a camada de disco ativa
+historico_alertas = HistoricoAlertas(DIRETORIO_HISTORICO if RETENCAO_DIAS_DISCO > 0 else None)
 
 # --- Variáveis Globais para E-mail e SMS ---
 global_last_rain_alert_level = "Livre"
 global_last_soil_alert_level = "Livre"
 
-# --- Variáveis Globais para Tarefas Asyncio ---
-global_task_simulador = None
-global_task_monitor = None
+# --- Agendador das Tarefas de Background ---
+agendador = Agendador()
+gerador_relatorios = GeradorLote(DIRETORIO_RELATORIOS, PROCESSOS_RELATORIOS)
 
 # --- Leitura das Variáveis de Ambiente ---
 # E-mail
@@ -71,28 +175,182 @@ SMTP_API_KEY = os.environ.get("SMTP2GO_API_KEY")
 COMTELE_API_KEY = os.environ.get("COMTELE_API_KEY")
 COMTELE_SENDER_ID = os.environ.get("COMTELE_SENDER_ID")
 NOTIFICATION_PHONE = os.environ.get("NOTIFICATION_PHONE")
+# Rotas administrativas (/api/admin/*)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 
 if NOTIFICATION_PHONE and not NOTIFICATION_PHONE.startswith('+'):
     NOTIFICATION_PHONE = '+' + NOTIFICATION_PHONE
 
+# --- Logs (ver logs.py) ---
+configurar_logs()
+for _segredo in (SMTP_API_KEY, COMTELE_API_KEY, ADMIN_TOKEN, NOTIFICATION_PHONE,
+                 NOTIFICATION_PHONE[1:] if NOTIFICATION_PHONE else None):
+    registrar_segredo(_segredo)
+log_config = obter_logger("config")
+log_email = obter_logger("email")
+log_sms = obter_logger("sms")
+log_alertas = obter_logger("alertas")
+log_simulador = obter_logger("simulador")
+log_relatorios = obter_logger("relatorios")
+log_execucao = obter_logger("execucao")
+
 # --- Log de Verificação Inicial das Variáveis de Ambiente ---
-print("--- LOG DE E-MAIL (INICIALIZAÇÃO) ---")
-print(f"EMAIL_DESTINATARIO carregado: {EMAIL_DESTINATARIO}")
-print(f"EMAIL_REMETENTE carregado: {EMAIL_REMETENTE}")
-print(f"SMTP_API_KEY carregado: {'*' * 10 if SMTP_API_KEY else None}")
-print("--------------------------------------")
-print("--- LOG DE SMS (INICIALIZAÇÃO) ---")
-print(f"NOTIFICATION_PHONE carregado: {NOTIFICATION_PHONE}")
-print(f"COMTELE_API_KEY carregado: {'*' * 10 if COMTELE_API_KEY else None}")
-print(f"COMTELE_SENDER_ID carregado: {COMTELE_SENDER_ID}")
-print("-----------------------------------")
+log_config.info("Notificações configuradas", extra={"campos": {
+    "email_destinatario": EMAIL_DESTINATARIO, "email_remetente": EMAIL_REMETENTE,
+    "chave_smtp_configurada": bool(SMTP_API_KEY), "sms_destino_configurado": bool(NOTIFICATION_PHONE),
+    "chave_comtele_configurada": bool(COMTELE_API_KEY), "sms_remetente": COMTELE_SENDER_ID,
+    "admin_configurado": bool(ADMIN_TOKEN)}})
+
+
+# --- Autorização das Rotas Administrativas ---
+def verificar_admin(x_admin_token: str = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Rotas administrativas desativadas (ADMIN_TOKEN não configurado).")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido.")
+
+
+# --- Acesso aos Dados (independente do modo de execução) ---
+def _obter_buffer_leitor():
+    """Anexa ao buffer do produtor sob demanda (o produtor pode subir depois dos workers).
+
+    Se o produtor reiniciou (segmento recriado) ou saiu, solta o mapeamento antigo e tenta de novo.
+    Threads do Dash e o loop chamam isto ao mesmo tempo: anexar/soltar fica sob _lock_buffer_leitor.
+    """
+    global buffer_compartilhado
+    with _lock_buffer_leitor:
+        antigo = buffer_compartilhado
+        if antigo is not None and antigo.substituido():
+            # Tira o buffer do global antes de fechar: ninguém mais pega a referência antiga
+            buffer_compartilhado = None
+            antigo.fechar()
+            log_execucao.info("Leitor: segmento '%s' substituído pelo produtor; reanexando.", NOME_MEMORIA_COMPARTILHADA)
+        if buffer_compartilhado is None:
+            try:
+                buffer_compartilhado = SharedRingBuffer.anexar(NOME_MEMORIA_COMPARTILHADA)
+                log_execucao.info("Leitor anexado à memória compartilhada '%s'.", NOME_MEMORIA_COMPARTILHADA)
+            except FileNotFoundError:
+                return None
+        return buffer_compartilhado
+
+
+def _no_buffer_leitor(funcao, padrao):
+    """funcao(buffer) numa referência local ao buffer do produtor; padrao() se ele não estiver disponível."""
+    for _ in range(2):
+        buffer = _obter_buffer_leitor()
+        if buffer is None:
+            break
+        try:
+            return funcao(buffer)
+        except SegmentoFechado:
+            continue  # Outra thread se reanexou entre obter a referência e ler: tenta no buffer novo
+    return padrao()
+
+
+def obter_dados():
+    """Retorna as leituras atuais (array estruturado em ordem cronológica; não modificar)."""
+    if MODO_EXECUCAO == "leitor":
+        return _no_buffer_leitor(lambda buffer: buffer.ler_dados(), data_store.registros)
+    return data_store.registros()
+
+
+def versao_dados():
+    """Identificador que muda sempre que as leituras mudam."""
+    if MODO_EXECUCAO == "leitor":
+        # O número de sequência recomeça num segmento novo: a identidade e a geração desambiguam
+        return _no_buffer_leitor(lambda buffer: f"{buffer.identidade:x}-{buffer.geracao()}-{buffer.versao()}",
+                                lambda: -1)
+    return versao_dados_local
+
+
+def obter_estado_modelo():
+    """Estado do modelo na última leitura publicada (None se ainda não houver)."""
+    if MODO_EXECUCAO == "leitor":
+        return _no_buffer_leitor(lambda buffer: buffer.ler_estado_modelo(), lambda: None)
+    return estado_modelo_atual
+
+
+def iterar_leituras(inicio_epoch, fim_epoch, tamanho_bloco=None, aquecimento_seg=0):
+    """Leituras de [inicio - aquecimento, fim] em blocos de TAMANHO_BLOCO_RELATORIO.
+
+    Dias que já saíram da memória vêm da camada em disco, antes dos blocos em memória.
+    """
+    tamanho_bloco = tamanho_bloco or TAMANHO_BLOCO_RELATORIO
+    data = obter_dados()
+    primeiro_em_memoria = int(data['timestamp'][0]) if len(data) else None
+    if arquivo_historico is not None and (primeiro_em_memoria is None
+                                          or inicio_epoch - aquecimento_seg < primeiro_em_memoria):
+        yield from arquivo_historico.iterar(inicio_epoch - aquecimento_seg, fim_epoch, tamanho_bloco,
+                                            antes_de=primeiro_em_memoria)
+    yield from iterar_blocos(data, inicio_epoch, fim_epoch, tamanho_bloco, aquecimento_seg)
+
+
+def data_mais_antiga_disponivel(data):
+    """Primeiro dia com leituras em resolução total (disco ou memória)."""
+    dia_disco = politica_retencao.dia_mais_antigo_em_disco()
+    if dia_disco is not None:
+        return dia_disco
+    return datetime.datetime.fromtimestamp(int(data['timestamp'][0]), tz=timezone.utc).date()
+
+
+def registrar_dados(novos_dados, estado_modelo=None):
+    """Passa as leituras (lista de Leitura) pelo QC, anexa ao data_store e, no modo produtor, publica para os workers.
+
+    `estado_modelo` é o estado do simulador logo após a última leitura (usado pelo nowcast).
+    """
+    global versao_dados_local, estado_modelo_atual
+    novos_dados, atrasadas, repetidas = ordenar_e_deduplicar(novos_dados, data_store.registros()['timestamp'])
+    if repetidas:
+        log_simulador.warning("%d leituras repetidas descartadas.", repetidas)
+    if atrasadas and politica_retencao.ultimo_corte is not None:
+        # Dias que já saíram da memória (rollups e disco) não são reabertos
+        arquivadas = sum(1 for leitura in atrasadas if leitura.timestamp < politica_retencao.ultimo_corte)
+        if arquivadas:
+            atrasadas = [leitura for leitura in atrasadas if leitura.timestamp >= politica_retencao.ultimo_corte]
+            log_simulador.warning("%d leituras atrasadas de dias já arquivados descartadas.", arquivadas)
+    if not novos_dados and not atrasadas:
+        return
+    with fase("qc"):
+        for leitura in novos_dados:
+            controle_qc.avaliar(ESTACAO_ID, leitura)
+        for leitura in atrasadas:
+            controle_qc.avaliar_atrasada(ESTACAO_ID, leitura)
+    with fase("armazenamento"):
+        deslocadas = data_store.inserir(para_array(atrasadas)) if atrasadas else 0
+        data_store.estender(para_array(novos_dados))
+        # Trecho final que mudou: as leituras depois da primeira atrasada, as atrasadas e as novas
+        registros = data_store.registros()[-(deslocadas + len(atrasadas) + len(novos_dados)):]
+    if atrasadas:
+        log_simulador.info("%d leituras atrasadas inseridas em ordem.", len(atrasadas))
+    if estado_modelo is not None:
+        estado_modelo_atual = estado_modelo
+    versao_dados_local += 1
+    if buffer_compartilhado is not None and MODO_EXECUCAO == "produtor":
+        with fase("memoria_compartilhada"):
+            buffer_compartilhado.escrever(registros, estado_modelo, substituir=deslocadas)
+    with fase("status"):
+        atualizar_status()
+
+
+def aplicar_retencao():
+    """Tira da memória os dias além da retenção (rollups e disco) e expira eventos de alerta; tarefa periódica."""
+    with fase("retencao"):
+        descartadas = politica_retencao.aplicar(data_store)
+    if descartadas:
+        log_simulador.info("Retenção: %d leituras anteriores a %s saíram da memória.", descartadas,
+                           datetime.datetime.fromtimestamp(politica_retencao.ultimo_corte, tz=timezone.utc).date())
+    dados = data_store.registros()
+    if len(dados):
+        expirados = historico_alertas.expurgar(int(dados['timestamp'][-1]) - RETENCAO_DIAS_ALERTAS * 24 * 3600)
+        if expirados:
+            log_simulador.info("Retenção: %d evento(s) de alerta expirados.", expirados)
 
 
 # --- Função Assíncrona de Envio de E-mail com Logs ---
 async def send_email_alert_async(subject, body):
     api_key = SMTP_API_KEY
     if not all([api_key, EMAIL_DESTINATARIO, EMAIL_REMETENTE]):
-        print("ERRO DE E-MAIL: Variáveis (SMTP_API_KEY, NOTIFICATION_EMAIL, SENDER_EMAIL) não configuradas.")
+        log_email.error("Variáveis (SMTP_API_KEY, NOTIFICATION_EMAIL, SENDER_EMAIL) não configuradas.")
         return
 
     api_url = "https://api.smtp2go.com/v3/email/send"
@@ -110,40 +368,40 @@ async def send_email_alert_async(subject, body):
 
     try:
         async with httpx.AsyncClient() as client:
-            print("LOG DE E-MAIL: Enviando requisição para a API do SMTP2GO...")
+            log_email.debug("Enviando requisição para a API do SMTP2GO.", extra={"campos": {"assunto": subject}})
             response = await client.post(api_url, headers=headers, json=payload, timeout=15.0)
 
-            print(f"LOG DE E-MAIL: Resposta recebida. Status Code: {response.status_code}")
             try:
                 response_data = response.json()
                 if response.status_code == 200 and response_data.get("data", {}).get("succeeded", 0) > 0:
-                    print("LOG DE E-MAIL (SUCESSO): E-mail enviado com sucesso.")
+                    log_email.info("E-mail enviado com sucesso.",
+                                   extra={"campos": {"assunto": subject, "status": response.status_code}})
                 else:
                     msg_erro = response_data.get('data', {}).get('failures', 'Falha desconhecida no corpo da resposta')
-                    print(f"ERRO DE E-MAIL (FALHA API): {msg_erro}")
+                    log_email.error("Falha na API ao enviar e-mail: %s", msg_erro,
+                                    extra={"campos": {"status": response.status_code}})
             except json.JSONDecodeError:
-                print(f"ERRO DE E-MAIL: A resposta da API não foi um JSON válido. Resposta: {response.text}")
+                log_email.error("A resposta da API não foi um JSON válido.",
+                                extra={"campos": {"status": response.status_code, "resposta": response.text[:500]}})
 
     except httpx.ConnectError as e:
-        print(f"ERRO DE E-MAIL (EXCEÇÃO - Conexão): Falha ao conectar ao servidor SMTP2GO. {e}")
+        log_email.error("Falha ao conectar ao servidor SMTP2GO: %s", e)
     except httpx.TimeoutException as e:
-        print(f"ERRO DE E-MAIL (EXCEÇÃO - Timeout): A requisição demorou muito (timeout). {e}")
+        log_email.error("Timeout na requisição ao SMTP2GO: %s", e)
     except Exception as e:
-        print(f"ERRO DE E-MAIL (EXCEÇÃO - Geral): Exceção ao tentar enviar: {e}")
+        log_email.error("Exceção ao tentar enviar e-mail: %s", e)
 
 
 # --- [VERSÃO FINAL] Função de Envio de SMS (usando método do server.py) ---
 async def send_sms_alert_async(message):
     """ Envia um SMS de alerta usando a API v2 da Comtele via form-urlencoded. """
-    print(f"--- LOG DE SMS (FUNÇÃO INVOCADA) ---")
-    print(f"Mensagem: {message}")
+    log_sms.debug("Envio de SMS solicitado.", extra={"campos": {"mensagem": message}})
 
     phone_to_send = NOTIFICATION_PHONE
     sender_name = COMTELE_SENDER_ID  # Agora é um nome, ex: "RiskGeo"
 
     if not all([phone_to_send, COMTELE_API_KEY, sender_name]):
-        print("ERRO DE SMS: Variáveis (NOTIFICATION_PHONE, COMTELE_API_KEY, COMTELE_SENDER_ID) não configuradas.")
-        print("-----------------------------------")
+        log_sms.error("Variáveis (NOTIFICATION_PHONE, COMTELE_API_KEY, COMTELE_SENDER_ID) não configuradas.")
         return
 
     if phone_to_send.startswith('+'):
@@ -161,204 +419,359 @@ async def send_sms_alert_async(message):
         "Content": str(message)
     }
 
-    print(f"Payload (Form Data) a ser enviado para a API SMS: {payload}")
+    # Payload vai para o log só em DEBUG; destinatário é redigido (logs.py)
+    log_sms.debug("Enviando requisição (Form Data) para a API da Comtele.", extra={"campos": {"payload": payload}})
 
     try:
         async with httpx.AsyncClient() as client:
-            print("LOG DE SMS: Enviando requisição (Form Data) para a API da Comtele...")
             response = await client.post(api_url, headers=headers, data=payload, timeout=15.0)
-
-            print(f"LOG DE SMS: Resposta recebida. Status Code: {response.status_code}")
             response_text = response.text
-            print(f"LOG DE SMS: Resposta da API (texto): {response_text}")
 
             try:
                 response_data = response.json()
                 if response_data.get("Success", False):
-                    print(f"LOG DE SMS (SUCESSO): SMS enviado para {phone_to_send}.")
+                    log_sms.info("SMS enviado para %s.", phone_to_send, extra={"campos": {"status": response.status_code}})
                 else:
                     msg_erro = response_data.get('Message', 'Mensagem de erro não disponível')
-                    print(f"ERRO DE SMS (FALHA API - Comtele Reportou Falha): {msg_erro}")
+                    log_sms.error("Comtele reportou falha no envio: %s", msg_erro,
+                                  extra={"campos": {"status": response.status_code}})
             except json.JSONDecodeError:
-                print(f"ERRO DE SMS: A resposta da API não foi um JSON válido. Resposta: {response_text}")
+                log_sms.error("A resposta da API não foi um JSON válido.",
+                              extra={"campos": {"status": response.status_code, "resposta": response_text[:500]}})
 
     except httpx.ConnectError as e:
-        print(f"ERRO DE SMS (EXCEÇÃO - Conexão): Falha ao conectar ao servidor da Comtele. {e}")
+        log_sms.error("Falha ao conectar ao servidor da Comtele: %s", e)
     except httpx.TimeoutException as e:
-        print(f"ERRO DE SMS (EXCEÇÃO - Timeout): A requisição demorou muito (timeout). {e}")
+        log_sms.error("Timeout na requisição à Comtele: %s", e)
     except Exception as e:
-        print(f"ERRO DE SMS (EXCEÇÃO - Geral): Exceção ao tentar enviar: {e}")
-
-    print("-----------------------------------")
+        log_sms.error("Exceção ao tentar enviar SMS: %s", e)
 
 
 # --- Lógica do Simulador em Background ---
-async def rodar_simulador():
+def _gerar_leitura():
+    global simulated_time_utc
+    c_deprec = historico_simulacao[-1].precipitacao_acumulada_mm if historico_simulacao else 0.0
+    novo_dado = simulator.gerar_novo_dado(c_deprec, simulated_time_utc, historico_simulacao)
+    simulated_time_utc += datetime.timedelta(seconds=INTERVALO_LEITURA_SIMULADA_SEG)
+    if not isinstance(novo_dado, Leitura):
+        log_simulador.warning("Simulador retornou dado inválido: %s", novo_dado)
+        return None
+    historico_simulacao.append(novo_dado)
+    return novo_dado
+
+
+def passo_simulacao():
+    """Gera, num único lote, as leituras devidas pelo fator de compressão. Roda numa thread do agendador."""
+    global credito_simulado_seg, ultimo_tick_simulacao
+    agora = time.monotonic()
+    decorrido = INTERVALO_ATUALIZACAO_BACKEND_SEG if ultimo_tick_simulacao is None else agora - ultimo_tick_simulacao
+    ultimo_tick_simulacao = agora
+
+    novos_dados = []
+    fator = fator_compressao
+    if fator == FATOR_COMPRESSAO_MAXIMO:
+        limite = agora + INTERVALO_ATUALIZACAO_BACKEND_SEG * FRACAO_TICK_MODO_MAXIMO
+        # Ocupar a fração do tick é o objetivo aqui, não lentidão
+        estender_orcamento(INTERVALO_ATUALIZACAO_BACKEND_SEG * FRACAO_TICK_MODO_MAXIMO * 1000)
+        # Lote limitado pelo tempo do tick e por MAX_PONTOS_POR_LOTE, como no modo com fator fixo:
+        # status, alertas e workers processam o lote inteiro a cada tick
+        with fase("simulador"):
+            while time.monotonic() < limite and len(novos_dados) < MAX_PONTOS_POR_LOTE:
+                for _ in range(min(PONTOS_POR_HORA, MAX_PONTOS_POR_LOTE - len(novos_dados))):
+                    novo_dado = _gerar_leitura()
+                    if novo_dado is not None:
+                        novos_dados.append(novo_dado)
+    else:
+        credito_simulado_seg += fator * decorrido
+        pontos = int(credito_simulado_seg // INTERVALO_LEITURA_SIMULADA_SEG)
+        credito_simulado_seg -= pontos * INTERVALO_LEITURA_SIMULADA_SEG
+        if pontos > MAX_PONTOS_POR_LOTE:
+            # A máquina não acompanha o fator pedido: descarta o excedente em vez de acumular fila
+            estatisticas_simulacao["pontos_descartados"] += pontos - MAX_PONTOS_POR_LOTE
+            pontos = MAX_PONTOS_POR_LOTE
+        with fase("simulador"):
+            for _ in range(pontos):
+                novo_dado = _gerar_leitura()
+                if novo_dado is not None:
+                    novos_dados.append(novo_dado)
+
+    if novos_dados:
+        with fase("registro"):
+            registrar_dados(novos_dados, estado_do_simulador(simulator, novos_dados[-1].timestamp))
+    estatisticas_simulacao["pontos_gerados"] += len(novos_dados)
+    estatisticas_simulacao["ultimo_lote"] = len(novos_dados)
+    taxa = len(novos_dados) / decorrido if decorrido > 0 else 0.0
+    estatisticas_simulacao["pontos_por_seg"] = round(0.8 * estatisticas_simulacao["pontos_por_seg"] + 0.2 * taxa, 2)
+
+
+def definir_fator_compressao(fator):
+    global fator_compressao, credito_simulado_seg
+    fator_compressao = float(fator)
+    credito_simulado_seg = 0.0
+    log_simulador.info("Fator de compressão do tempo ajustado para %s.",
+                       'máximo' if fator_compressao == FATOR_COMPRESSAO_MAXIMO else f'{fator_compressao:g}x')
+
+
+# --- Avaliação de Alertas ---
+def calcular_niveis_alerta(data):
+    """Parte pesada da avaliação; roda fora do loop asyncio.
+
+    Devolve (nível chuva, acumulado 72h, nível solo, umidades 1/2/3 m usadas no nível de solo).
+    """
+    accumulated_72h = calculate_accumulated_72h(data)
+    rain_alert_level, _ = calculate_rain_alert(accumulated_72h)
+
+    # Valores sinalizados pelo QC não disparam alerta
+    leitura_solo = ultima_leitura_valida(janela_72h(data))
+    soil_alert_level, _ = calculate_soil_alert(leitura_solo)
+    umidades = tuple(float(leitura_solo[campo][0]) for campo in CAMPOS_UMIDADE) if len(leitura_solo) else ()
+    return rain_alert_level, accumulated_72h, soil_alert_level, umidades
+
+
+def registrar_mudancas_de_nivel(timestamp, rain_alert_level, accumulated_72h, soil_alert_level, umidades):
+    """Grava no histórico as mudanças de nível desde a última avaliação."""
+    if rain_alert_level != global_last_rain_alert_level:
+        historico_alertas.registrar(ESTACAO_ID, "chuva", global_last_rain_alert_level, rain_alert_level, timestamp,
+                                    (accumulated_72h,))
+    if soil_alert_level != global_last_soil_alert_level:
+        historico_alertas.registrar(ESTACAO_ID, "solo", global_last_soil_alert_level, soil_alert_level, timestamp,
+                                    umidades)
+
+
+async def avaliar_alertas():
+    global global_last_rain_alert_level, global_last_soil_alert_level
+    data = obter_dados()
+    if not len(data): return
+    with fase("niveis"):
+        rain_alert_level, accumulated_72h, soil_alert_level, umidades = await asyncio.to_thread(
+            calcular_niveis_alerta, data)
+    registrar_mudancas_de_nivel(int(data['timestamp'][-1]), rain_alert_level, accumulated_72h, soil_alert_level,
+                                umidades)
+
+    agora_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    if rain_alert_level == "Paralização" and global_last_rain_alert_level != "Paralização":
+        log_alertas.warning("Chuva atingiu Paralização (%.2f mm).", accumulated_72h,
+                            extra={"campos": {"tipo": "chuva", "nivel": rain_alert_level,
+                                              "nivel_anterior": global_last_rain_alert_level}})
+        email_subject = f"[ALERTA DE PARALIZAÇÃO] Chuva - {agora_str}"
+        email_body = (f"O monitoramento simulado atingiu o nível de PARALIZAÇÃO por CHUVA.\n\n"
+                      f"- Acumulado 72h: {accumulated_72h:.2f} mm\n- Nível Anterior: {global_last_rain_alert_level}\n- Horário: {agora_str}")
+        asyncio.create_task(send_email_alert_async(email_subject, email_body))
+        sms_message = f"ALERTA PARALIZACAO (Chuva): Acum. 72h={accumulated_72h:.1f}mm. Nivel ant: {global_last_rain_alert_level}. Hora: {agora_str[-5:]}"
+        asyncio.create_task(send_sms_alert_async(sms_message[:160]))
+
+    # Novo bloco para Umidade do Solo
+    if soil_alert_level in ["Paralização", "Alerta",
+                            "Atenção"] and global_last_soil_alert_level != soil_alert_level:
+        if soil_alert_level == "Paralização":
+            log_alertas.warning("Umidade atingiu Paralização.", extra={"campos": {
+                "tipo": "solo", "nivel": soil_alert_level, "nivel_anterior": global_last_soil_alert_level}})
+            email_subject = f"[ALERTA DE PARALIZAÇÃO] Solo - {agora_str}"
+            email_body = (f"O monitoramento simulado atingiu o nível de PARALIZAÇÃO por UMIDADE DO SOLO.\n\n"
+                          f"- Nível Atual: {soil_alert_level}\n- Nível Anterior: {global_last_soil_alert_level}\n- Horário: {agora_str}")
+            asyncio.create_task(send_email_alert_async(email_subject, email_body))
+            sms_message = f"ALERTA PARALIZACAO (Solo): Umidade atingiu nivel {soil_alert_level}. Nivel ant: {global_last_soil_alert_level}. Hora: {agora_str[-5:]}"
+            asyncio.create_task(send_sms_alert_async(sms_message[:160]))
+        elif soil_alert_level == "Alerta":
+            log_alertas.warning("Umidade atingiu Alerta.", extra={"campos": {
+                "tipo": "solo", "nivel": soil_alert_level, "nivel_anterior": global_last_soil_alert_level}})
+            email_subject = f"[ALERTA] Solo - {agora_str}"
+            email_body = (f"O monitoramento simulado atingiu o nível de ALERTA por UMIDADE DO SOLO.\n\n"
+                          f"- Nível Atual: {soil_alert_level}\n- Nível Anterior: {global_last_soil_alert_level}\n- Horário: {agora_str}")
+            asyncio.create_task(send_email_alert_async(email_subject, email_body))
+            sms_message = f"ALERTA (Solo): Umidade atingiu nivel {soil_alert_level}. Nivel ant: {global_last_soil_alert_level}. Hora: {agora_str[-5:]}"
+            asyncio.create_task(send_sms_alert_async(sms_message[:160]))
+        elif soil_alert_level == "Atenção":
+            log_alertas.warning("Umidade atingiu Atenção.", extra={"campos": {
+                "tipo": "solo", "nivel": soil_alert_level, "nivel_anterior": global_last_soil_alert_level}})
+            # Atenção não costuma gerar SMS/E-mail, mas mantive o log de transição
+
+    # Bloco de Normalização
+    if soil_alert_level == "Livre" and global_last_soil_alert_level != "Livre":
+        log_alertas.info("Umidade retornou para Livre.", extra={"campos": {
+            "tipo": "solo", "nivel": soil_alert_level, "nivel_anterior": global_last_soil_alert_level}})
+        email_subject = f"[NORMALIZADO] Umidade do Solo - {agora_str}"
+        email_body = (f"O monitoramento simulado retornou ao nível LIVRE para Umidade do Solo.\n\n"
+                      f"- Nível Anterior: {global_last_soil_alert_level}\n- Horário: {agora_str}")
+        asyncio.create_task(send_email_alert_async(email_subject, email_body))
+        sms_message = f"NORMALIZADO (Umidade Solo): Retornou p/ Livre. Nivel ant: {global_last_soil_alert_level}. Hora: {agora_str[-5:]}"
+        asyncio.create_task(send_sms_alert_async(sms_message[:160]))
+
+    global_last_rain_alert_level = rain_alert_level
+    global_last_soil_alert_level = soil_alert_level
+
+
+# --- Ciclo de Vida da Simulação (modos "unico" e "produtor") ---
+def iniciar_simulacao(apagar_historico=False):
+    """Reseta o estado e preenche os dados iniciais.
+
+    O histórico em disco (dias arquivados e eventos de alerta) sobrevive ao boot do processo;
+    só um reinício explícito (`apagar_historico=True`, /restart-simulation) o apaga.
+    """
     global simulated_time_utc, simulator
-    print("LOG SIMULADOR: Tarefa 'rodar_simulador' iniciada.")
-    while True:
-        try:
-            for _ in range(6):
-                last_data = data_store[-1] if data_store else {}
-                c_deprec = last_data.get("precipitacao_acumulada_mm", 0.0) if isinstance(last_data, dict) else 0.0
-                novo_dado = simulator.gerar_novo_dado(c_deprec, simulated_time_utc, list(data_store))
-                if isinstance(novo_dado, dict):
-                    data_store.append(novo_dado)
-                else:
-                    print(f"WARN: Simulador retornou dado inválido: {novo_dado}")
-                simulated_time_utc += datetime.timedelta(minutes=10)
-            await asyncio.sleep(INTERVALO_ATUALIZACAO_BACKEND_SEG)
-        except asyncio.CancelledError:
-            print("LOG SIMULADOR: Tarefa 'rodar_simulador' cancelada.")
-            break
-        except Exception as e:
-            print(f"ERRO na tarefa 'rodar_simulador': {e}")
-            await asyncio.sleep(30)
+    global global_last_rain_alert_level, global_last_soil_alert_level
 
+    data_store.limpar()
+    global versao_dados_local, estado_modelo_atual
+    versao_dados_local += 1
+    estado_modelo_atual = None
+    if buffer_compartilhado is not None and MODO_EXECUCAO == "produtor":
+        buffer_compartilhado.resetar()
+    simulator = SensorSimulator()
+    historico_simulacao.clear()
+    controle_qc.limpar()
+    if apagar_historico:
+        politica_retencao.limpar()  # Histórico simulado: recomeça do zero (inclusive em disco)
+        historico_alertas.limpar()
+    global credito_simulado_seg, ultimo_tick_simulacao
+    credito_simulado_seg = 0.0
+    ultimo_tick_simulacao = None
+    # Continua do nível em vigor no histórico persistido ("Livre" se ele estiver vazio)
+    global_last_rain_alert_level = historico_alertas.ultimo_nivel(ESTACAO_ID, "chuva")
+    global_last_soil_alert_level = historico_alertas.ultimo_nivel(ESTACAO_ID, "solo")
 
-# --- Tarefa de Monitoramento de Alertas ---
-async def monitorar_alertas():
-    global global_last_rain_alert_level, global_last_soil_alert_level
-    print("LOG MONITOR: Tarefa 'monitorar_alertas' iniciada.")
-    while True:
-        try:
-            await asyncio.sleep(INTERVALO_MONITOR_ALERTA_SEG)
-            data = list(data_store)
-            if not data: continue
-
-            rain_alert_level = "Livre";
-            accumulated_72h = 0.0
-            valid_data = [d for d in data if isinstance(d, dict) and 'timestamp' in d and 'pluviometria_mm' in d]
-            if valid_data:
-                df_temp = pd.DataFrame(valid_data)
-                if 'timestamp' in df_temp.columns and 'pluviometria_mm' in df_temp.columns:
-                    try:
-                        df_temp['timestamp'] = pd.to_datetime(df_temp['timestamp'])
-                        df_temp.set_index('timestamp', inplace=True)
-                        latest_timestamp = df_temp.index[-1]
-                        timestamp_72h_ago = latest_timestamp - pd.Timedelta(hours=72)
-                        df_last_72h = df_temp[df_temp.index >= timestamp_72h_ago]
-                        if not df_last_72h.empty: accumulated_72h = df_last_72h['pluviometria_mm'].sum()
-                        if accumulated_72h >= 90:
-                            rain_alert_level = "Paralização"
-                        elif accumulated_72h >= 70:
-                            rain_alert_level = "Alerta"
-                        elif accumulated_72h >= 51:
-                            rain_alert_level = "Atenção"
-                    except Exception as e:
-                        print(f"WARN MONITOR: Erro cálculo chuva: {e}")
-                        pass
-
-            soil_alert_level, _ = calculate_soil_alert(data)
-
-            agora_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-            if rain_alert_level == "Paralização" and global_last_rain_alert_level != "Paralização":
-                print(f"GATILHO DE ALERTA: Chuva atingiu Paralização ({accumulated_72h:.2f} mm).")
-                email_subject = f"[ALERTA DE PARALIZAÇÃO] Chuva - {agora_str}"
-                email_body = (f"O monitoramento simulado atingiu o nível de PARALIZAÇÃO por CHUVA.\n\n"
-                              f"- Acumulado 72h: {accumulated_72h:.2f} mm\n- Nível Anterior: {global_last_rain_alert_level}\n- Horário: {agora_str}")
-                asyncio.create_task(send_email_alert_async(email_subject, email_body))
-                sms_message = f"ALERTA PARALIZACAO (Chuva): Acum. 72h={accumulated_72h:.1f}mm. Nivel ant: {global_last_rain_alert_level}. Hora: {agora_str[-5:]}"
-                asyncio.create_task(send_sms_alert_async(sms_message[:160]))
-
-            # Novo bloco para Umidade do Solo
-            if soil_alert_level in ["Paralização", "Alerta",
-                                    "Atenção"] and global_last_soil_alert_level != soil_alert_level:
-                if soil_alert_level == "Paralização":
-                    print(f"GATILHO DE ALERTA: Umidade atingiu Paralização.")
-                    email_subject = f"[ALERTA DE PARALIZAÇÃO] Solo - {agora_str}"
-                    email_body = (f"O monitoramento simulado atingiu o nível de PARALIZAÇÃO por UMIDADE DO SOLO.\n\n"
-                                  f"- Nível Atual: {soil_alert_level}\n- Nível Anterior: {global_last_soil_alert_level}\n- Horário: {agora_str}")
-                    asyncio.create_task(send_email_alert_async(email_subject, email_body))
-                    sms_message = f"ALERTA PARALIZACAO (Solo): Umidade atingiu nivel {soil_alert_level}. Nivel ant: {global_last_soil_alert_level}. Hora: {agora_str[-5:]}"
-                    asyncio.create_task(send_sms_alert_async(sms_message[:160]))
-                elif soil_alert_level == "Alerta":
-                    print(f"GATILHO DE ALERTA: Umidade atingiu Alerta.")
-                    email_subject = f"[ALERTA] Solo - {agora_str}"
-                    email_body = (f"O monitoramento simulado atingiu o nível de ALERTA por UMIDADE DO SOLO.\n\n"
-                                  f"- Nível Atual: {soil_alert_level}\n- Nível Anterior: {global_last_soil_alert_level}\n- Horário: {agora_str}")
-                    asyncio.create_task(send_email_alert_async(email_subject, email_body))
-                    sms_message = f"ALERTA (Solo): Umidade atingiu nivel {soil_alert_level}. Nivel ant: {global_last_soil_alert_level}. Hora: {agora_str[-5:]}"
-                    asyncio.create_task(send_sms_alert_async(sms_message[:160]))
-                elif soil_alert_level == "Atenção":
-                    print(f"GATILHO DE ALERTA: Umidade atingiu Atenção.")
-                    # Atenção não costuma gerar SMS/E-mail, mas mantive o log de transição
-
-            # Bloco de Normalização
-            if soil_alert_level == "Livre" and global_last_soil_alert_level != "Livre":
-                print(f"GATILHO DE ALERTA: Umidade retornou para Livre.")
-                email_subject = f"[NORMALIZADO] Umidade do Solo - {agora_str}"
-                email_body = (f"O monitoramento simulado retornou ao nível LIVRE para Umidade do Solo.\n\n"
-                              f"- Nível Anterior: {global_last_soil_alert_level}\n- Horário: {agora_str}")
-                asyncio.create_task(send_email_alert_async(email_subject, email_body))
-                sms_message = f"NORMALIZADO (Umidade Solo): Retornou p/ Livre. Nivel ant: {global_last_soil_alert_level}. Hora: {agora_str[-5:]}"
-                asyncio.create_task(send_sms_alert_async(sms_message[:160]))
-
-            global_last_rain_alert_level = rain_alert_level
-            global_last_soil_alert_level = soil_alert_level
-
-
-        except asyncio.CancelledError:
-            print("LOG MONITOR: Tarefa 'monitorar_alertas' cancelada.")
-            break
-        except Exception as e:
-            print(f"ERRO na tarefa 'monitorar_alertas': {e}")
-            await asyncio.sleep(30)
+    agora = datetime.datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    simulated_time_utc = agora - datetime.timedelta(minutes=10 * NUM_DADOS_INICIAIS)
+    log_simulador.info("Preenchendo %d dados iniciais a partir de %s.", NUM_DADOS_INICIAIS, simulated_time_utc)
+    dados_iniciais = []
+    for i in range(NUM_DADOS_INICIAIS):
+        novo_dado = _gerar_leitura()
+        if novo_dado is not None:
+            dados_iniciais.append(novo_dado)
+    registrar_dados(dados_iniciais, estado_do_simulador(simulator, dados_iniciais[-1].timestamp)
+                    if dados_iniciais else None)
+    aplicar_retencao()  # Tarefas paradas aqui: o corte do preenchimento não espera o agendador
+    log_simulador.info("Preenchimento inicial concluído.")
+
+
+# --- Relatórios Agendados ---
+def gerar_relatorios_agendados():
+    """Envia ao pool os relatórios diários/semanais dos dias completos que ainda não estão no diretório."""
+    completos = dias_completos(obter_dados())
+    if completos is None:
+        return
+    primeiro_dia, ultimo_dia = completos
+    estacoes = status_cache.estacoes() or [ESTACAO_ID]
+    jobs = []
+    dia = max(primeiro_dia, ultimo_dia - datetime.timedelta(days=MAX_DIAS_PENDENTES_RELATORIOS - 1))
+    while dia <= ultimo_dia:
+        jobs.extend(job for job in jobs_para(estacoes, PERIODOS, dia, semanas_fechadas=True)
+                    if not gerador_relatorios.ja_gerado(job) and not gerador_relatorios.em_andamento(job))
+        dia += datetime.timedelta(days=1)
+    if not jobs:
+        return
+
+    # Histórico único em memória: todas as estações leem o mesmo armazenamento
+    def fonte_blocos(estacao, inicio_epoch, fim_epoch, aquecimento_seg):
+        return iterar_leituras(inicio_epoch, fim_epoch, aquecimento_seg=aquecimento_seg)
+
+    # A thread do agendador só agrega e envia: a renderização segue no pool e o lote é
+    # registrado quando termina, sem segurar a thread (as outras tarefas dividem o pool)
+    gerador_relatorios.enviar(jobs, fonte_blocos).add_done_callback(_registrar_lote_relatorios)
+
+
+def _registrar_lote_relatorios(lote):
+    if lote.cancelled() or lote.exception() is not None:
+        log_relatorios.error("Lote de relatórios agendados falhou: %s", lote.exception() if not lote.cancelled()
+                             else "cancelado")
+        return
+    manifest = lote.result()
+    log_relatorios.info("%d relatório(s) gerado(s), %d falha(s) em %ss (%s relatórios/min).", manifest['relatorios'],
+                        manifest['falhas'], manifest['duracao_seg'], manifest['relatorios_por_minuto'])
+
+
+# Simulação roda numa thread (CPU); o envio dos alertas precisa do loop (create_task)
+agendador.registrar(TarefaPeriodica("simulacao", passo_simulacao, INTERVALO_ATUALIZACAO_BACKEND_SEG,
+                                    politica=POLITICA_SIMULACAO, em_thread=True, atraso_inicial_seg=0))
+agendador.registrar(TarefaPeriodica("alertas", avaliar_alertas, INTERVALO_MONITOR_ALERTA_SEG,
+                                    politica=POLITICA_ALERTAS))
+# Retenção em thread: o corte grava .npy e varre o diretório do disco
+agendador.registrar(TarefaPeriodica("retencao", aplicar_retencao, INTERVALO_RETENCAO_SEG,
+                                    politica="pular", em_thread=True))
+if RELATORIOS_AGENDADOS:
+    agendador.registrar(TarefaPeriodica("relatorios_lote", gerar_relatorios_agendados, INTERVALO_RELATORIOS_LOTE_SEG,
+                                        politica="pular", em_thread=True))
+
+
+def iniciar_tarefas():
+    agendador.iniciar()
+    log_execucao.info("Tarefas de background iniciadas.")
+
+
+async def parar_tarefas(timeout):
+    await agendador.parar(timeout=timeout)
+
+
+async def reiniciar_simulacao():
+    log_execucao.info("Reiniciando simulação.")
+    # O agendador para as tarefas e espera as execuções em thread terminarem antes de resetar o estado
+    await agendador.reiniciar(preparar=lambda: iniciar_simulacao(apagar_historico=True), timeout=1.0)
+    log_execucao.info("Reinício concluído.")
+
+
+# --- Processo Produtor (modo multi-worker) ---
+async def executar_produtor():
+    """Loop principal do produtor: dono da simulação, dos alertas e da memória compartilhada."""
+    global buffer_compartilhado
+    buffer_compartilhado = SharedRingBuffer.criar(NOME_MEMORIA_COMPARTILHADA, CAPACIDADE_MEMORIA_COMPARTILHADA,
+                                                  TAMANHO_ESTADO)
+    log_execucao.info("Produtor: memória compartilhada '%s' criada (%d leituras).", NOME_MEMORIA_COMPARTILHADA,
+                      buffer_compartilhado.capacidade)
+    try:
+        iniciar_simulacao()
+        iniciar_tarefas()
+        pedidos_vistos = buffer_compartilhado.pedidos_reinicio()
+        pedidos_fator_vistos, _ = buffer_compartilhado.pedido_fator()
+        while True:
+            await asyncio.sleep(INTERVALO_VERIFICACAO_REINICIO_SEG)
+            pedidos = buffer_compartilhado.pedidos_reinicio()
+            if pedidos != pedidos_vistos:
+                pedidos_vistos = pedidos
+                await reiniciar_simulacao()
+            pedidos_fator, fator = buffer_compartilhado.pedido_fator()
+            if pedidos_fator != pedidos_fator_vistos:
+                pedidos_fator_vistos = pedidos_fator
+                definir_fator_compressao(fator)
+    finally:
+        await parar_tarefas(timeout=2.0)
+        agendador.desligar()
+        gerador_relatorios.desligar()
+        buffer_compartilhado.fechar()
+        buffer_compartilhado = None
+        log_execucao.info("Produtor: memória compartilhada liberada.")
 
 
 # --- Gerenciador de "Lifespan" do FastAPI ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global simulated_time_utc, simulator, data_store
-    global global_task_simulador, global_task_monitor
-
-    print(f"Iniciando simulador (lifespan)...")
-    data_store.clear()
-    simulator = SensorSimulator()
-    agora = datetime.datetime.now(timezone.utc).replace(second=0, microsecond=0)
-    simulated_time_utc = agora - datetime.timedelta(minutes=10 * NUM_DADOS_INICIAIS)
-    print(f"Tempo inicial: {simulated_time_utc}")
-    print(f"Preenchendo {NUM_DADOS_INICIAIS} dados iniciais...")
-    for i in range(NUM_DADOS_INICIAIS):
-        last_data = data_store[-1] if data_store else {}
-        c_deprec = last_data.get("precipitacao_acumulada_mm", 0.0) if isinstance(last_data, dict) else 0.0
-        novo_dado = simulator.gerar_novo_dado(c_deprec, simulated_time_utc, list(data_store))
-        if isinstance(novo_dado, dict):
-            data_store.append(novo_dado)
-        else:
-            print(f"WARN (Lifespan): Simulador retornou dado inválido: {novo_dado}")
-        simulated_time_utc += datetime.timedelta(minutes=10)
-    print("Preenchimento inicial concluído.")
+    if MODO_EXECUCAO == "leitor":
+        # Workers leitores não simulam nem alertam: tudo vem do processo produtor
+        log_execucao.info("Iniciando worker leitor (memória compartilhada '%s').", NOME_MEMORIA_COMPARTILHADA)
+        yield
+        dash_bridge.desligar()
+        if buffer_compartilhado is not None:
+            buffer_compartilhado.fechar()
+        return
 
-    global_task_simulador = asyncio.create_task(rodar_simulador())
-    global_task_monitor = asyncio.create_task(monitorar_alertas())
-    print("Tarefas de background iniciadas.")
+    log_execucao.info("Iniciando simulador (lifespan).")
+    iniciar_simulacao()
+    iniciar_tarefas()
 
     yield
 
-    print("Desligando (lifespan): Cancelando tarefas...")
-    tasks_to_cancel = []
-    if global_task_simulador: tasks_to_cancel.append(global_task_simulador)
-    if global_task_monitor: tasks_to_cancel.append(global_task_monitor)
-    valid_tasks = [t for t in tasks_to_cancel if t]
-    if valid_tasks:
-        for task in valid_tasks:
-            if not task.done():
-                task.cancel()
-        try:
-            await asyncio.wait(valid_tasks, timeout=2.0, return_when=asyncio.ALL_COMPLETED)
-        except asyncio.TimeoutError:
-            print("WARN Lifespan: Timeout esperando tarefas cancelarem no desligamento.")
-        except Exception as e:
-            print(f"WARN Lifespan: Exceção esperando tarefas cancelarem: {e}")
-
-    global_task_simulador = None
-    global_task_monitor = None
-    print("Simulador e Monitor parados (lifespan).")
+    log_execucao.info("Desligando (lifespan): cancelando tarefas.")
+    await parar_tarefas(timeout=2.0)
+    agendador.desligar()
+    gerador_relatorios.desligar()
+    dash_bridge.desligar()
+    log_execucao.info("Simulador e monitor parados (lifespan).")
 
 
 # --- Configuração do App FastAPI ---
 app = FastAPI(lifespan=lifespan)
+# Rotas da API rastreadas aqui; as requisições do Dash são rastreadas no executor (dash_bridge).
+# O perfil dura segundos de propósito e fica de fora.
+app.add_middleware(MiddlewareRastreamento, ignorar_prefixos=("/dashboard", "/api/admin/perfil"))
 
 # --- Configuração do App Dash [REINSERIDO] ---
 dash_app = dash.Dash(__name__, requests_pathname_prefix='/dashboard/', external_stylesheets=[dbc.themes.BOOTSTRAP])
@@ -412,6 +825,17 @@ dash_app.layout = dbc.Container([
         )
     ], className="mb-4 justify-content-center"),
 
+    # Card Nowcast (probabilidade de atingir cada nível nas próximas horas)
+    dbc.Row([
+        dbc.Col(
+            dbc.Card([
+                dbc.CardHeader("Previsão dos Níveis (próximas horas)", className="text-center fw-bold"),
+                dbc.CardBody(id='nowcast-display', className="text-center")
+            ]),
+            width=12, lg=8, className="mb-3"
+        )
+    ], className="mb-4 justify-content-center"),
+
     # Dropdown de Período
     dbc.Row([
         dbc.Col([
@@ -439,36 +863,108 @@ dash_app.layout = dbc.Container([
 ], fluid=True)
 
 
-# --- Função Auxiliar para Calcular Nível de Umidade ---
-def calculate_soil_alert(current_data):
-    soil_alert_level = "Livre";
-    soil_alert_color = "green"
-    is_above_1m, is_above_2m, is_above_3m = False, False, False
-    last_valid_data = None
-    if current_data:
-        for item in reversed(current_data):
-            if isinstance(item, dict):
-                last_valid_data = item
-                break
-    if last_valid_data:
-        current_1m = last_valid_data.get('umidade_1m_perc', UMIDADE_BASE_1M)
-        current_2m = last_valid_data.get('umidade_2m_perc', UMIDADE_BASE_2M)
-        current_3m = last_valid_data.get('umidade_3m_perc', UMIDADE_BASE_3M)
-        is_above_1m = current_1m >= (UMIDADE_BASE_1M + 5.0)
-        is_above_2m = current_2m >= (UMIDADE_BASE_2M + 5.0)
-        is_above_3m = current_3m >= (UMIDADE_BASE_3M + 1.0)
-
-    if is_above_1m and is_above_2m and is_above_3m:
-        soil_alert_level, soil_alert_color = "Paralização", "red"
-    elif is_above_2m and is_above_3m:
-        soil_alert_level, soil_alert_color = "Alerta", "orange"
-    elif is_above_1m and is_above_2m:
-        soil_alert_level, soil_alert_color = "Alerta", "orange"
-    elif is_above_3m:
-        soil_alert_level, soil_alert_color = "Atenção", "gold"
-    elif is_above_1m:
-        soil_alert_level, soil_alert_color = "Atenção", "gold"
-    return soil_alert_level, soil_alert_color
+# --- Janela de 72h (alertas, mapa, API e dashboard usam as mesmas funções) ---
+def janela_72h(current_data):
+    """Leituras de (mais recente - 72h, mais recente], a janela de windows.py."""
+    if not len(current_data):
+        return current_data
+    inicio, fim = limites_janela(current_data['timestamp'], current_data['timestamp'][-1], JANELA_CHUVA_72H_SEG)
+    return current_data[inicio:fim]
+
+
+def janelas_chuva(current_data):
+    """JanelasAgregadas da chuva válida, montada uma vez por versão das leituras.
+
+    Alertas, status e os callbacks do dashboard consultam a mesma instância (O(log n) por janela).
+    """
+    global cache_janelas_chuva
+    versao = versao_dados()
+    versao_cache, janelas = cache_janelas_chuva
+    if (versao_cache == versao and len(janelas) == len(current_data)
+            and janelas.timestamps[-1] == current_data['timestamp'][-1]):
+        return janelas
+    janelas = JanelasAgregadas(current_data['timestamp'], chuva_valida(current_data))
+    cache_janelas_chuva = (versao, janelas)
+    return janelas
+
+
+def resumo_chuva_72h(current_data):
+    """Soma, máximo, leituras e slots de 10 min faltantes da chuva válida nas últimas 72h."""
+    if not len(current_data):
+        return {"soma": 0.0, "maximo": None, "leituras": 0, "slots_esperados": 0, "slots_faltantes": 0}
+    return janelas_chuva(current_data).resumo(current_data['timestamp'][-1], JANELA_CHUVA_72H_SEG)
+
+
+def calculate_accumulated_72h(current_data):
+    return resumo_chuva_72h(current_data)["soma"]
+
+
+# --- Status Pré-calculado (mapa / API) ---
+def calcular_status_estacao(current_data):
+    resumo_72h = resumo_chuva_72h(current_data)
+    accumulated_72h = resumo_72h["soma"]
+    rain_level, rain_color = calculate_rain_alert(accumulated_72h)
+    soil_level, soil_color = calculate_soil_alert(ultima_leitura_valida(janela_72h(current_data)))
+    return {
+        "timestamp": epoch_para_iso(current_data['timestamp'][-1]) if len(current_data) else None,
+        "accumulated_72h": round(accumulated_72h, 2),
+        "leituras_72h": resumo_72h["leituras"],
+        "slots_faltantes_72h": resumo_72h["slots_faltantes"],
+        "rain_alert_level": rain_level,
+        "rain_alert_color": rain_color,
+        "rain_height_percent": round(max(0.0, min(100.0, accumulated_72h / LIMITE_CHUVA_72H * 100)), 1),
+        "soil_alert_level": soil_level,
+        "soil_alert_color": soil_color,
+        "soil_height_percent": soil_height_percent(soil_level),
+    }
+
+
+def atualizar_status(forcar=False):
+    """Recalcula o status se as leituras mudaram desde o último cálculo (ou se `forcar`)."""
+    versao = versao_dados()
+    if not forcar and status_cache.versao == versao:
+        return
+    status_por_estacao = {ESTACAO_ID: calcular_status_estacao(obter_dados())}
+    status_cache.atualizar(versao, status_por_estacao)
+    registro_estacoes.atualizar_niveis(versao, status_por_estacao)
+
+
+# --- Nowcast (probabilidade dos níveis nas próximas horas) ---
+def obter_nowcast():
+    """Nowcast da estação; recalculado no máximo uma vez por versão das leituras."""
+    global cache_nowcast
+    versao = versao_dados()
+    if cache_nowcast[0] == versao:
+        return cache_nowcast[1]
+    resultado = None
+    estado = obter_estado_modelo()
+    data = obter_dados()
+    if estado is not None and len(data):
+        # Histórico de 72h até a leitura a que o estado corresponde
+        ts_estado = int(estado[0])
+        inicio, fim = limites_janela(data['timestamp'], ts_estado, JANELA_CHUVA_72H_SEG)
+        janela = data[inicio:fim]
+        # Semente derivada da leitura: todos os workers obtêm o mesmo resultado
+        with fase("nowcast"):
+            horizontes = prever(estado, janela['timestamp'], chuva_valida(janela), membros=MEMBROS_NOWCAST,
+                                semente=ts_estado)
+        resultado = {"estacao": ESTACAO_ID, "timestamp": epoch_para_iso(ts_estado),
+                     "membros": MEMBROS_NOWCAST, "horizontes": horizontes}
+    cache_nowcast = (versao, resultado)
+    return resultado
+
+
+# --- Linha do Tempo dos Níveis (faixa no topo dos gráficos) ---
+def faixas_alerta(tipo, indice):
+    """Shapes do plotly com os níveis de `tipo` no período de `indice` (DatetimeIndex do gráfico)."""
+    if MODO_EXECUCAO == "leitor":
+        historico_alertas.recarregar()
+    inicio, fim = indice[0].timestamp(), indice[-1].timestamp()
+    return [dict(type="rect", xref="x", yref="paper", y0=0.96, y1=1.0, line_width=0, layer="below",
+                 fillcolor=CORES[nivel], opacity=0.6,
+                 x0=datetime.datetime.fromtimestamp(x0, tz=timezone.utc),
+                 x1=datetime.datetime.fromtimestamp(x1, tz=timezone.utc))
+            for x0, x1, nivel in intervalos_de_nivel(historico_alertas, ESTACAO_ID, tipo, inicio, fim)]
 
 
 # --- Callbacks Separados ---
@@ -486,63 +982,51 @@ def update_rain_and_general_alerts(n_intervals, selected_hours):
     today = datetime.date.today()
     default_min_date = date(2020, 1, 1)
 
-    data = list(data_store)
-    valid_data = [d for d in data if isinstance(d, dict) and 'timestamp' in d]
+    data = obter_dados()
 
-    if not valid_data:
+    if not len(data):
         return fig_pluvia_default, rain_alert_default, today, default_min_date
 
-    try:
-        latest_date = datetime.datetime.fromisoformat(valid_data[-1]['timestamp']).date()
-        earliest_date = datetime.datetime.fromisoformat(valid_data[0]['timestamp']).date()
-    except Exception:
-        latest_date, earliest_date = today, default_min_date
-
-    df = pd.DataFrame(valid_data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df.set_index('timestamp', inplace=True)
-
-    rain_alert_level, rain_alert_color = "Livre", "green";
-    accumulated_72h = 0.0
-    latest_timestamp = df.index[-1];
-    timestamp_72h_ago = latest_timestamp - pd.Timedelta(hours=72)
-    df_last_72h = df[df.index >= timestamp_72h_ago]
-    if not df_last_72h.empty: accumulated_72h = df_last_72h['pluviometria_mm'].sum()
-    if accumulated_72h >= 90:
-        rain_alert_level, rain_alert_color = "Paralização", "red"
-    elif accumulated_72h >= 70:
-        rain_alert_level, rain_alert_color = "Alerta", "orange"
-    elif accumulated_72h >= 51:
-        rain_alert_level, rain_alert_color = "Atenção", "gold"
+    latest_date = datetime.datetime.fromtimestamp(int(data['timestamp'][-1]), tz=timezone.utc).date()
+    earliest_date = data_mais_antiga_disponivel(data)
+
+    with fase("niveis"):
+        _, accumulated_72h, _, _ = calcular_niveis_alerta(data)
+    rain_alert_level, rain_alert_color = calculate_rain_alert(accumulated_72h)
     rain_alert_display_content = html.H4(f"{rain_alert_level}", style={'color': rain_alert_color, 'fontWeight': 'bold'})
 
-    df_filtered = df.tail(int(selected_hours) * PONTOS_POR_HORA)
+    # Só as leituras do período selecionado viram DataFrame
+    with fase("dataframe"):
+        # Período por timestamp, alinhado à grade de 10 min (lacunas aparecem como falhas no gráfico)
+        df_filtered = para_dataframe(reamostrar(selecionar_periodo(data, selected_hours)))
     if df_filtered.empty:
         return fig_pluvia_default, rain_alert_display_content, latest_date, earliest_date
 
-    max_rain_in_window = df_filtered.get('pluviometria_mm', pd.Series(dtype=float)).max()
-    if pd.isna(max_rain_in_window): max_rain_in_window = 0
-    secondary_yaxis_max = 6 if max_rain_in_window < 5 else math.ceil(max_rain_in_window) + 1
+    with fase("figura"):
+        max_rain_in_window = df_filtered.get('pluviometria_mm', pd.Series(dtype=float)).max()
+        if pd.isna(max_rain_in_window): max_rain_in_window = 0
+        secondary_yaxis_max = 6 if max_rain_in_window < 5 else math.ceil(max_rain_in_window) + 1
 
-    df_filtered = df_filtered.copy()
-    if 'pluviometria_mm' in df_filtered.columns:
-        df_filtered['precipitacao_acumulada_recalculada'] = df_filtered['pluviometria_mm'].cumsum()
-    else:
-        df_filtered['precipitacao_acumulada_recalculada'] = 0.0
-
-    fig_pluvia = make_subplots(specs=[[{"secondary_y": True}]])
-    fig_pluvia.add_trace(go.Bar(x=df_filtered.index, y=df_filtered.get('pluviometria_mm'), name='Pluviometria (mm)',
-                                marker_color='rgb(55, 83, 109)'), secondary_y=True)
-    fig_pluvia.add_trace(go.Scatter(x=df_filtered.index, y=df_filtered.get('precipitacao_acumulada_recalculada'),
-                                    name='Precipitação Acumulada (mm)', mode='lines',
-                                    line=dict(color='rgb(26, 118, 255)')), secondary_y=False)
-    fig_pluvia.update_layout(title_text="Pluviometria Horária", hovermode="x unified", plot_bgcolor='white',
-                             paper_bgcolor='white',
-                             legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5))
-    fig_pluvia.update_yaxes(title_text="Precipitação Acumulada (mm)", secondary_y=False,
-                            range=[0, LIMITE_CHUVA_72H + 10], showgrid=False, zeroline=False)
-    fig_pluvia.update_yaxes(title_text="Pluviometria (mm)", secondary_y=True, range=[0, secondary_yaxis_max],
-                            showgrid=False, zeroline=False)
+        df_filtered = df_filtered.copy()
+        if 'pluviometria_mm' in df_filtered.columns:
+            df_filtered['precipitacao_acumulada_recalculada'] = df_filtered['pluviometria_mm'].fillna(0).cumsum()
+        else:
+            df_filtered['precipitacao_acumulada_recalculada'] = 0.0
+
+        fig_pluvia = make_subplots(specs=[[{"secondary_y": True}]])
+        fig_pluvia.add_trace(go.Bar(x=df_filtered.index, y=df_filtered.get('pluviometria_mm'), name='Pluviometria (mm)',
+                                    marker_color='rgb(55, 83, 109)'), secondary_y=True)
+        fig_pluvia.add_trace(go.Scatter(x=df_filtered.index, y=df_filtered.get('precipitacao_acumulada_recalculada'),
+                                        name='Precipitação Acumulada (mm)', mode='lines',
+                                        line=dict(color='rgb(26, 118, 255)')), secondary_y=False)
+        fig_pluvia.update_layout(title_text="Pluviometria Horária", hovermode="x unified", plot_bgcolor='white',
+                                 paper_bgcolor='white',
+                                 legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
+                                 shapes=faixas_alerta("chuva", df_filtered.index))
+        fig_pluvia.update_yaxes(title_text="Precipitação Acumulada (mm)", secondary_y=False,
+                                range=[0, LIMITE_CHUVA_72H + 10], showgrid=False, zeroline=False)
+        fig_pluvia.update_yaxes(title_text="Pluviometria (mm)", secondary_y=True, range=[0, secondary_yaxis_max],
+                                showgrid=False, zeroline=False)
 
     return fig_pluvia, rain_alert_display_content, latest_date, earliest_date
 
@@ -557,42 +1041,63 @@ def update_soil_elements(n_intervals, selected_hours):
     fig_umidade_default = go.Figure()
     soil_alert_default = html.H4("Calculando...", style={'color': 'grey'})
 
-    data = list(data_store)
-    valid_data = [d for d in data if isinstance(d, dict) and 'timestamp' in d]
+    data = obter_dados()
 
-    if not valid_data:
+    if not len(data):
         return fig_umidade_default, soil_alert_default
 
-    soil_alert_level, soil_alert_color = calculate_soil_alert(data)
+    soil_alert_level, soil_alert_color = calculate_soil_alert(ultima_leitura_valida(janela_72h(data)))
     soil_alert_display_content = html.H4(f"{soil_alert_level}", style={'color': soil_alert_color, 'fontWeight': 'bold'})
 
-    df = pd.DataFrame(valid_data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df.set_index('timestamp', inplace=True)
-
-    df_filtered = df.tail(int(selected_hours) * PONTOS_POR_HORA)
+    with fase("dataframe"):
+        # Período por timestamp, alinhado à grade de 10 min (lacunas aparecem como falhas no gráfico)
+        df_filtered = para_dataframe(reamostrar(selecionar_periodo(data, selected_hours)))
     if df_filtered.empty:
         return fig_umidade_default, soil_alert_display_content
 
-    fig_umidade = go.Figure()
-    fig_umidade.add_trace(
-        go.Scatter(x=df_filtered.index, y=df_filtered.get('umidade_1m_perc'), name='Profundidade 1 m', mode='lines',
-                   line=dict(color='#28a745', width=3)))
-    fig_umidade.add_trace(
-        go.Scatter(x=df_filtered.index, y=df_filtered.get('umidade_2m_perc'), name='Profundidade 2 m', mode='lines',
-                   line=dict(color='#ffc107', width=3)))
-    fig_umidade.add_trace(
-        go.Scatter(x=df_filtered.index, y=df_filtered.get('umidade_3m_perc'), name='Profundidade 3 m', mode='lines',
-                   line=dict(color='#dc3545', width=3)))
-    fig_umidade.update_layout(title_text="Umidade Volumétrica do Solo", yaxis_title="Umidade Volumétrica (%)",
-                              xaxis_title="Data e Hora", hovermode="x unified",
-                              yaxis_range=[UMIDADE_BASE_3M - 5, UMIDADE_SATURACAO + 5],
-                              plot_bgcolor='white', paper_bgcolor='white',
-                              legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5))
+    with fase("figura"):
+        fig_umidade = go.Figure()
+        fig_umidade.add_trace(
+            go.Scatter(x=df_filtered.index, y=df_filtered.get('umidade_1m_perc'), name='Profundidade 1 m', mode='lines',
+                       line=dict(color='#28a745', width=3)))
+        fig_umidade.add_trace(
+            go.Scatter(x=df_filtered.index, y=df_filtered.get('umidade_2m_perc'), name='Profundidade 2 m', mode='lines',
+                       line=dict(color='#ffc107', width=3)))
+        fig_umidade.add_trace(
+            go.Scatter(x=df_filtered.index, y=df_filtered.get('umidade_3m_perc'), name='Profundidade 3 m', mode='lines',
+                       line=dict(color='#dc3545', width=3)))
+        fig_umidade.update_layout(title_text="Umidade Volumétrica do Solo", yaxis_title="Umidade Volumétrica (%)",
+                                  xaxis_title="Data e Hora", hovermode="x unified",
+                                  yaxis_range=[UMIDADE_BASE_3M - 5, UMIDADE_SATURACAO + 5],
+                                  plot_bgcolor='white', paper_bgcolor='white',
+                                  legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5),
+                                  shapes=faixas_alerta("solo", df_filtered.index))
 
     return fig_umidade, soil_alert_display_content
 
 
+# --- Callback update_nowcast ---
+@dash_app.callback(
+    Output('nowcast-display', 'children'),
+    Input('interval-main', 'n_intervals')
+)
+def update_nowcast(n_intervals):
+    nowcast = obter_nowcast()
+    if nowcast is None:
+        return html.H4("Calculando...", style={'color': 'grey'})
+    niveis = ("Atenção", "Alerta", "Paralização")
+    cabecalho = html.Thead(html.Tr([html.Th("Horizonte")] + [html.Th(f"Solo: {n}") for n in niveis]
+                                   + [html.Th(f"Chuva: {n}") for n in niveis]))
+    linhas = []
+    for horizonte, previsao in nowcast["horizontes"].items():
+        linhas.append(html.Tr([html.Td(horizonte)]
+                              + [html.Td(f"{previsao['solo'][n] * 100:.0f}%") for n in niveis]
+                              + [html.Td(f"{previsao['chuva'][n] * 100:.0f}%") for n in niveis]))
+    return [dbc.Table([cabecalho, html.Tbody(linhas)], bordered=True, size="sm", className="mb-1"),
+            html.Small(f"Probabilidade de atingir o nível ({nowcast['membros']} simulações a partir da "
+                       f"leitura atual)", className="text-muted")]
+
+
 # --- Callback generate_pdf_report ---
 @dash_app.callback(
     Output("download-pdf-report", "data"),
@@ -603,96 +1108,28 @@ def update_soil_elements(n_intervals, selected_hours):
 )
 def generate_pdf_report(n_clicks, start_date_str, end_date_str):
     if not n_clicks or not start_date_str or not end_date_str:
-        print("Relatório: Data de início ou fim não selecionada.")
-        return dash.no_update
-    data = list(data_store)
-    valid_data = [d for d in data if isinstance(d, dict) and 'timestamp' in d]
-    if not valid_data:
-        print("Relatório: Sem dados válidos no data_store.")
+        log_relatorios.info("Data de início ou fim não selecionada.")
         return dash.no_update
-    df = pd.DataFrame(valid_data)
     try:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
         start_date = datetime.datetime.strptime(start_date_str, '%Y-%m-%d').date()
         end_date = datetime.datetime.strptime(end_date_str, '%Y-%m-%d').date()
         start_dt = datetime.datetime(start_date.year, start_date.month, start_date.day, 0, 0, 0, tzinfo=timezone.utc)
         end_dt = datetime.datetime(end_date.year, end_date.month, end_date.day, 23, 59, 59, tzinfo=timezone.utc)
-        df_report = df[(df['timestamp'] >= start_dt) & (df['timestamp'] <= end_dt)].copy()
-        if df_report.empty:
-            print(f"Relatório: Sem dados para o período de {start_dt.date()} a {end_dt.date()}")
-            return dash.no_update
     except Exception as e:
-        print(f"Erro ao filtrar datas para o relatório: {e}")
+        log_relatorios.error("Erro ao filtrar datas para o relatório: %s", e)
         return dash.no_update
-    total_rain = df_report.get('pluviometria_mm', pd.Series(dtype=float)).sum()
-    max_rain_10min = df_report.get('pluviometria_mm', pd.Series(dtype=float)).max()
-    avg_umidade_1m = df_report.get('umidade_1m_perc', pd.Series(dtype=float)).mean()
-    avg_umidade_2m = df_report.get('umidade_2m_perc', pd.Series(dtype=float)).mean()
-    avg_umidade_3m = df_report.get('umidade_3m_perc', pd.Series(dtype=float)).mean()
-    avg_umidade_1m_str = f"{avg_umidade_1m:.2f} %" if not pd.isna(avg_umidade_1m) else "N/D"
-    avg_umidade_2m_str = f"{avg_umidade_2m:.2f} %" if not pd.isna(avg_umidade_2m) else "N/D"
-    avg_umidade_3m_str = f"{avg_umidade_3m:.2f} %" if not pd.isna(avg_umidade_3m) else "N/D"
-    if 'pluviometria_mm' in df_report.columns:
-        df_report.loc[:, 'precipitacao_acumulada_recalculada'] = df_report['pluviometria_mm'].cumsum()
-    else:
-        df_report.loc[:, 'precipitacao_acumulada_recalculada'] = 0.0
-    df_report.set_index('timestamp', inplace=True)
-    max_rain_in_window = df_report.get('pluviometria_mm', pd.Series(dtype=float)).max()
-    if pd.isna(max_rain_in_window): max_rain_in_window = 0
-    secondary_yaxis_max = 6 if max_rain_in_window < 5 else math.ceil(max_rain_in_window) + 1
-    title_pluvia = f"Pluviometria de {start_date.strftime('%d/%m')} a {end_date.strftime('%d/%m')}"
-    fig_pluvia = make_subplots(specs=[[{"secondary_y": True}]])
-    fig_pluvia.add_trace(
-        go.Bar(x=df_report.index, y=df_report.get('pluviometria_mm', pd.Series(dtype=float)), name='Pluviometria (mm)',
-               marker_color='rgb(55, 83, 109)'), secondary_y=True, )
-    fig_pluvia.add_trace(
-        go.Scatter(x=df_report.index, y=df_report.get('precipitacao_acumulada_recalculada', pd.Series(dtype=float)),
-                   name='Precip. Acumulada (mm)', mode='lines', line=dict(color='rgb(26, 118, 255)')),
-        secondary_y=False, )
-    fig_pluvia.update_layout(title_text=title_pluvia, plot_bgcolor='white', paper_bgcolor='white')
-    fig_pluvia.update_yaxes(title_text="Precip. Acumulada (mm)", secondary_y=False, showgrid=False, zeroline=False)
-    fig_pluvia.update_yaxes(title_text="Pluviometria (mm)", secondary_y=True, range=[0, secondary_yaxis_max],
-                            showgrid=False, zeroline=False)
-    title_umidade = f"Umidade do Solo de {start_date.strftime('%d/%m')} a {end_date.strftime('%d/%m')}"
-    fig_umidade = go.Figure()
-    fig_umidade.add_trace(go.Scatter(x=df_report.index, y=df_report.get('umidade_1m_perc', pd.Series(dtype=float)),
-                                     name='Profundidade 1 m', mode='lines', line=dict(color='#28a745', width=3)))
-    fig_umidade.add_trace(go.Scatter(x=df_report.index, y=df_report.get('umidade_2m_perc', pd.Series(dtype=float)),
-                                     name='Profundidade 2 m', mode='lines', line=dict(color='#ffc107', width=3)))
-    fig_umidade.add_trace(go.Scatter(x=df_report.index, y=df_report.get('umidade_3m_perc', pd.Series(dtype=float)),
-                                     name='Profundidade 3 m', mode='lines', line=dict(color='#dc3545', width=3)))
-    fig_umidade.update_layout(title_text=title_umidade, yaxis_title="Umidade Volumétrica (%)",
-                              yaxis_range=[UMIDADE_BASE_3M - 5, UMIDADE_SATURACAO + 5],
-                              plot_bgcolor='white', paper_bgcolor='white')
-    fig_umidade.update_yaxes(showgrid=False, zeroline=False)
-    img_pluvia_bytes = pio.to_image(fig_pluvia, format='png', width=800, height=450)
-    img_umidade_bytes = pio.to_image(fig_umidade, format='png', width=800, height=450)
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=inch, leftMargin=inch, topMargin=inch, bottomMargin=inch)
-    story = []
-    styles = getSampleStyleSheet()
-    story.append(Paragraph("Relatório de Monitoramento dos Sensores", styles['h1']))
-    story.append(Spacer(1, 12))
-    periodo_str = f"Período de Análise: {start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}"
-    story.append(Paragraph(periodo_str, styles['h3']))
-    story.append(Spacer(1, 24))
-    story.append(Paragraph("Resumo do Período", styles['h2']))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph(f"• Chuva Total Acumulada: {total_rain:.2f} mm", styles['Normal']))
-    story.append(Paragraph(f"• Maior Leitura de Chuva (10 min): {max_rain_10min:.2f} mm", styles['Normal']))
-    story.append(Paragraph(f"• Umidade Média (1m): {avg_umidade_1m_str}", styles['Normal']))
-    story.append(Paragraph(f"• Umidade Média (2m): {avg_umidade_2m_str}", styles['Normal']))
-    story.append(Paragraph(f"• Umidade Média (3m): {avg_umidade_3m_str}", styles['Normal']))
-    story.append(Spacer(1, 24))
-    story.append(Paragraph("Gráficos de Análise", styles['h2']))
-    story.append(Spacer(1, 12))
-    story.append(Image(BytesIO(img_pluvia_bytes), width=7 * inch, height=3.9375 * inch))
-    story.append(Spacer(1, 12))
-    story.append(Image(BytesIO(img_umidade_bytes), width=7 * inch, height=3.9375 * inch))
-    doc.build(story)
-    buffer.seek(0)
+    inicio_epoch, fim_epoch = int(start_dt.timestamp()), int(end_dt.timestamp())
+    with fase("agregacao"):
+        acumulador = AcumuladorRelatorio(inicio_epoch, fim_epoch)
+        for bloco in iterar_leituras(inicio_epoch, fim_epoch, aquecimento_seg=JANELA_CHUVA_72H_SEG):
+            acumulador.adicionar(bloco)
+        resumo = acumulador.resumo()
+    if not resumo.leituras:
+        log_relatorios.info("Sem dados para o período de %s a %s.", start_dt.date(), end_dt.date())
+        return dash.no_update
+    pdf_bytes = construir_pdf(resumo, start_date, end_date)
     nome_arquivo = f"Relatorio_Sensores_{start_date_str}_a_{end_date_str}.pdf"
-    return dcc.send_bytes(buffer.getvalue(), nome_arquivo)
+    return dcc.send_bytes(pdf_bytes, nome_arquivo)
 
 
 # --- Rotas FastAPI ---
@@ -709,44 +1146,129 @@ async def read_map_html():
         return HTMLResponse(content=f"<h1>Erro ao ler o arquivo: {e}</h1>", status_code=500)
 
 
+@app.get("/api/data", response_class=JSONResponse)
+async def get_data(limite: int = MAX_PONTOS_DADOS):
+    """Últimas leituras no formato JSON externo (timestamp ISO 8601)."""
+    data = obter_dados()
+    return JSONResponse(content=registros_para_dicts(data[-max(1, limite):]))
+
+
+@app.get("/api/data/grade", response_class=JSONResponse)
+async def get_grid_data(horas: float = 24):
+    """Leituras das últimas `horas` alinhadas à grade de 10 min; slots sem leitura vêm com o bit de lacuna no qc."""
+    data = obter_dados()
+    grade = reamostrar(selecionar_periodo(data, max(min(horas, 24 * RETENCAO_DIAS_MEMORIA), 1 / 6)))
+    return JSONResponse(content=registros_para_dicts(grade))
+
+
+@app.get("/api/alerts", response_class=JSONResponse)
+async def get_alerts(estacao: str = None, tipo: str = None, inicio: str = None, fim: str = None,
+                     limite: int = 50, pagina: int = 1):
+    """Histórico de mudanças de nível, mais recentes primeiro, paginado (`inicio`/`fim` em ISO 8601)."""
+    if tipo is not None and tipo not in TIPOS_ALERTA:
+        raise HTTPException(status_code=400, detail=f"tipo deve ser um de {TIPOS_ALERTA}.")
+    try:
+        inicio_epoch = timestamp_para_epoch(inicio) if inicio else None
+        fim_epoch = timestamp_para_epoch(fim) if fim else None
+    except LeituraInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if MODO_EXECUCAO == "leitor":
+        if historico_alertas.diretorio is None:
+            raise HTTPException(status_code=409, detail=(
+                "Histórico de alertas só em memória no produtor (RETENCAO_DIAS_DISCO=0): consulte o produtor."))
+        historico_alertas.recarregar()
+    return JSONResponse(content=historico_alertas.consultar(estacao, tipo, inicio_epoch, fim_epoch,
+                                                            min(max(limite, 1), MAX_EVENTOS_POR_PAGINA), pagina))
+
+
 @app.get("/api/risk_data", response_class=JSONResponse)
 async def get_risk_data():
-    accumulated_72h = 0.0
-    current_data = list(data_store)
-    valid_data = [d for d in current_data if isinstance(d, dict) and 'timestamp' in d and 'pluviometria_mm' in d]
-    if valid_data:
-        df_temp = pd.DataFrame(valid_data)
-        try:
-            df_temp['timestamp'] = pd.to_datetime(df_temp['timestamp'])
-            df_temp.set_index('timestamp', inplace=True)
-            num_points_72h = 72 * PONTOS_POR_HORA
-            df_last_72h_temp = df_temp.tail(num_points_72h)
-            if not df_last_72h_temp.empty:
-                accumulated_72h = df_last_72h_temp['pluviometria_mm'].sum()
-        except Exception as e:
-            print(f"Erro ao calcular risco chuva API: {e}")
-            accumulated_72h = 0.0
-    return JSONResponse(content={"accumulated_72h": round(accumulated_72h, 2)})
+    atualizar_status()
+    status = status_cache.status(ESTACAO_ID)
+    return JSONResponse(content={"accumulated_72h": status["accumulated_72h"]})
 
 
 @app.get("/api/soil_risk_data", response_class=JSONResponse)
 async def get_soil_risk_data():
-    current_data = list(data_store)
-    level, color = calculate_soil_alert(current_data)
-    height_percent = 0
-    if level == "Atenção":
-        height_percent = 50
-    elif level == "Alerta":
-        height_percent = 75
-    elif level == "Paralização":
-        height_percent = 100
-    elif level == "Livre":
-        height_percent = 15
-    elif level != "Livre":
-        level = "Livre"
-        color = "grey"
-        height_percent = 15
-    return JSONResponse(content={"alert_level": level, "alert_color": color, "height_percent": height_percent})
+    atualizar_status()
+    status = status_cache.status(ESTACAO_ID)
+    return JSONResponse(content={"alert_level": status["soil_alert_level"], "alert_color": status["soil_alert_color"],
+                                 "height_percent": status["soil_height_percent"]})
+
+
+@app.get("/api/status")
+async def get_status(request: Request, estacoes: str = None):
+    """Status combinado (chuva + solo) de uma ou várias estações, com gzip/brotli e ETag."""
+    atualizar_status()
+    lista_estacoes = [e.strip() for e in estacoes.split(",") if e.strip()] if estacoes else None
+    try:
+        corpo, etag, codificacao = status_cache.resposta(lista_estacoes, request.headers.get("accept-encoding"))
+    except KeyError as e:
+        return JSONResponse(content={"erro": str(e)}, status_code=404)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_corresponde(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if codificacao:
+        headers["Content-Encoding"] = codificacao
+    return Response(content=corpo, media_type="application/json", headers=headers)
+
+
+@app.get("/api/stations", response_class=JSONResponse)
+async def get_stations(bbox: str = "-180,-90,180,90", zoom: int = 11):
+    """Estações no viewport (bbox "oeste,sul,leste,norte"); em zoom baixo, clusters com o pior nível."""
+    try:
+        oeste, sul, leste, norte = ler_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    atualizar_status()
+    resultado = registro_estacoes.consultar(oeste, sul, leste, norte, zoom)
+    return JSONResponse(content={"versao": registro_estacoes.versao, **resultado})
+
+
+@app.get("/api/nowcast", response_class=JSONResponse)
+async def get_nowcast():
+    """Probabilidade de cada nível de alerta (solo e chuva 72h) ser atingido em 1/3/6 h."""
+    nowcast = await asyncio.to_thread(obter_nowcast)
+    if nowcast is None:
+        return JSONResponse(content={"erro": "Estado do modelo indisponível."}, status_code=503)
+    return JSONResponse(content=nowcast)
+
+
+@app.get("/api/qc", response_class=JSONResponse)
+async def get_qc_stats():
+    """Contadores do controle de qualidade por estação (leituras, sinalizadas, por campo e verificação)."""
+    if MODO_EXECUCAO == "leitor":
+        # O QC roda no produtor: o worker conta as marcações das leituras na memória compartilhada
+        return JSONResponse(content={ESTACAO_ID: {**contar_flags(obter_dados()), "origem": "marcacoes"}})
+    return JSONResponse(content=controle_qc.estatisticas())
+
+
+@app.get("/api/data/horario", response_class=JSONResponse)
+async def get_hourly_data(dias: int = 30):
+    """Série horária (rollups das leituras que já saíram da memória + leituras em memória agregadas)."""
+    data = obter_dados()
+    if MODO_EXECUCAO == "leitor":
+        # Os rollups ficam no produtor: o worker só responde se a memória compartilhada cobre o período
+        if (_no_buffer_leitor(lambda buffer: buffer.sobrescreveu(), lambda: False) and len(data)
+                and int(data['timestamp'][-1]) - max(1, dias) * 24 * 3600 < int(data['timestamp'][0])):
+            raise HTTPException(status_code=409, detail=(
+                "Período além da memória compartilhada: os rollups horários ficam no processo produtor. "
+                f"Use dias <= {(int(data['timestamp'][-1]) - int(data['timestamp'][0])) // (24 * 3600)}."))
+    rollups = agregar_por_hora(data)
+    if MODO_EXECUCAO != "leitor":
+        rollups = np.concatenate((politica_retencao.rollups, rollups))
+    if len(rollups):
+        rollups = rollups[rollups['timestamp'] >= rollups['timestamp'][-1] - max(1, dias) * 24 * 3600]
+    return JSONResponse(content=[
+        {"timestamp": datetime.datetime.fromtimestamp(int(linha['timestamp']), tz=timezone.utc).isoformat(),
+         "leituras": int(linha['leituras']), "sinalizadas": int(linha['sinalizadas']),
+         "pluviometria_mm": round(float(linha['pluviometria_mm']), 2),
+         "pluviometria_max_mm": round(float(linha['pluviometria_max_mm']), 2),
+         "umidade_1m_perc": round(float(linha['umidade_1m_perc']), 2),
+         "umidade_2m_perc": round(float(linha['umidade_2m_perc']), 2),
+         "umidade_3m_perc": round(float(linha['umidade_3m_perc']), 2)}
+        for linha in rollups
+    ])
 
 
 @app.get("/health", response_class=JSONResponse)
@@ -754,68 +1276,127 @@ async def health_check():
     return JSONResponse(content={"status": "running"}, status_code=200)
 
 
-@app.get("/restart-simulation")
-async def restart_simulation():
-    global data_store, simulator, simulated_time_utc
-    global global_task_simulador, global_task_monitor
-    global global_last_rain_alert_level, global_last_soil_alert_level
-
-    print("--- REINICIANDO SIMULAÇÃO ---")
-    print("Cancelando tarefas antigas...")
-    tasks_to_cancel = []
-    if global_task_simulador: tasks_to_cancel.append(global_task_simulador)
-    if global_task_monitor: tasks_to_cancel.append(global_task_monitor)
-    valid_tasks = [t for t in tasks_to_cancel if t]
-    if valid_tasks:
-        for task in valid_tasks:
-            if not task.done():
-                task.cancel()
+@app.get("/api/admin/executores_dash", response_class=JSONResponse, dependencies=[Depends(verificar_admin)])
+async def get_dash_executor_metrics():
+    return JSONResponse(content=dash_bridge.metricas())
+
+
+@app.get("/api/admin/agendador", response_class=JSONResponse, dependencies=[Depends(verificar_admin)])
+async def get_scheduler_stats():
+    return JSONResponse(content=agendador.estatisticas())
+
+
+@app.get("/api/admin/memoria", response_class=JSONResponse, dependencies=[Depends(verificar_admin)])
+async def get_memory_stats():
+    """Uso de cada camada do histórico (memória, rollups horários, disco)."""
+    if MODO_EXECUCAO == "leitor":
+        # A retenção roda no produtor: o worker só tem a cópia do anel da memória compartilhada
+        buffer = _obter_buffer_leitor()
+        return JSONResponse(content={ESTACAO_ID: {
+            "memoria_compartilhada": {
+                "leituras": len(obter_dados()),
+                "capacidade": buffer.capacidade if buffer else None,
+                "bytes": buffer.capacidade * DTYPE_LEITURA.itemsize if buffer else 0,
+            },
+        }})
+    estatisticas = politica_retencao.estatisticas(data_store)
+    if buffer_compartilhado is not None:
+        estatisticas["memoria_compartilhada"] = {
+            "capacidade": buffer_compartilhado.capacidade,
+            "bytes": buffer_compartilhado.capacidade * DTYPE_LEITURA.itemsize,
+        }
+    return JSONResponse(content={ESTACAO_ID: estatisticas})
+
+
+@app.get("/api/admin/perfil", dependencies=[Depends(verificar_admin)])
+async def get_sampling_profile(segundos: float = 10.0, intervalo_ms: float = 10.0, formato: str = "colapsado",
+                               ociosas: bool = False):
+    """Perfil por amostragem do processo durante `segundos` (máx. 60).
+
+    formato=colapsado: pilhas no formato do flamegraph (flamegraph.pl, speedscope);
+    formato=funcoes: JSON com as funções mais frequentes (tempo próprio e total).
+    """
+    if formato not in ("colapsado", "funcoes"):
+        raise HTTPException(status_code=400, detail="Formato inválido (use 'colapsado' ou 'funcoes').")
+    resultado = await asyncio.to_thread(amostrador_perfil.amostrar, segundos, intervalo_ms, ociosas)
+    if resultado is None:
+        raise HTTPException(status_code=409, detail="Já existe um perfil em andamento.")
+    pilhas, metadados = resultado
+    log_execucao.info("Perfil: %d amostras em %ss (%d pilhas distintas).", metadados['amostras'],
+                      metadados['segundos'], metadados['pilhas_distintas'])
+    if formato == "funcoes":
+        return JSONResponse(content={**metadados, "funcoes": funcoes_mais_frequentes(pilhas)})
+    return PlainTextResponse(content=formatar_colapsado(pilhas),
+                             headers={"X-Perfil-Amostras": str(metadados["amostras"]),
+                                      "X-Perfil-Segundos": str(metadados["segundos"])})
+
+
+@app.get("/api/admin/lentos", response_class=JSONResponse, dependencies=[Depends(verificar_admin)])
+async def get_slow_traces(limite: int = 50):
+    """Últimas execuções acima do orçamento de latência (callbacks, rotas e tarefas), com fases."""
+    return JSONResponse(content=rastreamentos_lentos(max(1, limite)))
+
+
+@app.get("/api/admin/logs", response_class=JSONResponse, dependencies=[Depends(verificar_admin)])
+async def get_log_stats():
+    """Fila de logs: nível, ocupação, descartes por fila cheia e repetições suprimidas."""
+    return JSONResponse(content=estatisticas_logs())
+
+
+@app.get("/api/admin/velocidade", response_class=JSONResponse, dependencies=[Depends(verificar_admin)])
+async def get_simulation_speed():
+    return JSONResponse(content={
+        "fator": "max" if fator_compressao == FATOR_COMPRESSAO_MAXIMO else fator_compressao,
+        "tempo_simulado": simulated_time_utc.isoformat() if simulated_time_utc else None,
+        **estatisticas_simulacao,
+    })
+
+
+@app.post("/api/admin/velocidade", response_class=JSONResponse, dependencies=[Depends(verificar_admin)])
+async def set_simulation_speed(fator: str):
+    """Ajusta a compressão do tempo: 1 = tempo real, 1800 = padrão, "max" = o mais rápido possível."""
+    if fator.lower() in ("max", "maximo", "máximo"):
+        valor = FATOR_COMPRESSAO_MAXIMO
+    else:
         try:
-            await asyncio.wait(valid_tasks, timeout=1.0, return_when=asyncio.ALL_COMPLETED)
-        except asyncio.TimeoutError:
-            print("WARN: Timeout esperando tarefas cancelarem no reinício.")
-        except Exception as e:
-            print(f"WARN: Exceção esperando tarefas cancelarem no reinício: {e}")
-    global_task_simulador = None
-    global_task_monitor = None
-
-    print("Limpando dados e resetando estado...")
-    data_store.clear()
-    simulator = SensorSimulator()
-    global_last_rain_alert_level = "Livre"
-    global_last_soil_alert_level = "Livre"
+            valor = float(fator)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Fator inválido: use um número >= 1 ou 'max'.")
+        if not math.isfinite(valor) or valor < 1:
+            raise HTTPException(status_code=400, detail="Fator inválido: use um número >= 1 ou 'max'.")
+
+    if MODO_EXECUCAO == "leitor":
+        # A simulação roda no produtor: o pedido segue pela memória compartilhada
+        if _no_buffer_leitor(lambda buffer: buffer.pedir_fator(valor), lambda: None) is None:
+            raise HTTPException(status_code=503, detail="Produtor indisponível.")
+        return JSONResponse(content={"fator": "max" if valor == FATOR_COMPRESSAO_MAXIMO else valor, "pedido": True})
+    definir_fator_compressao(valor)
+    return await get_simulation_speed()
 
-    agora = datetime.datetime.now(timezone.utc).replace(second=0, microsecond=0)
-    simulated_time_utc = agora - datetime.timedelta(minutes=10 * NUM_DADOS_INICIAIS)
-    print(f"Novo tempo inicial: {simulated_time_utc}")
-    print(f"Preenchendo {NUM_DADOS_INICIAIS} dados iniciais...")
-    for i in range(NUM_DADOS_INICIAIS):
-        last_data = data_store[-1] if data_store else {}
-        c_deprec = last_data.get("precipitacao_acumulada_mm", 0.0) if isinstance(last_data, dict) else 0.0
-        novo_dado = simulator.gerar_novo_dado(c_deprec, simulated_time_utc, list(data_store))
-        if isinstance(novo_dado, dict):
-            data_store.append(novo_dado)
-        else:
-            print(f"WARN (Restart): Simulador retornou dado inválido: {novo_dado}")
-        simulated_time_utc += datetime.timedelta(minutes=10)
-    print("Preenchimento inicial concluído.")
 
-    print("Reiniciando tarefas de background...")
-    global_task_simulador = asyncio.create_task(rodar_simulador())
-    global_task_monitor = asyncio.create_task(monitorar_alertas())
-    print("--- REINÍCIO CONCLÍÍDO ---")
+@app.get("/restart-simulation")
+async def restart_simulation():
+    if MODO_EXECUCAO == "leitor":
+        # O reinício é feito pelo produtor; o worker só sinaliza o pedido
+        if _no_buffer_leitor(lambda buffer: buffer.pedir_reinicio(), lambda: None) is not None:
+            log_execucao.info("Leitor: pedido de reinício enviado ao produtor.")
+        else:
+            log_execucao.warning("Leitor: produtor indisponível, pedido de reinício ignorado.")
+        return RedirectResponse(url="/dashboard/")
 
+    await reiniciar_simulacao()
     return RedirectResponse(url="/dashboard/")
 
 
-app.mount("/dashboard", WSGIMiddleware(dash_app.server))
+# Cada classe de callback roda no seu próprio pool limitado (ver dash_bridge.py)
+dash_bridge = DashExecutorBridge(dash_app.server, LIMITES_EXECUTORES_DASH, CLASSES_CALLBACK_DASH)
+app.mount("/dashboard", dash_bridge)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     host = "0.0.0.0"
 
-    print(f"Executando localmente (compatível com Render)...")
-    print(f"Acesse o Mapa em http://127.0.0.1:{port}")
-    print(f"Acesse o Dashboard em http://127.0.0.1:{port}/dashboard/")
+    log_execucao.info("Executando localmente (compatível com Render). Mapa: http://127.0.0.1:%d, "
+                      "Dashboard: http://127.0.0.1:%d/dashboard/", port, port)
 
     uvicorn.run("main:app", host=host, port=port, reload=False)
@@ -0,0 +1,220 @@
+import numpy as np
+
+from alert_levels import NIVEIS, soil_alert_indices, rain_alert_indices
+from windows import JANELA_CHUVA_72H_SEG, JanelasAgregadas
+from simulator import (
+    UMIDADE_BASE_1M, UMIDADE_BASE_2M, UMIDADE_BASE_3M, UMIDADE_SATURACAO,
+    MAX_INFILTRACAO_POR_CICLO_MM, FATOR_PERCOLACAO_1M_2M, FATOR_PERCOLACAO_2M_3M,
+    FATOR_DRENAGEM_1M, FATOR_DRENAGEM_2M, FATOR_DRENAGEM_3M,
+    LIMITE_CHUVA_24H, LIMITE_CHUVA_72H, LIMIAR_INICIAL_CHUVA_S1,
+    PROB_INICIO_CHUVA, INTENSIDADE_MAXIMA_MM, CICLOS_PARA_PICO, CICLOS_PARA_SECAR,
+)
+
+# --- Nowcast de Chuva e Umidade do Solo ---
+# A partir do estado atual do modelo (umidades, água em trânsito nos buffers
+# de percolação de 2 m e 3 m, estado da tempestade) simula um conjunto de
+# membros em paralelo: cada passo de 10 min é uma operação numpy sobre todos os
+# membros, com as mesmas regras do SensorSimulator. O resultado é a
+# probabilidade de cada nível de alerta ser atingido em 1/3/6 h.
+
+HORIZONTES_H = (1, 3, 6)
+MEMBROS_PADRAO = 500
+PASSO_SEG = 10 * 60
+JANELA_72H_SEG = JANELA_CHUVA_72H_SEG
+JANELA_24H_SEG = 24 * 3600
+
+# Estado do modelo como vetor float64 de tamanho fixo (cabe na memória compartilhada)
+CAMPOS_ESTADO = (
+    "timestamp", "umidade_1m", "umidade_2m", "umidade_3m", "agua_buffer_2m", "agua_buffer_3m",
+    "manter_saturacao_1m", "threshold_1m_met", "acc_rain_since_dry_1m",
+    "estado_clima", "intensidade_tempestade", "ciclos_no_estado", "duracao_pico_atual", "duracao_seca_atual",
+    "modo_seca_forcada", "tempo_fim_seca",
+)
+TAMANHO_ESTADO = len(CAMPOS_ESTADO)
+_I = {campo: i for i, campo in enumerate(CAMPOS_ESTADO)}
+ESTADOS_CLIMA = ("SECO", "FORMANDO_TEMPESTADE", "DIMINUINDO_TEMPESTADE")
+_SECO, _FORMANDO, _DIMINUINDO = range(3)
+
+
+def estado_do_simulador(simulador, timestamp):
+    """Vetor de estado do SensorSimulator logo após gerar a leitura de `timestamp` (epoch)."""
+    estado = np.zeros(TAMANHO_ESTADO)
+    estado[_I["timestamp"]] = timestamp
+    for campo in CAMPOS_ESTADO[1:9]:
+        estado[_I[campo]] = float(getattr(simulador, campo))
+    estado[_I["estado_clima"]] = ESTADOS_CLIMA.index(simulador.estado_clima)
+    for campo in ("intensidade_tempestade", "ciclos_no_estado", "duracao_pico_atual", "duracao_seca_atual",
+                  "modo_seca_forcada"):
+        estado[_I[campo]] = float(getattr(simulador, campo))
+    if simulador.tempo_fim_seca is not None:
+        estado[_I["tempo_fim_seca"]] = simulador.tempo_fim_seca.timestamp()
+    return estado
+
+
+class _Membros:
+    """Estado do modelo replicado para todos os membros do conjunto."""
+
+    def __init__(self, estado, membros):
+        def coluna(campo, dtype=float):
+            return np.full(membros, estado[_I[campo]], dtype=dtype)
+
+        self.u1, self.u2, self.u3 = coluna("umidade_1m"), coluna("umidade_2m"), coluna("umidade_3m")
+        self.buffer_2m, self.buffer_3m = coluna("agua_buffer_2m"), coluna("agua_buffer_3m")
+        self.manter_saturacao = coluna("manter_saturacao_1m", bool)
+        self.limiar_atingido = coluna("threshold_1m_met", bool)
+        self.acc_desde_seco = coluna("acc_rain_since_dry_1m")
+        self.clima = coluna("estado_clima", np.int8)
+        self.intensidade = coluna("intensidade_tempestade")
+        self.ciclos = coluna("ciclos_no_estado")
+        self.pico = coluna("duracao_pico_atual")
+        self.seca = coluna("duracao_seca_atual")
+        self.seca_forcada = coluna("modo_seca_forcada", bool)
+        self.fim_seca = coluna("tempo_fim_seca")
+
+
+def _passo_chuva(m, agora, total_24h, total_72h, rng):
+    """Motor de tempestade (SensorSimulator._simular_chuva) vetorizado."""
+    n = len(m.clima)
+    chuva = np.zeros(n)
+
+    em_seca = m.seca_forcada & (agora < m.fim_seca)
+    m.seca_forcada &= em_seca  # Seca forçada vencida termina
+    m.clima[em_seca] = _SECO
+    m.intensidade[em_seca] = 0.0
+    m.ciclos[em_seca] = 0
+
+    livre = ~em_seca
+    seca_72h = livre & (total_72h > LIMITE_CHUVA_72H)
+    seca_24h = livre & ~seca_72h & (total_24h > LIMITE_CHUVA_24H)
+    nova_seca = seca_72h | seca_24h
+    m.clima[nova_seca] = _SECO
+    m.intensidade[nova_seca] = 0.0
+    m.ciclos[nova_seca] = 0
+    m.seca_forcada |= nova_seca
+    m.fim_seca[seca_72h] = agora + 5 * 24 * 3600
+    m.fim_seca[seca_24h] = agora + 60 * rng.integers(180, 361, size=n)[seca_24h]
+
+    motor = livre & ~nova_seca
+    seco = motor & (m.clima == _SECO)
+    formando = motor & (m.clima == _FORMANDO)
+    diminuindo = motor & (m.clima == _DIMINUINDO)
+    sorteio = rng.random(n)
+
+    inicia = seco & (sorteio < PROB_INICIO_CHUVA)
+    m.clima[inicia] = _FORMANDO
+    m.ciclos[inicia] = 0
+    m.intensidade[inicia] = 0.0
+    m.pico[inicia] = rng.integers(CICLOS_PARA_PICO[0], CICLOS_PARA_PICO[1] + 1, size=n)[inicia]
+    m.seca[inicia] = rng.integers(CICLOS_PARA_SECAR[0], CICLOS_PARA_SECAR[1] + 1, size=n)[inicia]
+
+    m.ciclos[formando] += 1
+    m.intensidade[formando] = np.minimum(1.0, m.ciclos[formando] / m.pico[formando])
+    chuva[formando] = m.intensidade[formando] * INTENSIDADE_MAXIMA_MM * (0.7 + 0.6 * sorteio[formando])
+    vira_pico = formando & (m.ciclos >= m.pico)
+    m.clima[vira_pico] = _DIMINUINDO
+    m.ciclos[vira_pico] = 0
+
+    m.ciclos[diminuindo] += 1
+    m.intensidade[diminuindo] = np.maximum(0.0, 1.0 - m.ciclos[diminuindo] / m.seca[diminuindo])
+    chuva[diminuindo] = m.intensidade[diminuindo] * INTENSIDADE_MAXIMA_MM * (0.5 + 0.6 * sorteio[diminuindo])
+    termina = diminuindo & (m.ciclos >= m.seca)
+    m.clima[termina] = _SECO
+    m.ciclos[termina] = 0
+    m.intensidade[termina] = 0.0
+
+    return np.round(np.maximum(0.0, chuva), 2)
+
+
+def _passo_umidade(m, chuva):
+    """SensorSimulator._simular_umidade vetorizado (mesma ordem de drenagem, infiltração e percolação)."""
+    u1_antes = m.u1.copy()
+    m.u1 = np.where(m.manter_saturacao, m.u1, m.u1 - (m.u1 - UMIDADE_BASE_1M) * FATOR_DRENAGEM_1M)
+    m.u2 -= (m.u2 - UMIDADE_BASE_2M) * FATOR_DRENAGEM_2M
+    m.u3 -= (m.u3 - UMIDADE_BASE_3M) * FATOR_DRENAGEM_3M
+    m.u1 = np.maximum(m.u1, UMIDADE_BASE_1M)
+    m.u2 = np.maximum(m.u2, UMIDADE_BASE_2M)
+    m.u3 = np.maximum(m.u3, UMIDADE_BASE_3M)
+
+    secou = (u1_antes > UMIDADE_BASE_1M + 0.1) & (m.u1 <= UMIDADE_BASE_1M + 0.1)
+    m.limiar_atingido &= ~secou
+    m.acc_desde_seco[secou] = 0.0
+    m.manter_saturacao &= ~secou
+
+    potencial = np.minimum(chuva, MAX_INFILTRACAO_POR_CICLO_MM)
+    antes_limiar = ~m.limiar_atingido
+    m.acc_desde_seco[antes_limiar] += potencial[antes_limiar]
+    atinge = antes_limiar & (m.acc_desde_seco >= LIMIAR_INICIAL_CHUVA_S1)
+    m.limiar_atingido |= atinge
+    efetiva = np.where(m.limiar_atingido, potencial, 0.0)
+
+    chegando_2m, chegando_3m = m.buffer_2m, m.buffer_3m
+
+    # Camada 1 m
+    saturada = m.manter_saturacao
+    percolada_1m = efetiva * FATOR_PERCOLACAO_1M_2M
+    potencial_1m = efetiva - percolada_1m
+    absorvida_1m = np.minimum(potencial_1m, np.maximum(0.0, UMIDADE_SATURACAO - m.u1))
+    excedente_1m = potencial_1m - absorvida_1m
+    m.u1 = np.where(saturada, UMIDADE_SATURACAO, m.u1 + absorvida_1m)
+    m.buffer_2m = np.where(saturada, efetiva, percolada_1m + excedente_1m)
+    m.manter_saturacao = saturada | (m.u1 >= UMIDADE_SATURACAO - 0.1)
+
+    # Camada 2 m
+    percolada_lenta_2m = chegando_2m * FATOR_PERCOLACAO_2M_3M
+    absorvida_2m = np.minimum(chegando_2m, np.maximum(0.0, UMIDADE_SATURACAO - m.u2))
+    m.u2 = m.u2 + absorvida_2m
+    m.buffer_3m = percolada_lenta_2m + (chegando_2m - absorvida_2m)
+
+    # Camada 3 m
+    m.u3 = m.u3 + np.minimum(chegando_3m, np.maximum(0.0, UMIDADE_SATURACAO - m.u3))
+
+    m.manter_saturacao &= ~(m.u2 >= UMIDADE_SATURACAO - 0.1)
+    m.u1 = np.clip(m.u1, UMIDADE_BASE_1M, UMIDADE_SATURACAO)
+    m.u2 = np.clip(m.u2, UMIDADE_BASE_2M, UMIDADE_SATURACAO)
+    m.u3 = np.clip(m.u3, UMIDADE_BASE_3M, UMIDADE_SATURACAO)
+
+
+def prever(estado, ts_historico, chuva_historico, membros=MEMBROS_PADRAO, horizontes_h=HORIZONTES_H, semente=None):
+    """Probabilidade de cada nível (solo e chuva 72h) ser atingido em cada horizonte.
+
+    `ts_historico`/`chuva_historico`: leituras das últimas 72 h até a leitura do estado
+    (chuva já filtrada pelo QC), usadas nas janelas de 24/72 h.
+    """
+    rng = np.random.default_rng(semente)
+    m = _Membros(estado, membros)
+    agora = int(estado[_I["timestamp"]])
+    passos = max(horizontes_h) * 3600 // PASSO_SEG
+    historico = JanelasAgregadas(ts_historico, chuva_historico)
+
+    chuva_prevista = np.zeros(membros)  # Chuva simulada acumulada desde a leitura atual
+    nivel_solo_max = np.zeros(membros, dtype=np.int8)
+    nivel_chuva_max = np.zeros(membros, dtype=np.int8)
+    resultado = {}
+    for passo in range(1, passos + 1):
+        t = agora + passo * PASSO_SEG
+        # Janelas do simulador: leituras anteriores com timestamp > t - janela (as de windows.py)
+        total_24h = historico.soma(t, JANELA_24H_SEG) + chuva_prevista
+        total_72h = historico.soma(t, JANELA_72H_SEG) + chuva_prevista
+        chuva = _passo_chuva(m, t, total_24h, total_72h, rng)
+        _passo_umidade(m, chuva)
+        chuva_prevista += chuva
+
+        # Níveis como o monitor os veria (leitura arredondada, mesma janela de 72h)
+        acumulado_72h = total_72h + chuva
+        nivel_chuva_max = np.maximum(nivel_chuva_max, rain_alert_indices(acumulado_72h))
+        nivel_solo_max = np.maximum(nivel_solo_max, soil_alert_indices(
+            np.round(m.u1, 2), np.round(m.u2, 2), np.round(m.u3, 2)))
+
+        if passo * PASSO_SEG % 3600 == 0 and passo * PASSO_SEG // 3600 in horizontes_h:
+            resultado[f"{passo * PASSO_SEG // 3600}h"] = {
+                "solo": _probabilidades(nivel_solo_max),
+                "chuva": _probabilidades(nivel_chuva_max),
+            }
+    return resultado
+
+
+def _probabilidades(niveis_max):
+    """P(nível >= N em algum passo) para cada nível acima de Livre."""
+    contagem = np.bincount(niveis_max, minlength=len(NIVEIS))
+    acumulada = np.cumsum(contagem[::-1])[::-1] / len(niveis_max)
+    return {nivel: round(float(acumulada[i]), 3) for i, nivel in enumerate(NIVEIS) if i > 0}
@@ -0,0 +1,30 @@
+import asyncio
+import os
+import signal
+
+# O modo precisa estar definido antes de importar o main (lido na importação)
+os.environ.setdefault("MODO_EXECUCAO", "produtor")
+
+import main
+
+
+async def _executar():
+    # Encerra limpo no SIGTERM (Render/systemd) para liberar a memória compartilhada
+    tarefa = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sinal, tarefa.cancel)
+        except NotImplementedError:
+            pass
+    try:
+        await main.executar_produtor()
+    except asyncio.CancelledError:
+        main.log_execucao.info("Produtor encerrado.")
+
+
+if __name__ == "__main__":
+    if main.MODO_EXECUCAO != "produtor":
+        raise SystemExit(f"produtor.py exige MODO_EXECUCAO=produtor (atual: {main.MODO_EXECUCAO}).")
+    main.log_execucao.info("Executando processo produtor (simulação + alertas + memória compartilhada).")
+    asyncio.run(_executar())
@@ -0,0 +1,201 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from logs import obter_logger
+
+# --- Perfil por Amostragem e Rastreamento de Execuções Lentas ---
+# AmostradorPerfil: uma thread lê periodicamente as pilhas de todas as threads
+# (sys._current_frames) e conta as pilhas iguais. A saída é o formato
+# "colapsado" (uma linha "thread;f1;f2;...;fn contagem" por pilha), que
+# flamegraph.pl, speedscope e inferno leem direto.
+#
+# rastrear/fase: todo callback do Dash, rota da API e execução de tarefa do
+# agendador abre um rastreamento; trechos marcados com fase("nome") somam o
+# tempo gasto em cada fase. Se a execução passar do orçamento de latência, o
+# rastreamento é registrado no log (e fica em `lentos`) com a quebra por fase.
+# Fora de um rastreamento, fase() não faz nada além de ler o contextvar.
+
+ORCAMENTO_LATENCIA_MS = float(os.environ.get("ORCAMENTO_LATENCIA_MS", 250))
+MAX_RASTREAMENTOS_LENTOS = 100
+MAX_SEGUNDOS_PERFIL = 60.0
+INTERVALO_MINIMO_AMOSTRA_MS = 1.0
+log = obter_logger("lentos")
+# Topos de pilha de threads paradas (esperando trabalho/lock/IO), omitidos por padrão
+FUNCOES_OCIOSAS = {("threading.py", "wait"), ("selectors.py", "select"), ("thread.py", "_worker"),
+                   ("queue.py", "get"), ("threading.py", "_wait_for_tstate_lock")}
+
+
+# --- Rastreamento ---
+class Rastreamento:
+    __slots__ = ("tipo", "nome", "inicio", "fases", "orcamento_ms")
+
+    def __init__(self, tipo, nome, inicio=None, orcamento_ms=None):
+        self.tipo = tipo
+        self.nome = nome
+        self.inicio = time.perf_counter() if inicio is None else inicio
+        self.fases = {}
+        self.orcamento_ms = ORCAMENTO_LATENCIA_MS if orcamento_ms is None else orcamento_ms
+
+
+_rastreamento_atual = contextvars.ContextVar("rastreamento_atual", default=None)
+_lock_lentos = threading.Lock()
+lentos = deque(maxlen=MAX_RASTREAMENTOS_LENTOS)
+contagem_lentos = Counter()  # Por tipo ("dash", "rota", "tarefa")
+
+
+@contextmanager
+def fase(nome):
+    """Soma o tempo do bloco na fase `nome` do rastreamento atual (fases aninhadas contam nas duas)."""
+    rastreamento = _rastreamento_atual.get()
+    if rastreamento is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        rastreamento.fases[nome] = rastreamento.fases.get(nome, 0.0) + (time.perf_counter() - inicio) * 1000
+
+
+def estender_orcamento(ms):
+    """Aumenta o orçamento do rastreamento atual (trabalho que é longo de propósito)."""
+    rastreamento = _rastreamento_atual.get()
+    if rastreamento is not None:
+        rastreamento.orcamento_ms += ms
+
+
+@contextmanager
+def rastrear(tipo, nome, orcamento_ms=None, inicio=None):
+    """Rastreia uma execução; se passar do orçamento, registra duração e fases.
+
+    `inicio` (perf_counter) permite contar desde antes, ex.: o tempo na fila de um executor.
+    """
+    rastreamento = Rastreamento(tipo, nome, inicio, orcamento_ms)
+    token = _rastreamento_atual.set(rastreamento)
+    try:
+        yield rastreamento
+    finally:
+        _rastreamento_atual.reset(token)
+        duracao_ms = (time.perf_counter() - rastreamento.inicio) * 1000
+        if duracao_ms > rastreamento.orcamento_ms:
+            _registrar_lento(rastreamento, duracao_ms)
+
+
+def _registrar_lento(rastreamento, duracao_ms):
+    orcamento_ms = round(rastreamento.orcamento_ms, 1)
+    fases = {nome: round(ms, 1) for nome, ms in sorted(rastreamento.fases.items(), key=lambda item: -item[1])}
+    entrada = {
+        "tipo": rastreamento.tipo,
+        "nome": rastreamento.nome,
+        "duracao_ms": round(duracao_ms, 1),
+        "orcamento_ms": orcamento_ms,
+        "fases_ms": fases,
+        "thread": threading.current_thread().name,
+        "em": time.time(),
+    }
+    with _lock_lentos:
+        lentos.append(entrada)
+        contagem_lentos[rastreamento.tipo] += 1
+    detalhe = " ".join(f"{nome}={ms}" for nome, ms in fases.items()) or "sem fases"
+    log.warning("[%s] %s: %.1f ms (orçamento %g ms) | %s", rastreamento.tipo, rastreamento.nome, duracao_ms,
+                orcamento_ms, detalhe, extra={"campos": {k: v for k, v in entrada.items() if k != "em"}})
+
+
+def rastreamentos_lentos(limite=MAX_RASTREAMENTOS_LENTOS):
+    with _lock_lentos:
+        return {"orcamento_ms": ORCAMENTO_LATENCIA_MS, "por_tipo": dict(contagem_lentos),
+                "recentes": list(lentos)[-limite:][::-1]}
+
+
+class MiddlewareRastreamento:
+    """Middleware ASGI que rastreia cada requisição HTTP como "rota" (exceto prefixos ignorados)."""
+
+    def __init__(self, app, ignorar_prefixos=()):
+        self.app = app
+        self.ignorar_prefixos = tuple(ignorar_prefixos)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.ignorar_prefixos):
+            await self.app(scope, receive, send)
+            return
+        with rastrear("rota", f"{scope['method']} {scope['path']}"):
+            await self.app(scope, receive, send)
+
+
+# --- Perfil por Amostragem ---
+def _rotulo(codigo):
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class AmostradorPerfil:
+    """Perfil do processo por amostragem de pilhas, um de cada vez."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def ocupado(self):
+        return self._lock.locked()
+
+    def amostrar(self, segundos, intervalo_ms=10.0, incluir_ociosas=False):
+        """Amostra todas as threads por `segundos` (bloqueia). Devolve (pilhas colapsadas, metadados).
+
+        Devolve None se já houver um perfil em andamento.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._amostrar(min(float(segundos), MAX_SEGUNDOS_PERFIL),
+                                  max(float(intervalo_ms), INTERVALO_MINIMO_AMOSTRA_MS) / 1000, incluir_ociosas)
+        finally:
+            self._lock.release()
+
+    def _amostrar(self, segundos, intervalo, incluir_ociosas):
+        propria = threading.get_ident()
+        pilhas = Counter()
+        amostras = 0
+        inicio = time.perf_counter()
+        fim = inicio + segundos
+        while time.perf_counter() < fim:
+            nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == propria:
+                    continue
+                topo = frame.f_code
+                if not incluir_ociosas and (os.path.basename(topo.co_filename), topo.co_name) in FUNCOES_OCIOSAS:
+                    continue
+                quadros = []
+                while frame is not None:
+                    quadros.append(_rotulo(frame.f_code))
+                    frame = frame.f_back
+                quadros.append(nomes.get(ident, f"thread-{ident}"))
+                pilhas[";".join(reversed(quadros))] += 1
+            amostras += 1
+            time.sleep(intervalo)
+        metadados = {"segundos": round(time.perf_counter() - inicio, 3), "amostras": amostras,
+                     "intervalo_ms": round(intervalo * 1000, 2), "pilhas_distintas": len(pilhas)}
+        return pilhas, metadados
+
+
+def formatar_colapsado(pilhas):
+    """Formato colapsado do flamegraph: uma pilha por linha, mais frequentes primeiro."""
+    return "".join(f"{pilha} {contagem}\n" for pilha, contagem in pilhas.most_common())
+
+
+def funcoes_mais_frequentes(pilhas, limite=30):
+    """Tempo próprio (topo da pilha) e total (em qualquer nível) por função, em fração das amostras."""
+    total = sum(pilhas.values()) or 1
+    proprio = Counter()
+    acumulado = Counter()
+    for pilha, contagem in pilhas.items():
+        quadros = pilha.split(";")[1:]  # Sem o nome da thread
+        if quadros:
+            proprio[quadros[-1]] += contagem
+        for quadro in set(quadros):
+            acumulado[quadro] += contagem
+    return [{"funcao": quadro, "proprio": round(proprio[quadro] / total, 4), "total": round(contagem / total, 4)}
+            for quadro, contagem in acumulado.most_common(limite)]
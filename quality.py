@@ -0,0 +1,241 @@
+import numpy as np
+
+from readings import CAMPOS_VALORES
+from simulator import UMIDADE_BASE_1M, UMIDADE_BASE_2M, UMIDADE_BASE_3M, UMIDADE_SATURACAO
+
+# --- Controle de Qualidade (QC) das Leituras ---
+# Roda sobre o fluxo de ingestão, antes do armazenamento e dos alertas. Cada
+# estação guarda só um estado fixo por campo (último valor, tamanho da
+# sequência repetida, mediana/desvio robustos exponenciais), então cada leitura
+# custa O(1). Leituras sinalizadas continuam no armazenamento, com os bits do
+# campo `qc` indicando campo e verificação; alertas e status ignoram os
+# valores sinalizados.
+
+QC_FAIXA = 1        # Fora da faixa física do sensor
+QC_PLANA = 2        # Valor travado (repetido por tempo demais)
+QC_VARIACAO = 4     # Variação entre leituras acima do limite
+QC_OUTLIER = 8      # Z-score robusto da variação acima do limiar
+VERIFICACOES = {"faixa": QC_FAIXA, "plana": QC_PLANA, "variacao": QC_VARIACAO, "outlier": QC_OUTLIER}
+BITS_POR_CAMPO = 4
+QC_LACUNA = 1 << 31  # Slot da grade sem leitura (resampling.py); vale para todos os campos
+
+CAMPOS_UMIDADE = ("umidade_1m_perc", "umidade_2m_perc", "umidade_3m_perc")
+BASES_UMIDADE = {"umidade_1m_perc": UMIDADE_BASE_1M, "umidade_2m_perc": UMIDADE_BASE_2M,
+                 "umidade_3m_perc": UMIDADE_BASE_3M}
+
+FOLGA_FAIXA_UMIDADE = 0.5           # Tolerância (%) além de base..saturação
+MAX_PLUVIOMETRIA_10MIN = 50.0       # mm por leitura de 10 min
+LEITURAS_PLANAS_UMIDADE = 36        # 6 h com o mesmo valor
+LEITURAS_PLANAS_CHUVA = 6           # 1 h com a mesma chuva não nula
+FOLGA_PLATO_UMIDADE = 1.0           # Perto da base/saturação o valor fica parado de verdade
+MAX_VARIACAO_UMIDADE_10MIN = 8.0    # % por leitura de 10 min
+MAX_VARIACAO_CHUVA_10MIN = 25.0     # mm entre leituras seguidas (a chuva de pico sobe em rampa)
+LEITURAS_PARA_NOVO_PATAMAR = 3      # Rejeições seguidas que passam a valer como novo patamar
+LIMIAR_Z_ROBUSTO = 6.0
+ESCALA_MINIMA_Z = 1.0               # Piso do desvio robusto (%), evita z infinito com série parada
+ESCALA_MINIMA_Z_CHUVA = 4.0         # Piso do desvio robusto da chuva (mm): série seca tem desvio zero
+TAXA_ROBUSTA = 0.05                 # Passo da mediana/desvio exponenciais
+AMOSTRAS_AQUECIMENTO_Z = 6          # Variações vistas antes de aplicar o z-score
+INTERVALO_NOMINAL_SEG = 10 * 60
+
+
+def bit_qc(campo, verificacao):
+    return verificacao << (BITS_POR_CAMPO * CAMPOS_VALORES.index(campo))
+
+
+def mascara_campo(campo):
+    """Bits de qualquer verificação de um campo (e de lacuna)."""
+    return bit_qc(campo, QC_FAIXA | QC_PLANA | QC_VARIACAO | QC_OUTLIER) | QC_LACUNA
+
+
+def valores_validos(registros, campo):
+    """Máscara booleana das leituras em que `campo` não foi sinalizado."""
+    return (registros["qc"] & mascara_campo(campo)) == 0
+
+
+def chuva_valida(registros):
+    """Pluviometria com as leituras sinalizadas zeradas."""
+    return np.where(valores_validos(registros, "pluviometria_mm"), registros["pluviometria_mm"], 0.0)
+
+
+def ultima_leitura_valida(registros):
+    """Última leitura (array de 1 elemento) com cada umidade no último valor não sinalizado.
+
+    Sem nenhum valor válido em `registros`, a umidade fica NaN (não dispara alerta).
+    """
+    if not len(registros):
+        return registros
+    ultima = registros[-1:].copy()
+    for campo in CAMPOS_UMIDADE:
+        validos = np.flatnonzero(valores_validos(registros, campo))
+        if not len(validos):
+            ultima[campo] = np.nan
+        elif validos[-1] != len(registros) - 1:
+            ultima[campo] = registros[campo][validos[-1]]
+    return ultima
+
+
+class _EstadoCampo:
+    __slots__ = ("ultimo", "ultimo_valido", "repeticoes", "rejeitadas_seguidas", "mediana", "desvio", "amostras")
+
+    def __init__(self):
+        self.ultimo = None
+        self.ultimo_valido = None
+        self.repeticoes = 0
+        self.rejeitadas_seguidas = 0
+        self.mediana = 0.0
+        self.desvio = 0.0
+        self.amostras = 0
+
+
+class EstadoEstacaoQC:
+    def __init__(self):
+        self.campos = {campo: _EstadoCampo() for campo in ("pluviometria_mm",) + CAMPOS_UMIDADE}
+        self.ultimo_timestamp = None
+        self.leituras = 0
+        self.sinalizadas = 0
+        self.contadores = {campo: dict.fromkeys(VERIFICACOES, 0) for campo in self.campos}
+
+    def estatisticas(self):
+        return {"leituras": self.leituras, "sinalizadas": self.sinalizadas,
+                "fracao_sinalizada": round(self.sinalizadas / self.leituras, 4) if self.leituras else 0.0,
+                "por_campo": self.contadores}
+
+
+class ControleQualidade:
+    def __init__(self):
+        self._estacoes = {}
+
+    def limpar(self):
+        self._estacoes = {}
+
+    def estacao(self, estacao):
+        estado = self._estacoes.get(estacao)
+        if estado is None:
+            estado = self._estacoes[estacao] = EstadoEstacaoQC()
+        return estado
+
+    def avaliar(self, estacao, leitura):
+        """Calcula os bits de QC da leitura (em ordem cronológica) e grava em `leitura.qc`."""
+        estado = self.estacao(estacao)
+        passos = 1.0
+        if estado.ultimo_timestamp is not None:
+            passos = max(1.0, (leitura.timestamp - estado.ultimo_timestamp) / INTERVALO_NOMINAL_SEG)
+        estado.ultimo_timestamp = leitura.timestamp
+
+        flags = self._avaliar_chuva(estado, leitura.pluviometria_mm)
+        for campo in CAMPOS_UMIDADE:
+            flags |= self._avaliar_umidade(estado, campo, getattr(leitura, campo), passos)
+
+        estado.leituras += 1
+        if flags:
+            estado.sinalizadas += 1
+        leitura.qc = flags
+        return flags
+
+    def avaliar_atrasada(self, estacao, leitura):
+        """Leitura fora de ordem: só a verificação de faixa (as demais dependem da sequência)."""
+        estado = self.estacao(estacao)
+        flags = 0
+        if not 0.0 <= leitura.pluviometria_mm <= MAX_PLUVIOMETRIA_10MIN:
+            flags |= self._contar(estado, "pluviometria_mm", QC_FAIXA)
+        for campo in CAMPOS_UMIDADE:
+            if not BASES_UMIDADE[campo] - FOLGA_FAIXA_UMIDADE <= getattr(leitura, campo) \
+                    <= UMIDADE_SATURACAO + FOLGA_FAIXA_UMIDADE:
+                flags |= self._contar(estado, campo, QC_FAIXA)
+        estado.leituras += 1
+        if flags:
+            estado.sinalizadas += 1
+        leitura.qc = flags
+        return flags
+
+    def _contar(self, estado, campo, flags_campo):
+        contadores = estado.contadores[campo]
+        for nome, bit in VERIFICACOES.items():
+            if flags_campo & bit:
+                contadores[nome] += 1
+        return flags_campo << (BITS_POR_CAMPO * CAMPOS_VALORES.index(campo))
+
+    def _avaliar_chuva(self, estado, valor):
+        campo = estado.campos["pluviometria_mm"]
+        flags = 0
+        if not 0.0 <= valor <= MAX_PLUVIOMETRIA_10MIN:
+            flags |= QC_FAIXA
+        campo.repeticoes = campo.repeticoes + 1 if valor == campo.ultimo and valor > 0 else 0
+        if campo.repeticoes >= LEITURAS_PLANAS_CHUVA - 1:
+            flags |= QC_PLANA
+        # Chuva é um total por leitura: um intervalo maior entre leituras não justifica um salto maior
+        if not flags:
+            flags |= _avaliar_variacao(campo, valor, MAX_VARIACAO_CHUVA_10MIN, ESCALA_MINIMA_Z_CHUVA)
+        campo.ultimo = valor
+        if not flags:
+            campo.ultimo_valido = valor
+        return self._contar(estado, "pluviometria_mm", flags) if flags else 0
+
+    def _avaliar_umidade(self, estado, nome, valor, passos):
+        campo = estado.campos[nome]
+        base = BASES_UMIDADE[nome]
+        flags = 0
+        if not base - FOLGA_FAIXA_UMIDADE <= valor <= UMIDADE_SATURACAO + FOLGA_FAIXA_UMIDADE:
+            flags |= QC_FAIXA
+
+        # Travado: mesmo valor por muito tempo longe dos platôs físicos (base e saturação)
+        campo.repeticoes = campo.repeticoes + 1 if valor == campo.ultimo else 0
+        no_plato = valor <= base + FOLGA_PLATO_UMIDADE or valor >= UMIDADE_SATURACAO - FOLGA_PLATO_UMIDADE
+        if campo.repeticoes >= LEITURAS_PLANAS_UMIDADE - 1 and not no_plato:
+            flags |= QC_PLANA
+
+        # Variação em relação ao último valor aceito, escalada pelo intervalo entre leituras
+        if not flags:
+            flags |= _avaliar_variacao(campo, valor, MAX_VARIACAO_UMIDADE_10MIN * passos, ESCALA_MINIMA_Z)
+
+        campo.ultimo = valor
+        if not flags:
+            campo.ultimo_valido = valor
+        return self._contar(estado, nome, flags) if flags else 0
+
+    def estatisticas(self):
+        return {estacao: estado.estatisticas() for estacao, estado in self._estacoes.items()}
+
+
+def _avaliar_variacao(campo, valor, max_variacao, escala_minima):
+    """QC_VARIACAO/QC_OUTLIER da variação em relação ao último valor aceito (0 se aceita).
+
+    Z-score robusto dessa variação: mediana e desvio absoluto exponenciais (passo
+    de sinal, O(1)), atualizados só com leituras aceitas.
+    """
+    if campo.ultimo_valido is None:
+        return 0
+    delta = valor - campo.ultimo_valido
+    desvio = abs(delta - campo.mediana)
+    escala = max(1.4826 * campo.desvio, escala_minima)
+    suspeita = 0
+    if abs(delta) > max_variacao:
+        suspeita = QC_VARIACAO
+    elif campo.amostras >= AMOSTRAS_AQUECIMENTO_Z and desvio > LIMIAR_Z_ROBUSTO * escala:
+        suspeita = QC_OUTLIER
+    campo.rejeitadas_seguidas = campo.rejeitadas_seguidas + 1 if suspeita else 0
+    if campo.rejeitadas_seguidas >= LEITURAS_PARA_NOVO_PATAMAR:
+        # Patamar sustentado: aceita como novo nível em vez de rejeitar tudo dali em diante
+        campo.rejeitadas_seguidas = 0
+        return 0
+    if suspeita:
+        return suspeita
+    sinal = (delta > campo.mediana) - (delta < campo.mediana)
+    campo.mediana += TAXA_ROBUSTA * escala * sinal
+    campo.desvio += TAXA_ROBUSTA * (desvio - campo.desvio)
+    campo.amostras += 1
+    return 0
+
+
+def contar_flags(registros):
+    """Contadores por campo/verificação a partir das marcações já gravadas (ex.: workers leitores)."""
+    flags = registros["qc"]
+    por_campo = {}
+    for campo in ("pluviometria_mm",) + CAMPOS_UMIDADE:
+        por_campo[campo] = {nome: int(np.count_nonzero(flags & bit_qc(campo, bit)))
+                            for nome, bit in VERIFICACOES.items()}
+    sinalizadas = int(np.count_nonzero(flags))
+    return {"leituras": len(registros), "sinalizadas": sinalizadas,
+            "fracao_sinalizada": round(sinalizadas / len(registros), 4) if len(registros) else 0.0,
+            "por_campo": por_campo}
@@ -0,0 +1,212 @@
+import datetime
+import math
+import threading
+from datetime import timezone
+
+import numpy as np
+import pandas as pd
+
+# --- Esquema Tipado das Leituras ---
+# Timestamps são inteiros (segundos epoch UTC), validados uma única vez na
+# criação da leitura. Internamente as leituras ficam em arrays estruturados
+# (DTYPE_LEITURA, 52 bytes por leitura); o formato JSON externo (timestamp ISO)
+# só é gerado na borda, por para_dict()/registros_para_dicts(). O campo `qc`
+# guarda as marcações do controle de qualidade (bits definidos em quality.py).
+
+CAMPOS_VALORES = (
+    "pluviometria_mm",
+    "precipitacao_acumulada_mm",
+    "umidade_1m_perc",
+    "umidade_2m_perc",
+    "umidade_3m_perc",
+)
+
+DTYPE_LEITURA = np.dtype([("timestamp", "<i8")] + [(campo, "<f8") for campo in CAMPOS_VALORES] + [("qc", "<u4")])
+
+
+class LeituraInvalida(ValueError):
+    pass
+
+
+def timestamp_para_epoch(valor):
+    """Converte datetime/ISO/número em segundos epoch UTC (datetimes sem fuso são tratados como UTC)."""
+    if isinstance(valor, (int, np.integer)) and not isinstance(valor, bool):
+        return int(valor)
+    if isinstance(valor, str):
+        try:
+            valor = datetime.datetime.fromisoformat(valor)
+        except ValueError:
+            raise LeituraInvalida(f"Timestamp inválido: {valor!r}")
+    if isinstance(valor, datetime.datetime):
+        if valor.tzinfo is None:
+            valor = valor.replace(tzinfo=timezone.utc)
+        return int(valor.timestamp())
+    raise LeituraInvalida(f"Timestamp inválido: {valor!r}")
+
+
+def epoch_para_iso(epoch):
+    return datetime.datetime.fromtimestamp(int(epoch), tz=timezone.utc).isoformat()
+
+
+class Leitura:
+    __slots__ = ("timestamp",) + CAMPOS_VALORES + ("qc",)
+
+    def __init__(self, timestamp, pluviometria_mm, precipitacao_acumulada_mm,
+                 umidade_1m_perc, umidade_2m_perc, umidade_3m_perc, qc=0):
+        self.timestamp = timestamp_para_epoch(timestamp)
+        self.pluviometria_mm = _valor_valido("pluviometria_mm", pluviometria_mm)
+        self.precipitacao_acumulada_mm = _valor_valido("precipitacao_acumulada_mm", precipitacao_acumulada_mm)
+        self.umidade_1m_perc = _valor_valido("umidade_1m_perc", umidade_1m_perc)
+        self.umidade_2m_perc = _valor_valido("umidade_2m_perc", umidade_2m_perc)
+        self.umidade_3m_perc = _valor_valido("umidade_3m_perc", umidade_3m_perc)
+        self.qc = int(qc)
+
+    @classmethod
+    def de_dict(cls, dado):
+        """Valida uma leitura no formato JSON externo. Lança LeituraInvalida."""
+        if not isinstance(dado, dict) or "timestamp" not in dado:
+            raise LeituraInvalida(f"Leitura sem timestamp: {dado!r}")
+        return cls(dado["timestamp"], *(dado.get(campo, 0.0) for campo in CAMPOS_VALORES), qc=dado.get("qc", 0))
+
+    def para_dict(self):
+        """Formato JSON externo (timestamp ISO 8601)."""
+        dado = {"timestamp": epoch_para_iso(self.timestamp)}
+        for campo in CAMPOS_VALORES:
+            dado[campo] = getattr(self, campo)
+        dado["qc"] = self.qc
+        return dado
+
+    def para_tupla(self):
+        return (self.timestamp,) + tuple(getattr(self, campo) for campo in CAMPOS_VALORES) + (self.qc,)
+
+    def __repr__(self):
+        return f"Leitura({', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__)})"
+
+
+def _valor_valido(campo, valor):
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise LeituraInvalida(f"Valor inválido em '{campo}': {valor!r}")
+    if not math.isfinite(valor):
+        raise LeituraInvalida(f"Valor não finito em '{campo}': {valor!r}")
+    return valor
+
+
+def para_array(leituras):
+    """Lista de Leitura -> array estruturado DTYPE_LEITURA."""
+    return np.array([leitura.para_tupla() for leitura in leituras], dtype=DTYPE_LEITURA)
+
+
+def registros_para_dicts(registros):
+    """Array estruturado -> lista de dicts no formato JSON externo."""
+    timestamps = registros["timestamp"].tolist()
+    colunas = [_lista_sem_nan(registros[campo]) for campo in CAMPOS_VALORES]
+    flags = registros["qc"].tolist()
+    return [{"timestamp": epoch_para_iso(ts), **dict(zip(CAMPOS_VALORES, valores)), "qc": qc}
+            for ts, qc, *valores in zip(timestamps, flags, *colunas)]
+
+
+def _lista_sem_nan(valores):
+    # NaN (lacunas da reamostragem) vira None, que é JSON válido
+    if not np.isnan(valores).any():
+        return valores.tolist()
+    return np.where(np.isnan(valores), None, valores).tolist()
+
+
+def para_dataframe(registros):
+    """Array estruturado -> DataFrame indexado por DatetimeIndex UTC (sem parse de strings)."""
+    indice = pd.to_datetime(registros["timestamp"], unit="s", utc=True)
+    return pd.DataFrame({campo: registros[campo] for campo in CAMPOS_VALORES},
+                        index=pd.DatetimeIndex(indice, name="timestamp"))
+
+
+def iterar_blocos(registros, inicio_epoch, fim_epoch, tamanho_bloco, aquecimento_seg=0):
+    """Percorre as leituras de [inicio - aquecimento, fim] em blocos (views, sem cópia)."""
+    timestamps = registros["timestamp"]
+    inicio = np.searchsorted(timestamps, inicio_epoch - aquecimento_seg, side="left")
+    fim = np.searchsorted(timestamps, fim_epoch, side="right")
+    for posicao in range(inicio, fim, tamanho_bloco):
+        yield registros[posicao:min(posicao + tamanho_bloco, fim)]
+
+
+class ArmazemLeituras:
+    """Armazenamento colunar em memória (array estruturado com crescimento amortizado).
+
+    `registros()` devolve uma view dos dados atuais. Buffer e tamanho são
+    publicados juntos numa única tupla, e anexar nunca sobrescreve linhas já
+    publicadas, então leitores em outras threads não precisam de lock. Só as
+    escritas (anexar, descartar, limpar) são serializadas entre si.
+    """
+
+    CAPACIDADE_INICIAL = 1024
+
+    def __init__(self):
+        self._estado = (np.zeros(self.CAPACIDADE_INICIAL, dtype=DTYPE_LEITURA), 0)
+        self._lock_escrita = threading.Lock()
+
+    def __len__(self):
+        return self._estado[1]
+
+    def registros(self):
+        dados, n = self._estado
+        return dados[:n]
+
+    def estender(self, novos):
+        """Anexa um array estruturado (ou lista de Leitura) em ordem cronológica."""
+        if not isinstance(novos, np.ndarray):
+            novos = para_array(novos)
+        if len(novos) == 0:
+            return
+        with self._lock_escrita:
+            dados, n = self._estado
+            necessario = n + len(novos)
+            if necessario > len(dados):
+                novo_buffer = np.zeros(max(necessario, 2 * len(dados)), dtype=DTYPE_LEITURA)
+                novo_buffer[:n] = dados[:n]
+                dados = novo_buffer
+            dados[n:necessario] = novos
+            self._estado = (dados, necessario)
+
+    def inserir(self, novos):
+        """Insere leituras atrasadas (array em ordem, timestamps ainda ausentes) na posição cronológica.
+
+        Copy-on-write como em descartar_antes. Devolve quantas leituras já armazenadas ficaram
+        depois da primeira inserida (o trecho final que mudou, além das inseridas).
+        """
+        if len(novos) == 0:
+            return 0
+        with self._lock_escrita:
+            dados, n = self._estado
+            posicoes = np.searchsorted(dados[:n]["timestamp"], novos["timestamp"])
+            mesclado = np.insert(dados[:n], posicoes, novos)
+            novo_buffer = np.zeros(max(len(mesclado), len(dados)), dtype=DTYPE_LEITURA)
+            novo_buffer[:len(mesclado)] = mesclado
+            self._estado = (novo_buffer, len(mesclado))
+        return n - int(posicoes[0])
+
+    def descartar_antes(self, timestamp_corte, capacidade=None):
+        """Remove as leituras com timestamp < corte e devolve uma cópia delas.
+
+        Copy-on-write: as leituras mantidas vão para um buffer novo (com pelo menos
+        `capacidade` posições), então views entregues antes continuam válidas.
+        """
+        with self._lock_escrita:
+            dados, n = self._estado
+            corte = int(np.searchsorted(dados[:n]["timestamp"], timestamp_corte, side="left"))
+            if corte == 0:
+                return np.zeros(0, dtype=DTYPE_LEITURA)
+            descartadas = dados[:corte].copy()
+            restantes = n - corte
+            novo_buffer = np.zeros(max(restantes, capacidade or 0, self.CAPACIDADE_INICIAL), dtype=DTYPE_LEITURA)
+            novo_buffer[:restantes] = dados[corte:n]
+            self._estado = (novo_buffer, restantes)
+        return descartadas
+
+    def limpar(self):
+        # Novo buffer: views entregues antes do reset continuam válidas
+        with self._lock_escrita:
+            self._estado = (np.zeros(self.CAPACIDADE_INICIAL, dtype=DTYPE_LEITURA), 0)
+
+    def bytes_usados(self):
+        return self._estado[0].nbytes
@@ -0,0 +1,301 @@
+import datetime
+import math
+from datetime import timezone
+from io import BytesIO
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+
+from alert_levels import NIVEIS, soil_alert_indices, rain_alert_indices
+from profiling import fase
+from quality import CAMPOS_UMIDADE, chuva_valida, valores_validos
+from simulator import UMIDADE_BASE_3M, UMIDADE_SATURACAO
+from windows import INTERVALO_LEITURA_SEG, JANELA_CHUVA_72H_SEG, JanelasAgregadas, limites_janela
+
+# --- Relatórios com Agregação Incremental ---
+# O período do relatório é lido em blocos (ver iterar_leituras em main.py) e
+# cada bloco passa uma única vez pelo AcumuladorRelatorio: totais, máximos,
+# médias, tabela diária e tempo em cada nível de alerta são atualizados na
+# hora, e os gráficos usam rollups por bucket de tempo. A memória usada depende
+# do número de buckets/dias, não da quantidade de leituras do período.
+
+MAX_PONTOS_GRAFICO = 2000
+SEGUNDOS_DIA = 24 * 3600
+
+
+def segundos_bucket_para(inicio_epoch, fim_epoch):
+    """Menor múltiplo de 10 min que mantém os gráficos com até MAX_PONTOS_GRAFICO pontos."""
+    leituras = (fim_epoch - inicio_epoch) / INTERVALO_LEITURA_SEG + 1
+    return INTERVALO_LEITURA_SEG * max(1, math.ceil(leituras / MAX_PONTOS_GRAFICO))
+
+
+class ResumoRelatorio:
+    __slots__ = ("inicio_epoch", "fim_epoch", "leituras", "leituras_sinalizadas", "chuva_total", "chuva_max_10min",
+                 "umidade_media", "dias", "chuva_dia", "chuva_max_dia",
+                 "segundos_nivel_solo", "segundos_nivel_chuva",
+                 "segundos_bucket", "buckets", "chuva_bucket", "umidade_bucket")
+
+    def __init__(self, **valores):
+        for campo, valor in valores.items():
+            setattr(self, campo, valor)
+
+
+class AcumuladorRelatorio:
+    """Agregação de passagem única sobre blocos de leituras em ordem cronológica.
+
+    Leituras anteriores a `inicio_epoch` podem ser enviadas (aquecimento): só
+    entram na janela móvel de 72h, para que o nível de chuva das primeiras
+    leituras do período seja o mesmo que o monitor calculou na época.
+    """
+
+    def __init__(self, inicio_epoch, fim_epoch, segundos_bucket=None):
+        self.inicio_epoch = int(inicio_epoch)
+        self.fim_epoch = int(fim_epoch)
+        self.segundos_bucket = int(segundos_bucket or segundos_bucket_para(self.inicio_epoch, self.fim_epoch))
+
+        n_buckets = (self.fim_epoch - self.inicio_epoch) // self.segundos_bucket + 1
+        self._bucket_contagem = np.zeros(n_buckets, dtype=np.int64)
+        self._bucket_chuva = np.zeros(n_buckets)
+        self._bucket_umidade = np.zeros((3, n_buckets))
+        self._bucket_umidade_contagem = np.zeros((3, n_buckets), dtype=np.int64)
+
+        n_dias = (self.fim_epoch - self.inicio_epoch) // SEGUNDOS_DIA + 1
+        self._dia_contagem = np.zeros(n_dias, dtype=np.int64)
+        self._dia_chuva = np.zeros(n_dias)
+        self._dia_chuva_max = np.zeros(n_dias)
+
+        self._leituras = 0
+        self._sinalizadas = 0
+        self._chuva_total = 0.0
+        self._chuva_max = -math.inf
+        self._umidade_soma = np.zeros(3)
+        self._umidade_contagem = np.zeros(3, dtype=np.int64)  # Por campo: só valores não sinalizados
+        self._nivel_solo = np.zeros(len(NIVEIS), dtype=np.int64)
+        self._nivel_chuva = np.zeros(len(NIVEIS), dtype=np.int64)
+
+        # Cauda das últimas 72h já vistas (carregada entre blocos)
+        self._cauda_ts = np.zeros(0, dtype=np.int64)
+        self._cauda_chuva = np.zeros(0)
+
+    def adicionar(self, bloco):
+        if not len(bloco):
+            return
+        ts_bloco = bloco['timestamp']
+        chuva_bloco = chuva_valida(bloco)  # Chuva sinalizada pelo QC não conta, como no monitor
+
+        # Acumulado de 72h de cada leitura (mesma janela do monitor de alertas)
+        ts = np.concatenate((self._cauda_ts, ts_bloco))
+        chuva = np.concatenate((self._cauda_chuva, chuva_bloco))
+        acumulado_72h = JanelasAgregadas(ts, chuva).soma(ts_bloco, JANELA_CHUVA_72H_SEG)
+
+        corte, _ = limites_janela(ts, ts[-1], JANELA_CHUVA_72H_SEG)
+        self._cauda_ts = ts[corte:].copy()
+        self._cauda_chuva = chuva[corte:].copy()
+
+        dentro = (ts_bloco >= self.inicio_epoch) & (ts_bloco <= self.fim_epoch)
+        if not dentro.all():
+            ts_bloco, chuva_bloco = ts_bloco[dentro], chuva_bloco[dentro]
+            bloco, acumulado_72h = bloco[dentro], acumulado_72h[dentro]
+        if not len(ts_bloco):
+            return
+        umidades = (bloco['umidade_1m_perc'], bloco['umidade_2m_perc'], bloco['umidade_3m_perc'])
+        # Umidade sinalizada pelo QC fica fora das médias, dos gráficos e do tempo por nível de solo
+        umidades_validas = [valores_validos(bloco, campo) for campo in CAMPOS_UMIDADE]
+
+        self._leituras += len(ts_bloco)
+        self._sinalizadas += int(np.count_nonzero(bloco['qc']))
+        self._chuva_total += float(chuva_bloco.sum())
+        self._chuva_max = max(self._chuva_max, float(chuva_bloco.max()))
+        for i, (umidade, valida) in enumerate(zip(umidades, umidades_validas)):
+            self._umidade_soma[i] += float(umidade[valida].sum())
+            self._umidade_contagem[i] += int(np.count_nonzero(valida))
+
+        solo_valido = np.logical_and.reduce(umidades_validas)
+        self._nivel_solo += np.bincount(soil_alert_indices(*umidades)[solo_valido], minlength=len(NIVEIS))
+        self._nivel_chuva += np.bincount(rain_alert_indices(acumulado_72h), minlength=len(NIVEIS))
+
+        relativo = ts_bloco - self.inicio_epoch
+        buckets = relativo // self.segundos_bucket
+        n_buckets = len(self._bucket_contagem)
+        self._bucket_contagem += np.bincount(buckets, minlength=n_buckets)
+        self._bucket_chuva += np.bincount(buckets, weights=chuva_bloco, minlength=n_buckets)
+        for i, (umidade, valida) in enumerate(zip(umidades, umidades_validas)):
+            self._bucket_umidade[i] += np.bincount(buckets[valida], weights=umidade[valida], minlength=n_buckets)
+            self._bucket_umidade_contagem[i] += np.bincount(buckets[valida], minlength=n_buckets)
+
+        dias = relativo // SEGUNDOS_DIA
+        n_dias = len(self._dia_contagem)
+        self._dia_contagem += np.bincount(dias, minlength=n_dias)
+        self._dia_chuva += np.bincount(dias, weights=chuva_bloco, minlength=n_dias)
+        np.maximum.at(self._dia_chuva_max, dias, chuva_bloco)
+
+    def resumo(self):
+        com_dados = self._bucket_contagem > 0
+        contagem_umidade = self._bucket_umidade_contagem[:, com_dados]
+        buckets = self.inicio_epoch + np.flatnonzero(com_dados) * self.segundos_bucket
+        dias = np.flatnonzero(self._dia_contagem > 0)
+        return ResumoRelatorio(
+            inicio_epoch=self.inicio_epoch,
+            fim_epoch=self.fim_epoch,
+            leituras=self._leituras,
+            leituras_sinalizadas=self._sinalizadas,
+            chuva_total=self._chuva_total,
+            chuva_max_10min=self._chuva_max if self._leituras else math.nan,
+            umidade_media=_media(self._umidade_soma, self._umidade_contagem),
+            dias=self.inicio_epoch + dias * SEGUNDOS_DIA,
+            chuva_dia=self._dia_chuva[dias],
+            chuva_max_dia=self._dia_chuva_max[dias],
+            segundos_nivel_solo=self._nivel_solo * INTERVALO_LEITURA_SEG,
+            segundos_nivel_chuva=self._nivel_chuva * INTERVALO_LEITURA_SEG,
+            segundos_bucket=self.segundos_bucket,
+            buckets=buckets,
+            chuva_bucket=self._bucket_chuva[com_dados],
+            umidade_bucket=_media(self._bucket_umidade[:, com_dados], contagem_umidade),
+        )
+
+
+def _media(soma, contagem):
+    """soma / contagem, NaN onde não há valores válidos (o gráfico mostra a falha)."""
+    return np.divide(soma, contagem, out=np.full(np.shape(soma), math.nan), where=contagem > 0)
+
+
+# --- Montagem do PDF ---
+# Estilos e o renderizador do kaleido (subprocesso do Chromium) são criados uma
+# vez por processo e reaproveitados por todos os relatórios.
+_estilos = None
+
+
+def estilos_pdf():
+    global _estilos
+    if _estilos is None:
+        _estilos = getSampleStyleSheet()
+    return _estilos
+
+
+def preparar_renderizacao():
+    """Aquece estilos e kaleido (o primeiro to_image sobe o Chromium)."""
+    estilos_pdf()
+    pio.to_image(go.Figure(), format='png', width=16, height=16)
+
+
+def _datas(epochs):
+    return [datetime.datetime.fromtimestamp(int(t), tz=timezone.utc) for t in epochs]
+
+
+def _formatar_duracao(segundos):
+    horas, resto = divmod(int(segundos), 3600)
+    return f"{horas}h{resto // 60:02d}"
+
+
+def _figura_chuva(resumo, titulo):
+    x = _datas(resumo.buckets)
+    max_rain_in_window = float(resumo.chuva_bucket.max()) if len(resumo.chuva_bucket) else 0.0
+    secondary_yaxis_max = 6 if max_rain_in_window < 5 else math.ceil(max_rain_in_window) + 1
+    nome_barra = ("Pluviometria (mm)" if resumo.segundos_bucket == INTERVALO_LEITURA_SEG
+                  else f"Pluviometria (mm / {_formatar_duracao(resumo.segundos_bucket)})")
+    fig_pluvia = make_subplots(specs=[[{"secondary_y": True}]])
+    fig_pluvia.add_trace(go.Bar(x=x, y=resumo.chuva_bucket, name=nome_barra, marker_color='rgb(55, 83, 109)'),
+                         secondary_y=True)
+    fig_pluvia.add_trace(go.Scatter(x=x, y=np.cumsum(resumo.chuva_bucket), name='Precip. Acumulada (mm)',
+                                    mode='lines', line=dict(color='rgb(26, 118, 255)')), secondary_y=False)
+    fig_pluvia.update_layout(title_text=titulo, plot_bgcolor='white', paper_bgcolor='white')
+    fig_pluvia.update_yaxes(title_text="Precip. Acumulada (mm)", secondary_y=False, showgrid=False, zeroline=False)
+    fig_pluvia.update_yaxes(title_text="Pluviometria (mm)", secondary_y=True, range=[0, secondary_yaxis_max],
+                            showgrid=False, zeroline=False)
+    return fig_pluvia
+
+
+def _figura_umidade(resumo, titulo):
+    x = _datas(resumo.buckets)
+    fig_umidade = go.Figure()
+    for i, (nome, cor) in enumerate((('Profundidade 1 m', '#28a745'), ('Profundidade 2 m', '#ffc107'),
+                                     ('Profundidade 3 m', '#dc3545'))):
+        fig_umidade.add_trace(go.Scatter(x=x, y=resumo.umidade_bucket[i], name=nome, mode='lines',
+                                         line=dict(color=cor, width=3)))
+    fig_umidade.update_layout(title_text=titulo, yaxis_title="Umidade Volumétrica (%)",
+                              yaxis_range=[UMIDADE_BASE_3M - 5, UMIDADE_SATURACAO + 5],
+                              plot_bgcolor='white', paper_bgcolor='white')
+    fig_umidade.update_yaxes(showgrid=False, zeroline=False)
+    return fig_umidade
+
+
+def _tabela(linhas):
+    tabela = Table(linhas, hAlign='LEFT')
+    tabela.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e9ecef')),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ]))
+    return tabela
+
+
+def construir_pdf(resumo, start_date, end_date, styles=None, estacao=None):
+    """Gera o PDF (bytes) a partir de um ResumoRelatorio."""
+    styles = styles or estilos_pdf()
+    periodo = f"de {start_date.strftime('%d/%m')} a {end_date.strftime('%d/%m')}"
+    with fase("figura"):
+        fig_pluvia = _figura_chuva(resumo, f"Pluviometria {periodo}")
+        fig_umidade = _figura_umidade(resumo, f"Umidade do Solo {periodo}")
+    with fase("kaleido"):
+        img_pluvia_bytes = pio.to_image(fig_pluvia, format='png', width=800, height=450)
+        img_umidade_bytes = pio.to_image(fig_umidade, format='png', width=800, height=450)
+
+    def media(i):
+        valor = resumo.umidade_media[i]
+        return f"{valor:.2f} %" if not math.isnan(valor) else "N/D"
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=inch, leftMargin=inch, topMargin=inch, bottomMargin=inch)
+    story = []
+    story.append(Paragraph("Relatório de Monitoramento dos Sensores", styles['h1']))
+    story.append(Spacer(1, 12))
+    periodo_str = f"Período de Análise: {start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}"
+    story.append(Paragraph(periodo_str, styles['h3']))
+    if estacao:
+        story.append(Paragraph(f"Estação: {estacao}", styles['h3']))
+    story.append(Spacer(1, 24))
+    story.append(Paragraph("Resumo do Período", styles['h2']))
+    story.append(Spacer(1, 12))
+    story.append(Paragraph(f"• Chuva Total Acumulada: {resumo.chuva_total:.2f} mm", styles['Normal']))
+    story.append(Paragraph(f"• Maior Leitura de Chuva (10 min): {resumo.chuva_max_10min:.2f} mm", styles['Normal']))
+    story.append(Paragraph(f"• Umidade Média (1m): {media(0)}", styles['Normal']))
+    story.append(Paragraph(f"• Umidade Média (2m): {media(1)}", styles['Normal']))
+    story.append(Paragraph(f"• Umidade Média (3m): {media(2)}", styles['Normal']))
+    if resumo.leituras_sinalizadas:
+        story.append(Paragraph(f"• Leituras sinalizadas pelo controle de qualidade: {resumo.leituras_sinalizadas} "
+                               f"de {resumo.leituras}", styles['Normal']))
+    story.append(Spacer(1, 24))
+    story.append(Paragraph("Gráficos de Análise", styles['h2']))
+    story.append(Spacer(1, 12))
+    story.append(Image(BytesIO(img_pluvia_bytes), width=7 * inch, height=3.9375 * inch))
+    story.append(Spacer(1, 12))
+    story.append(Image(BytesIO(img_umidade_bytes), width=7 * inch, height=3.9375 * inch))
+    story.append(Spacer(1, 24))
+
+    story.append(Paragraph("Tempo em Cada Nível de Alerta", styles['h2']))
+    story.append(Spacer(1, 12))
+    linhas = [["Nível", "Chuva (72h)", "Umidade do Solo"]]
+    for i, nivel in enumerate(NIVEIS):
+        linhas.append([nivel, _formatar_duracao(resumo.segundos_nivel_chuva[i]),
+                       _formatar_duracao(resumo.segundos_nivel_solo[i])])
+    story.append(_tabela(linhas))
+    story.append(Spacer(1, 24))
+
+    story.append(Paragraph("Chuva Diária", styles['h2']))
+    story.append(Spacer(1, 12))
+    linhas = [["Dia", "Chuva (mm)", "Maior Leitura 10 min (mm)"]]
+    for dia, total, maximo in zip(_datas(resumo.dias), resumo.chuva_dia, resumo.chuva_max_dia):
+        linhas.append([dia.strftime('%d/%m/%Y'), f"{total:.2f}", f"{maximo:.2f}"])
+    story.append(_tabela(linhas))
+
+    with fase("pdf"):
+        doc.build(story)
+    return buffer.getvalue()
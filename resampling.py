@@ -0,0 +1,113 @@
+import numpy as np
+
+from quality import QC_LACUNA, mascara_campo
+from readings import CAMPOS_VALORES, DTYPE_LEITURA
+from windows import INTERVALO_LEITURA_SEG, limites_janela, slot_de
+
+# --- Reamostragem para a Grade de 10 min ---
+# Gateways reais perdem e repetem leituras, e o relógio de cada estação tem
+# sua própria fase. Nada aqui conta leituras: períodos são escolhidos por
+# timestamp (busca binária, ver windows.py) e, para exibir ou exportar, as
+# leituras são alinhadas à grade de 10 min numa única passada vetorizada:
+#   - cada leitura vai para o slot (k-1)*10min < t <= k*10min (timestamp k*10min),
+#     a mesma convenção das janelas;
+#   - timestamps repetidos: fica a última leitura;
+#   - várias leituras no mesmo slot: chuva somada, demais campos da última;
+#   - slot sem leitura: marcado com QC_LACUNA (alertas e status ignoram), chuva
+#     NaN, demais campos repetem o último valor por até MAX_SLOTS_PREENCHIDOS
+#     slots e depois ficam NaN (o gráfico mostra a falha em vez de uma reta).
+
+MAX_SLOTS_PREENCHIDOS = 3  # Lacunas de até 30 min repetem o último valor
+CAMPOS_SOMADOS = ("pluviometria_mm",)
+
+
+def selecionar_periodo(registros, horas, fim=None):
+    """Leituras de (fim - horas, fim] por timestamp; `fim` padrão é a leitura mais recente."""
+    if not len(registros):
+        return registros
+    fim = registros["timestamp"][-1] if fim is None else fim
+    inicio, fim = limites_janela(registros["timestamp"], fim, int(float(horas) * 3600))
+    return registros[inicio:fim]
+
+
+def reamostrar(registros, inicio=None, fim=None, intervalo_seg=INTERVALO_LEITURA_SEG,
+               max_slots_preenchidos=MAX_SLOTS_PREENCHIDOS):
+    """Uma linha por slot da grade, dos slots de `inicio` a `fim` (padrão: primeira e última leitura).
+
+    `registros` em ordem cronológica (DTYPE_LEITURA). Devolve um array DTYPE_LEITURA novo.
+    """
+    if not len(registros) and (inicio is None or fim is None):
+        return np.zeros(0, dtype=DTYPE_LEITURA)
+    timestamps = registros["timestamp"]
+    if len(registros):
+        # Timestamps repetidos: fica a última leitura
+        registros = registros[np.concatenate((timestamps[1:] != timestamps[:-1], [True]))]
+        timestamps = registros["timestamp"]
+    slots = slot_de(timestamps, intervalo_seg)
+    primeiro = int(slot_de(inicio, intervalo_seg)) if inicio is not None else int(slots[0])
+    ultimo = int(slot_de(fim, intervalo_seg)) if fim is not None else int(slots[-1])
+    n = max(ultimo - primeiro + 1, 0)
+
+    dentro = (slots >= primeiro) & (slots <= ultimo)
+    registros, posicoes = registros[dentro], slots[dentro] - primeiro
+    grade = np.zeros(n, dtype=DTYPE_LEITURA)
+    grade["timestamp"] = (primeiro + np.arange(n)) * intervalo_seg
+    if not n:
+        return grade
+
+    lacuna = np.ones(n, dtype=bool)
+    if len(registros):
+        # Primeira e última leitura de cada slot (posicoes é não decrescente)
+        muda = posicoes[1:] != posicoes[:-1]
+        abre_slot = np.concatenate(([True], muda))
+        fecha_slot = np.concatenate((muda, [True]))
+        ocupados = posicoes[fecha_slot]
+        for campo in CAMPOS_VALORES:
+            grade[campo][ocupados] = registros[campo][fecha_slot]
+        for campo in CAMPOS_SOMADOS:
+            grade[campo] = np.bincount(posicoes, weights=registros[campo], minlength=n)
+        # QC: bits dos campos somados de qualquer leitura do slot, demais bits da última
+        somados = np.uint32(np.bitwise_or.reduce([mascara_campo(campo) & ~QC_LACUNA for campo in CAMPOS_SOMADOS]))
+        grade["qc"][ocupados] = (registros["qc"][fecha_slot] & ~somados
+                                 | np.bitwise_or.reduceat(registros["qc"] & somados, np.flatnonzero(abre_slot)))
+        lacuna[ocupados] = False
+
+    if lacuna.any():
+        indices = np.arange(n)
+        anterior = np.maximum.accumulate(np.where(lacuna, -1, indices))
+        preencher = lacuna & (anterior >= 0) & (indices - anterior <= max_slots_preenchidos)
+        origem = np.maximum(anterior, 0)
+        for campo in CAMPOS_VALORES:
+            if campo in CAMPOS_SOMADOS:
+                grade[campo][lacuna] = np.nan
+            else:
+                grade[campo] = np.where(lacuna, np.where(preencher, grade[campo][origem], np.nan), grade[campo])
+        grade["qc"][lacuna] = QC_LACUNA
+    return grade
+
+
+def ordenar_e_deduplicar(leituras, timestamps_armazenados=()):
+    """Separa um lote (Leitura) em (novas, atrasadas, quantidade descartada), cada lista em ordem.
+
+    Novas: depois da última leitura armazenada. Atrasadas: anteriores a ela, com timestamp ainda
+    ausente do armazenamento (gateway que reenvia leituras antigas). Timestamps já armazenados são
+    descartados; entre repetidas do lote, fica a última recebida.
+    """
+    if not leituras:
+        return leituras, [], 0
+    por_timestamp = {}
+    for leitura in leituras:
+        por_timestamp[leitura.timestamp] = leitura
+    timestamps = np.array(sorted(por_timestamp), dtype=np.int64)
+    armazenados = np.asarray(timestamps_armazenados, dtype=np.int64)
+    if len(armazenados):
+        posicoes = np.searchsorted(armazenados, timestamps)
+        ja_armazenados = armazenados[np.minimum(posicoes, len(armazenados) - 1)] == timestamps
+        timestamps = timestamps[~ja_armazenados]
+        atrasadas = timestamps[timestamps < armazenados[-1]]
+        timestamps = timestamps[timestamps > armazenados[-1]]
+    else:
+        atrasadas = timestamps[:0]
+    novas = [por_timestamp[int(timestamp)] for timestamp in timestamps]
+    atrasadas = [por_timestamp[int(timestamp)] for timestamp in atrasadas]
+    return novas, atrasadas, len(leituras) - len(novas) - len(atrasadas)
@@ -0,0 +1,196 @@
+import datetime
+import os
+import shutil
+from datetime import timezone
+
+import numpy as np
+
+from readings import DTYPE_LEITURA, iterar_blocos
+
+# --- Retenção e Camadas do Histórico ---
+# Memória: últimos N dias em resolução total (ArmazemLeituras). Ao passar do
+# limite, os dias mais antigos saem da memória em blocos de dias inteiros e vão:
+#   - para rollups horários em memória (poucos bytes por hora, com retenção própria);
+#   - para o disco, um arquivo .npy por dia em resolução total (opcional).
+# O corte é sempre no início de um dia UTC, então o seletor de datas do
+# relatório e as janelas de 72h trabalham com dias inteiros em uma das camadas.
+
+SEGUNDOS_DIA = 24 * 3600
+SEGUNDOS_HORA = 3600
+LEITURAS_POR_DIA = 6 * 24
+
+DTYPE_ROLLUP = np.dtype([
+    ("timestamp", "<i8"),  # Início da hora (epoch UTC)
+    ("leituras", "<u2"),
+    ("sinalizadas", "<u2"),
+    ("pluviometria_mm", "<f8"),
+    ("pluviometria_max_mm", "<f8"),
+    ("umidade_1m_perc", "<f8"),
+    ("umidade_2m_perc", "<f8"),
+    ("umidade_3m_perc", "<f8"),
+])
+
+
+def inicio_do_dia(epoch):
+    return int(epoch) - int(epoch) % SEGUNDOS_DIA
+
+
+def agregar_por_hora(registros):
+    """Rollup horário (soma/máximo de chuva, médias de umidade) de leituras em ordem cronológica."""
+    if not len(registros):
+        return np.zeros(0, dtype=DTYPE_ROLLUP)
+    horas = registros["timestamp"] - registros["timestamp"] % SEGUNDOS_HORA
+    inicio_hora, indice = np.unique(horas, return_inverse=True)
+    contagem = np.bincount(indice)
+    rollup = np.zeros(len(inicio_hora), dtype=DTYPE_ROLLUP)
+    rollup["timestamp"] = inicio_hora
+    rollup["leituras"] = contagem
+    rollup["sinalizadas"] = np.bincount(indice, weights=registros["qc"] != 0)
+    rollup["pluviometria_mm"] = np.bincount(indice, weights=registros["pluviometria_mm"])
+    np.maximum.at(rollup["pluviometria_max_mm"], indice, registros["pluviometria_mm"])
+    for campo in ("umidade_1m_perc", "umidade_2m_perc", "umidade_3m_perc"):
+        rollup[campo] = np.bincount(indice, weights=registros[campo]) / contagem
+    return rollup
+
+
+class ArquivoDiario:
+    """Camada em disco: DIRETORIO/<estacao>/<AAAA-MM-DD>.npy, um array estruturado por dia."""
+
+    def __init__(self, diretorio, estacao, retencao_dias):
+        self.diretorio = os.path.join(diretorio, estacao)
+        self.retencao_dias = retencao_dias
+
+    def _caminho(self, dia):
+        return os.path.join(self.diretorio, f"{dia.isoformat()}.npy")
+
+    def dias(self):
+        if not os.path.isdir(self.diretorio):
+            return []
+        dias = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(".npy"):
+                try:
+                    dias.append(datetime.date.fromisoformat(nome[:-4]))
+                except ValueError:
+                    continue
+        return sorted(dias)
+
+    def gravar(self, registros):
+        """Grava leituras (dias inteiros, em ordem) nos arquivos dos respectivos dias."""
+        if not len(registros):
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        dias = registros["timestamp"] // SEGUNDOS_DIA
+        limites = np.flatnonzero(np.diff(dias)) + 1
+        for bloco in np.split(registros, limites):
+            dia = datetime.datetime.fromtimestamp(int(bloco["timestamp"][0]), tz=timezone.utc).date()
+            caminho = self._caminho(dia)
+            if os.path.exists(caminho):
+                # Dia já parcialmente gravado (ex.: retenção alterada): junta sem duplicar
+                existente = np.load(caminho)
+                bloco = np.concatenate((existente[existente["timestamp"] < bloco["timestamp"][0]], bloco))
+            temporario = caminho + ".tmp.npy"
+            np.save(temporario, bloco)
+            os.replace(temporario, caminho)
+
+    def expurgar(self, dia_mais_recente):
+        """Apaga os dias além da retenção em disco."""
+        limite = dia_mais_recente - datetime.timedelta(days=self.retencao_dias)
+        for dia in self.dias():
+            if dia < limite:
+                os.remove(self._caminho(dia))
+
+    def iterar(self, inicio_epoch, fim_epoch, tamanho_bloco, antes_de=None):
+        """Blocos de leituras de [inicio, fim] a partir dos arquivos diários (um dia carregado por vez)."""
+        dia_inicio = datetime.datetime.fromtimestamp(inicio_do_dia(inicio_epoch), tz=timezone.utc).date()
+        dia_fim = datetime.datetime.fromtimestamp(inicio_do_dia(fim_epoch), tz=timezone.utc).date()
+        for dia in self.dias():
+            if dia < dia_inicio or dia > dia_fim:
+                continue
+            registros = np.load(self._caminho(dia), mmap_mode="r")
+            if antes_de is not None:
+                registros = registros[:np.searchsorted(registros["timestamp"], antes_de, side="left")]
+            yield from iterar_blocos(registros, inicio_epoch, fim_epoch, tamanho_bloco)
+
+    def bytes_em_disco(self):
+        return sum(os.path.getsize(self._caminho(dia)) for dia in self.dias())
+
+    def limpar(self):
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+
+class PoliticaRetencao:
+    def __init__(self, dias_memoria, dias_rollup, arquivo=None):
+        self.dias_memoria = dias_memoria
+        self.dias_rollup = dias_rollup
+        self.arquivo = arquivo
+        self.rollups = np.zeros(0, dtype=DTYPE_ROLLUP)
+        self.leituras_descartadas = 0
+        self.ultimo_corte = None
+
+    def capacidade_memoria(self):
+        """Leituras que a camada em memória pode precisar guardar (limite do buffer)."""
+        # N dias + dia corrente + um dia de folga antes do próximo corte
+        return (self.dias_memoria + 2) * LEITURAS_POR_DIA
+
+    def aplicar(self, armazem):
+        """Tira da memória os dias inteiros além da retenção. Só age com um dia de folga acumulado."""
+        registros = armazem.registros()
+        if not len(registros):
+            return 0
+        corte = inicio_do_dia(registros["timestamp"][-1]) - self.dias_memoria * SEGUNDOS_DIA
+        if registros["timestamp"][0] >= corte - SEGUNDOS_DIA:
+            return 0
+        descartadas = armazem.descartar_antes(corte, capacidade=self.capacidade_memoria())
+        if not len(descartadas):
+            return 0
+        self.ultimo_corte = corte
+        self.leituras_descartadas += len(descartadas)
+
+        # Rollups horários (o corte é no início do dia: nenhuma hora fica dividida)
+        self.rollups = np.concatenate((self.rollups, agregar_por_hora(descartadas)))
+        limite_rollup = corte - self.dias_rollup * SEGUNDOS_DIA
+        self.rollups = self.rollups[np.searchsorted(self.rollups["timestamp"], limite_rollup, side="left"):].copy()
+
+        if self.arquivo is not None:
+            self.arquivo.gravar(descartadas)
+            self.arquivo.expurgar(datetime.datetime.fromtimestamp(corte, tz=timezone.utc).date())
+        return len(descartadas)
+
+    def limpar(self):
+        self.rollups = np.zeros(0, dtype=DTYPE_ROLLUP)
+        self.leituras_descartadas = 0
+        self.ultimo_corte = None
+        if self.arquivo is not None:
+            self.arquivo.limpar()
+
+    def dia_mais_antigo_em_disco(self):
+        if self.arquivo is None:
+            return None
+        dias = self.arquivo.dias()
+        return dias[0] if dias else None
+
+    def estatisticas(self, armazem):
+        dias_disco = self.arquivo.dias() if self.arquivo is not None else []
+        return {
+            "memoria": {
+                "leituras": len(armazem),
+                "bytes": armazem.bytes_usados(),
+                "limite_bytes": max(self.capacidade_memoria(), armazem.CAPACIDADE_INICIAL) * DTYPE_LEITURA.itemsize,
+                "dias_retencao": self.dias_memoria,
+            },
+            "rollups_horarios": {
+                "linhas": len(self.rollups),
+                "bytes": self.rollups.nbytes,
+                "limite_bytes": self.dias_rollup * 24 * DTYPE_ROLLUP.itemsize,
+                "dias_retencao": self.dias_rollup,
+            },
+            "disco": {
+                "ativo": self.arquivo is not None,
+                "dias": len(dias_disco),
+                "primeiro_dia": dias_disco[0].isoformat() if dias_disco else None,
+                "bytes": self.arquivo.bytes_em_disco() if self.arquivo is not None else 0,
+                "dias_retencao": self.arquivo.retencao_dias if self.arquivo is not None else 0,
+            },
+            "leituras_descartadas": self.leituras_descartadas,
+        }
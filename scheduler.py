@@ -0,0 +1,213 @@
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import obter_logger
+from profiling import rastrear
+
+# --- Agendador de Tarefas Periódicas ---
+# Cada tarefa roda em prazos fixos do relógio monotônico do loop
+# (inicio + k * intervalo), então o tempo gasto na execução não acumula deriva.
+# Quando uma execução passa do próximo prazo (overrun), a política decide:
+#   "pular":     descarta os ticks perdidos e segue no próximo prazo futuro;
+#   "recuperar": executa os ticks perdidos em sequência (até max_recuperacao).
+# Tarefas com em_thread=True rodam num pool dedicado para não travar o loop.
+# Cada execução é rastreada (profiling.rastrear): as que passam do orçamento
+# de latência vão para o log com a quebra por fase.
+
+POLITICAS = ("pular", "recuperar")
+MAX_BACKOFF_ERRO_SEG = 30.0
+
+log = obter_logger("agendador")
+
+
+class TarefaPeriodica:
+    def __init__(self, nome, funcao, intervalo_seg, politica="pular", em_thread=False,
+                 atraso_inicial_seg=None, max_recuperacao=10):
+        if politica not in POLITICAS:
+            raise ValueError(f"Política inválida para '{nome}': {politica} (use {POLITICAS})")
+        self.nome = nome
+        self.funcao = funcao
+        self.intervalo_seg = float(intervalo_seg)
+        self.politica = politica
+        self.em_thread = em_thread
+        self.atraso_inicial_seg = self.intervalo_seg if atraso_inicial_seg is None else float(atraso_inicial_seg)
+        self.max_recuperacao = max_recuperacao
+        self._zerar_estatisticas()
+
+    def _zerar_estatisticas(self):
+        self.execucoes = 0
+        self.erros = 0
+        self.erros_consecutivos = 0
+        self.ultimo_erro = None
+        self.overruns = 0
+        self.ticks_pulados = 0
+        self.ticks_recuperados = 0
+        self.duracao_ultima_ms = 0.0
+        self.duracao_max_ms = 0.0
+        self._duracao_total_ms = 0.0
+        self.atraso_max_ms = 0.0  # Quanto o início real passou do prazo
+
+    def estatisticas(self):
+        return {
+            "intervalo_seg": self.intervalo_seg,
+            "politica": self.politica,
+            "em_thread": self.em_thread,
+            "execucoes": self.execucoes,
+            "erros": self.erros,
+            "ultimo_erro": self.ultimo_erro,
+            "overruns": self.overruns,
+            "ticks_pulados": self.ticks_pulados,
+            "ticks_recuperados": self.ticks_recuperados,
+            "duracao_ultima_ms": round(self.duracao_ultima_ms, 2),
+            "duracao_media_ms": round(self._duracao_total_ms / self.execucoes, 2) if self.execucoes else 0.0,
+            "duracao_max_ms": round(self.duracao_max_ms, 2),
+            "atraso_max_ms": round(self.atraso_max_ms, 2),
+        }
+
+
+def _executar_rastreado(tarefa):
+    # Roda na thread do pool: o rastreamento precisa ser aberto na própria thread
+    with rastrear("tarefa", tarefa.nome):
+        return tarefa.funcao()
+
+
+class Agendador:
+    def __init__(self, threads=2):
+        self._tarefas = {}
+        self._tasks = {}
+        self._threads = threads
+        self._executor = None
+        self._em_thread = set()  # Execuções em thread ainda não terminadas (threads não são canceláveis)
+        self._lock_reinicio = None
+
+    def registrar(self, tarefa):
+        if tarefa.nome in self._tarefas:
+            raise ValueError(f"Tarefa já registrada: {tarefa.nome}")
+        self._tarefas[tarefa.nome] = tarefa
+        if self.rodando():
+            self._tasks[tarefa.nome] = asyncio.create_task(self._rodar(tarefa), name=f"agendador:{tarefa.nome}")
+        return tarefa
+
+    def tarefa(self, nome):
+        return self._tarefas[nome]
+
+    def rodando(self):
+        return any(not t.done() for t in self._tasks.values())
+
+    async def _executar_uma_vez(self, tarefa):
+        if tarefa.em_thread:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._threads, thread_name_prefix="agendador")
+            futuro = asyncio.get_running_loop().run_in_executor(self._executor, _executar_rastreado, tarefa)
+            self._em_thread.add(futuro)
+            futuro.add_done_callback(self._em_thread.discard)
+            try:
+                await asyncio.shield(futuro)
+            except asyncio.CancelledError:
+                # Não deixa a thread rodando "solta" depois do cancelamento (ex.: reinício)
+                await asyncio.wait([futuro])
+                raise
+        else:
+            with rastrear("tarefa", tarefa.nome):
+                resultado = tarefa.funcao()
+                if inspect.isawaitable(resultado):
+                    await resultado
+
+    async def _rodar(self, tarefa):
+        loop = asyncio.get_running_loop()
+        log.info("Tarefa '%s' iniciada (a cada %ss, %s).", tarefa.nome, tarefa.intervalo_seg, tarefa.politica)
+        prazo = loop.time() + tarefa.atraso_inicial_seg
+        while True:
+            espera = prazo - loop.time()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            inicio = loop.time()
+            tarefa.atraso_max_ms = max(tarefa.atraso_max_ms, (inicio - prazo) * 1000)
+            try:
+                await self._executar_uma_vez(tarefa)
+                tarefa.erros_consecutivos = 0
+            except asyncio.CancelledError:
+                log.info("Tarefa '%s' cancelada.", tarefa.nome)
+                raise
+            except Exception as e:
+                tarefa.erros += 1
+                tarefa.erros_consecutivos += 1
+                tarefa.ultimo_erro = f"{type(e).__name__}: {e}"
+                # Erros iguais em sequência (ex.: dependência fora do ar) são suprimidos pelo logs.py
+                log.error("Erro na tarefa '%s': %s", tarefa.nome, tarefa.ultimo_erro,
+                          extra={"campos": {"tarefa": tarefa.nome, "erros_consecutivos": tarefa.erros_consecutivos}})
+            fim = loop.time()
+            duracao_ms = (fim - inicio) * 1000
+            tarefa.execucoes += 1
+            tarefa.duracao_ultima_ms = duracao_ms
+            tarefa.duracao_max_ms = max(tarefa.duracao_max_ms, duracao_ms)
+            tarefa._duracao_total_ms += duracao_ms
+
+            prazo += tarefa.intervalo_seg
+            if fim > prazo:
+                tarefa.overruns += 1
+                # Prazos que já ficaram no passado durante esta execução
+                perdidos = int((fim - prazo) // tarefa.intervalo_seg) + 1
+                if tarefa.politica == "pular":
+                    tarefa.ticks_pulados += perdidos
+                    prazo += perdidos * tarefa.intervalo_seg
+                else:
+                    # Recupera até max_recuperacao ticks; o excedente é descartado
+                    excedente = max(0, perdidos - tarefa.max_recuperacao)
+                    tarefa.ticks_pulados += excedente
+                    tarefa.ticks_recuperados += perdidos - excedente
+                    prazo += excedente * tarefa.intervalo_seg
+
+            if tarefa.erros_consecutivos:
+                # Backoff exponencial limitado em vez de uma pausa fixa longa
+                backoff = min(tarefa.intervalo_seg * (2 ** (tarefa.erros_consecutivos - 1)), MAX_BACKOFF_ERRO_SEG)
+                prazo = max(prazo, loop.time() + backoff)
+
+    def iniciar(self):
+        for nome, tarefa in self._tarefas.items():
+            task = self._tasks.get(nome)
+            if task is None or task.done():
+                self._tasks[nome] = asyncio.create_task(self._rodar(tarefa), name=f"agendador:{nome}")
+
+    async def parar(self, timeout=2.0):
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, pendentes = await asyncio.wait(tasks, timeout=timeout)
+            if pendentes:
+                log.warning("%d tarefa(s) não terminaram em %ss.", len(pendentes), timeout)
+        self._tasks = {}
+
+    async def reiniciar(self, preparar=None, timeout=2.0):
+        """Para todas as tarefas, roda `preparar()` com tudo parado e inicia de novo com estatísticas zeradas.
+
+        Execuções em thread que passarem de `timeout` são aguardadas até o fim antes de `preparar()`.
+        """
+        if self._lock_reinicio is None:
+            self._lock_reinicio = asyncio.Lock()
+        async with self._lock_reinicio:
+            await self.parar(timeout=timeout)
+            # Uma execução em thread que passou do timeout continua rodando: `preparar` só
+            # roda depois que ela termina, senão o estado seria resetado no meio da execução
+            if self._em_thread:
+                log.warning("Reinício aguardando %d execução(ões) em thread terminarem.", len(self._em_thread))
+                await asyncio.wait(list(self._em_thread))
+            if preparar is not None:
+                resultado = preparar()
+                if inspect.isawaitable(resultado):
+                    await resultado
+            for tarefa in self._tarefas.values():
+                tarefa._zerar_estatisticas()
+            self.iniciar()
+
+    def desligar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def estatisticas(self):
+        return {nome: {**tarefa.estatisticas(),
+                       "rodando": nome in self._tasks and not self._tasks[nome].done()}
+                for nome, tarefa in self._tarefas.items()}
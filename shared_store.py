@@ -0,0 +1,320 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+try:
+    import fcntl
+except ImportError:  # Sem fcntl (Windows): pedidos serializados só dentro do processo
+    fcntl = None
+
+import numpy as np
+
+from readings import DTYPE_LEITURA
+
+# --- Buffer Circular em Memória Compartilhada ---
+# Usado no modo multi-worker: um único processo produtor (simulação + alertas)
+# escreve as leituras aqui e qualquer número de workers HTTP/Dash apenas lê.
+# As leituras não usam lock: o produtor incrementa um contador de sequência
+# (seqlock) antes e depois de cada escrita e o leitor repete a cópia se o
+# contador estiver ímpar ou tiver mudado durante a leitura.
+#
+# Identidade do segmento: cada criar() grava um número aleatório no cabeçalho e
+# zera o do segmento antigo antes de apagá-lo. Um leitor que ainda mapeia o
+# segmento antigo (produtor reiniciado) vê a identidade mudar e se reanexa.
+# Os pedidos dos leitores ao produtor (reinício, fator) são os únicos dados
+# escritos por vários processos: ficam sob um lock de arquivo (flock).
+
+NOME_PADRAO = "monitoramento_sensores"
+CAPACIDADE_PADRAO = 6 * 24 * 30  # 30 dias de leituras de 10 min
+
+# Layout de uma leitura no buffer: o mesmo array estruturado usado em memória
+DTYPE_REGISTRO = DTYPE_LEITURA
+
+# Posições no cabeçalho (array de uint64)
+_SEQ = 0  # Seqlock: ímpar = escrita em andamento
+_TOTAL = 1  # Total de registros escritos desde o último reset
+_CAPACIDADE = 2
+_GERACAO = 3  # Incrementado a cada reinício da simulação
+_PEDIDOS_REINICIO = 4  # Incrementado pelos leitores para pedir reinício ao produtor
+_PEDIDOS_FATOR = 5  # Incrementado pelos leitores ao pedir novo fator de compressão do tempo
+_FATOR_PEDIDO = 6  # Valor float64 do último fator pedido (mesmos bytes, view float64)
+_IDENTIDADE = 7  # Aleatório por segmento criado; 0 = segmento substituído ou liberado
+_TAMANHO_ESTADO = 8  # Quantos float64 de estado do modelo seguem o cabeçalho
+_TAMANHO_CABECALHO = 10
+# Depois do cabeçalho: vetor de estado do modelo (float64, tamanho escolhido
+# pelo produtor em criar()), publicado junto com as leituras para o nowcast
+# dos workers leitores; depois dele, as leituras.
+
+_MAX_TENTATIVAS_LEITURA = 1000
+_lock_pedidos_processo = threading.Lock()
+
+
+class SegmentoFechado(RuntimeError):
+    """Leitura num SharedRingBuffer já fechado (outra thread do processo se reanexou)."""
+
+
+def _desregistrar_do_resource_tracker(shm):
+    # Antes do Python 3.13 o resource_tracker apaga o segmento quando QUALQUER
+    # processo que o abriu termina; só o produtor deve ser dono dele.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+@contextmanager
+def _lock_pedidos(nome):
+    """Exclusão mútua entre processos para os contadores de pedidos dos leitores."""
+    with _lock_pedidos_processo:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(tempfile.gettempdir(), f"{nome}.lock"), "a") as arquivo:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _offset_registros(tamanho_estado_modelo):
+    return (_TAMANHO_CABECALHO + tamanho_estado_modelo) * 8
+
+
+def _identidade_nova():
+    return int.from_bytes(os.urandom(8), "little") or 1
+
+
+class SharedRingBuffer:
+    def __init__(self, shm, dono):
+        self._shm = shm
+        self._dono = dono
+        self.nome = shm.name.lstrip("/")
+        self._cabecalho = np.ndarray((_TAMANHO_CABECALHO,), dtype=np.uint64, buffer=shm.buf, offset=0)
+        self._cabecalho_float = np.ndarray((_TAMANHO_CABECALHO,), dtype=np.float64, buffer=shm.buf, offset=0)
+        tamanho_estado = int(self._cabecalho[_TAMANHO_ESTADO])
+        self._estado_modelo = np.ndarray((tamanho_estado,), dtype=np.float64, buffer=shm.buf,
+                                         offset=_TAMANHO_CABECALHO * 8)
+        capacidade = int(self._cabecalho[_CAPACIDADE])
+        self._registros = np.ndarray((capacidade,), dtype=DTYPE_REGISTRO, buffer=shm.buf,
+                                     offset=_offset_registros(tamanho_estado))
+        self.capacidade = capacidade
+        # Identidade do segmento no momento do anexo (ver substituido())
+        self.identidade = int(self._cabecalho[_IDENTIDADE])
+        # Cache do leitor: evita copiar o buffer se nada mudou desde a última leitura
+        self._cache_seq = None
+        self._cache_registros = np.zeros(0, dtype=DTYPE_REGISTRO)
+        # Leituras em andamento neste processo: fechar() só desfaz o mapeamento quando a última termina
+        # (as views numpy não seguram o mmap; desmapear no meio de uma cópia derruba o processo)
+        self._lock_uso = threading.Lock()
+        self._em_uso_por = 0
+        self._fechado = False
+
+    @classmethod
+    def criar(cls, nome=NOME_PADRAO, capacidade=CAPACIDADE_PADRAO, tamanho_estado_modelo=0):
+        """Cria o segmento (uso exclusivo do produtor). Substitui um segmento antigo de mesmo nome.
+
+        `tamanho_estado_modelo`: quantos float64 publicar com escrever(estado_modelo=...).
+        """
+        tamanho = _offset_registros(tamanho_estado_modelo) + capacidade * DTYPE_REGISTRO.itemsize
+        try:
+            antigo = shared_memory.SharedMemory(name=nome)
+            # Avisa os leitores ainda anexados ao segmento antigo antes de apagá-lo
+            if antigo.size >= _TAMANHO_CABECALHO * 8:
+                cabecalho = np.ndarray((_TAMANHO_CABECALHO,), dtype=np.uint64, buffer=antigo.buf, offset=0)
+                cabecalho[_IDENTIDADE] = 0
+                del cabecalho
+            antigo.close()
+            antigo.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=nome, create=True, size=tamanho)
+        cabecalho = np.ndarray((_TAMANHO_CABECALHO,), dtype=np.uint64, buffer=shm.buf, offset=0)
+        cabecalho[:] = 0
+        cabecalho[_CAPACIDADE] = capacidade
+        cabecalho[_TAMANHO_ESTADO] = tamanho_estado_modelo
+        cabecalho[_IDENTIDADE] = _identidade_nova()
+        del cabecalho
+        return cls(shm, dono=True)
+
+    @classmethod
+    def anexar(cls, nome=NOME_PADRAO):
+        """Abre um segmento existente (workers leitores). Lança FileNotFoundError se o produtor não subiu."""
+        shm = shared_memory.SharedMemory(name=nome)
+        _desregistrar_do_resource_tracker(shm)
+        return cls(shm, dono=False)
+
+    # --- Lado do produtor ---
+    def _iniciar_escrita(self):
+        self._cabecalho[_SEQ] += 1
+
+    def _finalizar_escrita(self):
+        self._cabecalho[_SEQ] += 1
+
+    def escrever(self, registros, estado_modelo=None, substituir=0):
+        """Anexa um array estruturado de leituras (e o estado do modelo) numa única escrita do seqlock.
+
+        `substituir`: quantas leituras do fim do buffer são reescritas pelo início de `registros`
+        (leituras atrasadas inseridas no meio do histórico). O que já saiu do buffer não volta.
+        """
+        if len(registros) == 0:
+            return
+        self._iniciar_escrita()
+        try:
+            if estado_modelo is not None:
+                self._estado_modelo[:] = estado_modelo
+            total = int(self._cabecalho[_TOTAL])
+            if substituir:
+                recuo = min(substituir, total, self.capacidade)
+                registros = registros[substituir - recuo:]
+                total -= recuo
+            registros = registros[-self.capacidade:]
+            inicio = total % self.capacidade
+            primeiro_trecho = min(len(registros), self.capacidade - inicio)
+            self._registros[inicio:inicio + primeiro_trecho] = registros[:primeiro_trecho]
+            self._registros[:len(registros) - primeiro_trecho] = registros[primeiro_trecho:]
+            self._cabecalho[_TOTAL] = total + len(registros)
+        finally:
+            self._finalizar_escrita()
+
+    def resetar(self):
+        """Descarta todas as leituras (reinício da simulação)."""
+        self._iniciar_escrita()
+        self._cabecalho[_TOTAL] = 0
+        self._cabecalho[_GERACAO] += 1
+        self._estado_modelo[:] = 0
+        self._finalizar_escrita()
+
+    def geracao(self):
+        """Quantos reinícios da simulação este segmento já teve."""
+        with self._views_abertas() as (cabecalho, _, _):
+            return int(cabecalho[_GERACAO])
+
+    def pedidos_reinicio(self):
+        return int(self._cabecalho[_PEDIDOS_REINICIO])
+
+    def pedido_fator(self):
+        """(contador, fator) do último pedido de compressão do tempo feito pelos leitores."""
+        return int(self._cabecalho[_PEDIDOS_FATOR]), float(self._cabecalho_float[_FATOR_PEDIDO])
+
+    # --- Lado dos leitores ---
+    def pedir_reinicio(self):
+        """Sinaliza ao produtor um pedido de reinício; devolve o número do pedido."""
+        with self._views_abertas() as (cabecalho, _, _), _lock_pedidos(self.nome):
+            cabecalho[_PEDIDOS_REINICIO] += 1
+            return int(cabecalho[_PEDIDOS_REINICIO])
+
+    def pedir_fator(self, fator):
+        """Pede ao produtor um novo fator de compressão do tempo; devolve o número do pedido."""
+        with self._views_abertas() as (cabecalho, _, _), _lock_pedidos(self.nome):
+            self._cabecalho_float[_FATOR_PEDIDO] = fator
+            cabecalho[_PEDIDOS_FATOR] += 1
+            return int(cabecalho[_PEDIDOS_FATOR])
+
+    @contextmanager
+    def _views_abertas(self):
+        """(cabecalho, estado_modelo, registros) enquanto o bloco roda; SegmentoFechado se já fechado."""
+        with self._lock_uso:
+            if self._fechado:
+                raise SegmentoFechado(f"Segmento '{self.nome}' já fechado neste processo.")
+            self._em_uso_por += 1
+        try:
+            yield self._cabecalho, self._estado_modelo, self._registros
+        finally:
+            with self._lock_uso:
+                self._em_uso_por -= 1
+                liberar = self._fechado and not self._em_uso_por
+            if liberar:
+                self._liberar()
+
+    def substituido(self):
+        """True se o produtor recriou ou liberou o segmento depois do anexo (hora de reanexar)."""
+        try:
+            with self._views_abertas() as (cabecalho, _, _):
+                return int(cabecalho[_IDENTIDADE]) != self.identidade
+        except SegmentoFechado:
+            return True
+
+    def sobrescreveu(self):
+        """True se o buffer já deu a volta (as leituras mais antigas do produtor não estão mais aqui)."""
+        with self._views_abertas() as (cabecalho, _, _):
+            return int(cabecalho[_TOTAL]) > self.capacidade
+
+    def versao(self):
+        """Número de sequência atual; muda a cada escrita do produtor."""
+        with self._views_abertas() as (cabecalho, _, _):
+            return int(cabecalho[_SEQ])
+
+    def ler_registros(self):
+        """Cópia consistente (array estruturado, ordem cronológica) sem bloquear o produtor."""
+        with self._views_abertas() as (cabecalho, _, registros):
+            for _ in range(_MAX_TENTATIVAS_LEITURA):
+                seq_inicio = int(cabecalho[_SEQ])
+                if seq_inicio % 2 == 1:
+                    time.sleep(0)
+                    continue
+                total = int(cabecalho[_TOTAL])
+                n = min(total, self.capacidade)
+                inicio = (total - n) % self.capacidade
+                if inicio + n <= self.capacidade:
+                    copia = registros[inicio:inicio + n].copy()
+                else:
+                    copia = np.concatenate((registros[inicio:], registros[:inicio + n - self.capacidade]))
+                if int(cabecalho[_SEQ]) == seq_inicio:
+                    return seq_inicio, copia
+        raise RuntimeError("Não foi possível obter leitura consistente do buffer compartilhado.")
+
+    def ler_estado_modelo(self):
+        """Cópia consistente do último estado do modelo publicado (None se ainda não houver)."""
+        with self._views_abertas() as (cabecalho, estado_modelo, _):
+            for _ in range(_MAX_TENTATIVAS_LEITURA):
+                seq_inicio = int(cabecalho[_SEQ])
+                if seq_inicio % 2 == 1:
+                    time.sleep(0)
+                    continue
+                estado = estado_modelo.copy()
+                if int(cabecalho[_SEQ]) == seq_inicio:
+                    return estado if len(estado) and estado[0] else None  # Posição 0: timestamp da leitura do estado
+        raise RuntimeError("Não foi possível obter leitura consistente do buffer compartilhado.")
+
+    def ler_dados(self):
+        """Leituras atuais (array estruturado, somente leitura), com cache por versão."""
+        if self._cache_seq is None or self.versao() != self._cache_seq:
+            seq, registros = self.ler_registros()
+            registros.flags.writeable = False
+            self._cache_registros = registros
+            self._cache_seq = seq
+        return self._cache_registros
+
+    def fechar(self):
+        """Solta o segmento (e o apaga, no produtor). Seguro com leituras em andamento em outras threads."""
+        with self._lock_uso:
+            if self._fechado:
+                return
+            self._fechado = True
+            if self._dono:
+                self._cabecalho[_IDENTIDADE] = 0  # Leitores anexados passam a ver o segmento como liberado
+            liberar = not self._em_uso_por
+        if liberar:
+            self._liberar()
+
+    def _liberar(self):
+        # Libera as views numpy antes de fechar o mmap
+        self._cabecalho = None
+        self._cabecalho_float = None
+        self._estado_modelo = None
+        self._registros = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Ainda há memoryview exportada do segmento: o mapeamento sai com ela, pelo coletor
+            pass
+        if self._dono:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
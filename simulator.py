@@ -1,6 +1,8 @@
 import random
 import datetime
 
+from readings import Leitura
+
 # --- Constantes de Simulação ---
 
 # Níveis base de umidade
@@ -78,20 +80,16 @@ class SensorSimulator:
                 self.tempo_fim_seca = None
         total_chuva_24h = 0.0;
         total_chuva_72h = 0.0
-        limite_24h = current_timestamp_utc - datetime.timedelta(hours=24);
-        limite_72h = current_timestamp_utc - datetime.timedelta(hours=72)
+        # Leituras já validadas (readings.Leitura): timestamps em segundos epoch, sem parse
+        agora_epoch = current_timestamp_utc.timestamp()
+        limite_24h = agora_epoch - 24 * 3600;
+        limite_72h = agora_epoch - 72 * 3600
         for dado in reversed(history_data):
-            # Tenta converter o timestamp, pulando se falhar
-            try:
-                dado_timestamp = datetime.datetime.fromisoformat(dado['timestamp'])
-            except (ValueError, TypeError):
-                continue  # Pula este dado se o timestamp for inválido
-
-            if dado_timestamp < limite_72h: break
-            if dado_timestamp > limite_72h:
-                total_chuva_72h += dado.get('pluviometria_mm', 0.0)  # Usa .get() para segurança
-                if dado_timestamp > limite_24h:
-                    total_chuva_24h += dado.get('pluviometria_mm', 0.0)  # Usa .get() para segurança
+            if dado.timestamp < limite_72h: break
+            if dado.timestamp > limite_72h:
+                total_chuva_72h += dado.pluviometria_mm
+                if dado.timestamp > limite_24h:
+                    total_chuva_24h += dado.pluviometria_mm
 
         if total_chuva_72h > LIMITE_CHUVA_72H:
             self.estado_clima = "SECO";
@@ -227,27 +225,17 @@ class SensorSimulator:
         chuva_mm = self._simular_chuva(history_data, timestamp_utc)
         self._simular_umidade(chuva_mm)
 
-        # Calcula novo acumulado de forma segura
-        novo_acumulado = 0.0
+        # Calcula novo acumulado (o histórico só contém leituras válidas)
         if history_data:
-            # Pega o último dado válido do histórico
-            ultimo_dado_valido = None
-            for dado in reversed(history_data):
-                if isinstance(dado, dict) and 'precipitacao_acumulada_mm' in dado:
-                    ultimo_dado_valido = dado
-                    break
-            if ultimo_dado_valido:
-                novo_acumulado = ultimo_dado_valido.get('precipitacao_acumulada_mm', 0.0) + chuva_mm
-            else:  # Se não achou nenhum válido, começa do zero com a chuva atual
-                novo_acumulado = chuva_mm
+            novo_acumulado = history_data[-1].precipitacao_acumulada_mm + chuva_mm
         else:  # Se o histórico está vazio
             novo_acumulado = chuva_mm
 
-        return {
-            "timestamp": timestamp_utc.isoformat(),
-            "pluviometria_mm": round(chuva_mm, 2),
-            "precipitacao_acumulada_mm": round(novo_acumulado, 2),
-            "umidade_1m_perc": round(self.umidade_1m, 2),
-            "umidade_2m_perc": round(self.umidade_2m, 2),
-            "umidade_3m_perc": round(self.umidade_3m, 2),  # MODIFICADO de 2m5
-        }
\ No newline at end of file
+        return Leitura(
+            timestamp=timestamp_utc,
+            pluviometria_mm=round(chuva_mm, 2),
+            precipitacao_acumulada_mm=round(novo_acumulado, 2),
+            umidade_1m_perc=round(self.umidade_1m, 2),
+            umidade_2m_perc=round(self.umidade_2m, 2),
+            umidade_3m_perc=round(self.umidade_3m, 2),  # MODIFICADO de 2m5
+        )
\ No newline at end of file
@@ -0,0 +1,224 @@
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from alert_levels import CORES, NIVEIS
+
+# --- Cadastro de Estações e Índice Espacial ---
+# RegistroEstacoes guarda id/nome/coordenadas em arrays numpy e um índice em
+# grade (células de TAMANHO_CELULA_GRAUS) para consultas por bbox.
+#
+# Os níveis de cada estação vêm do StatusCache (calculado uma vez por nova
+# leitura) e são copiados para arrays int8 quando a versão muda. O
+# agrupamento de cada zoom (grade de ~TAMANHO_CLUSTER_PX pixels) é montado uma
+# única vez; só o pior nível por cluster é refeito, uma vez por versão e zoom.
+# A consulta por viewport só seleciona células/clusters: o custo depende do
+# que está na tela, não do total de estações.
+
+TAMANHO_CELULA_GRAUS = 0.05
+TAMANHO_CLUSTER_PX = 80      # Lado da célula de agrupamento na tela
+PIXELS_TILE = 256
+ZOOM_DETALHE = 13            # A partir deste zoom, sempre estações individuais
+MAX_ESTACOES_SEM_CLUSTER = 200  # Abaixo do zoom de detalhe, agrupa se houver mais que isso no viewport
+SEM_NIVEL = -1               # Estação sem status (sem leituras ainda)
+COR_SEM_NIVEL = "grey"
+
+
+class Estacao:
+    __slots__ = ("id", "nome", "lat", "lon")
+
+    def __init__(self, id, nome, lat, lon):
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+            raise ValueError(f"Coordenadas inválidas para a estação '{id}': {lat}, {lon}")
+        self.id = id
+        self.nome = nome
+        self.lat = float(lat)
+        self.lon = float(lon)
+
+
+def indice_nivel(nivel):
+    return NIVEIS.index(nivel) if nivel in NIVEIS else SEM_NIVEL
+
+
+def _nome_nivel(indice):
+    return NIVEIS[indice] if indice >= 0 else None
+
+
+def _cor_nivel(indice):
+    return CORES[indice] if indice >= 0 else COR_SEM_NIVEL
+
+
+def graus_cluster(zoom):
+    """Lado (graus de longitude) da célula de agrupamento no zoom dado."""
+    return 360.0 / (2 ** zoom) * TAMANHO_CLUSTER_PX / PIXELS_TILE
+
+
+class RegistroEstacoes:
+    def __init__(self, estacoes):
+        ids = [estacao.id for estacao in estacoes]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Ids de estação duplicados no cadastro.")
+        self.estacoes = list(estacoes)
+        self.ids = ids
+        self._posicao = {id: i for i, id in enumerate(ids)}
+        self.lat = np.array([estacao.lat for estacao in estacoes], dtype=np.float64)
+        self.lon = np.array([estacao.lon for estacao in estacoes], dtype=np.float64)
+
+        # Índice em grade: célula (i, j) -> posições das estações
+        self._celulas = {}
+        for posicao, (i, j) in enumerate(zip(self._celula(self.lon), self._celula(self.lat))):
+            self._celulas.setdefault((int(i), int(j)), []).append(posicao)
+        self._celulas = {celula: np.array(posicoes, dtype=np.int64) for celula, posicoes in self._celulas.items()}
+
+        self._lock = threading.Lock()
+        self.versao = None
+        vazio = np.full(len(ids), SEM_NIVEL, dtype=np.int8)
+        self._niveis = (vazio, vazio)  # (chuva, solo), publicados juntos
+        self._geometria = {}  # zoom -> agrupamento (não muda com o status)
+        self._niveis_cluster = {}  # zoom -> pior nível por cluster na versão atual
+
+    @classmethod
+    def carregar(cls, caminho, estacao_padrao):
+        """Lê o cadastro JSON ([{"id", "nome", "lat", "lon"}, ...]).
+
+        Sem arquivo, o cadastro tem só `estacao_padrao` (uma Estacao).
+        """
+        if not caminho or not os.path.exists(caminho):
+            return cls([estacao_padrao])
+        with open(caminho, encoding="utf-8") as arquivo:
+            itens = json.load(arquivo)
+        return cls([Estacao(item["id"], item.get("nome", item["id"]), item["lat"], item["lon"]) for item in itens])
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _celula(graus):
+        return np.floor(np.asarray(graus) / TAMANHO_CELULA_GRAUS).astype(np.int64)
+
+    def atualizar_niveis(self, versao, status_por_estacao):
+        """Copia os níveis do status (id -> dict do StatusCache) se a versão mudou."""
+        if versao == self.versao:
+            return
+        nivel_chuva = np.full(len(self.ids), SEM_NIVEL, dtype=np.int8)
+        nivel_solo = np.full(len(self.ids), SEM_NIVEL, dtype=np.int8)
+        for id, status in status_por_estacao.items():
+            posicao = self._posicao.get(id)
+            if posicao is not None and status:
+                nivel_chuva[posicao] = indice_nivel(status.get("rain_alert_level"))
+                nivel_solo[posicao] = indice_nivel(status.get("soil_alert_level"))
+        with self._lock:
+            # Publica junto: consultas em andamento continuam com os arrays antigos
+            self._niveis = (nivel_chuva, nivel_solo)
+            self._niveis_cluster = {}
+            self.versao = versao
+
+    def no_bbox(self, oeste, sul, leste, norte):
+        """Posições das estações dentro do bbox (pelo índice em grade)."""
+        i0, i1 = self._celula(oeste), self._celula(leste)
+        j0, j1 = self._celula(sul), self._celula(norte)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) <= len(self._celulas):
+            candidatas = [self._celulas[(i, j)] for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)
+                          if (i, j) in self._celulas]
+        else:
+            # Viewport maior que a área ocupada: percorre só as células com estações
+            candidatas = [posicoes for (i, j), posicoes in self._celulas.items()
+                          if i0 <= i <= i1 and j0 <= j <= j1]
+        if not candidatas:
+            return np.zeros(0, dtype=np.int64)
+        posicoes = np.concatenate(candidatas)
+        dentro = ((self.lon[posicoes] >= oeste) & (self.lon[posicoes] <= leste)
+                  & (self.lat[posicoes] >= sul) & (self.lat[posicoes] <= norte))
+        return np.sort(posicoes[dentro])
+
+    def _geometria_do_zoom(self, zoom):
+        geometria = self._geometria.get(zoom)
+        if geometria is not None:
+            return geometria
+        lado = graus_cluster(zoom)
+        chaves = np.stack((np.floor(self.lon / lado), np.floor(self.lat / lado)), axis=1).astype(np.int64)
+        _, grupo, quantidade = np.unique(chaves, axis=0, return_inverse=True, return_counts=True)
+        grupo = grupo.ravel()
+        n = len(quantidade)
+        geometria = {"grupo": grupo, "quantidade": quantidade,
+                     "lat": np.bincount(grupo, weights=self.lat, minlength=n) / quantidade,
+                     "lon": np.bincount(grupo, weights=self.lon, minlength=n) / quantidade}
+        for nome, valores, reducao in (("oeste", self.lon, np.minimum), ("leste", self.lon, np.maximum),
+                                       ("sul", self.lat, np.minimum), ("norte", self.lat, np.maximum)):
+            limite = np.full(n, np.inf if reducao is np.minimum else -np.inf)
+            reducao.at(limite, grupo, valores)
+            geometria[nome] = limite
+        self._geometria[zoom] = geometria
+        return geometria
+
+    def _niveis_do_zoom(self, zoom, geometria, niveis):
+        with self._lock:
+            por_cluster = self._niveis_cluster.get(zoom)
+        if por_cluster is not None and por_cluster[0] is niveis:
+            return por_cluster[1]
+        grupo, n = geometria["grupo"], len(geometria["quantidade"])
+        nivel_chuva, nivel_solo = niveis
+        pior_chuva = np.full(n, SEM_NIVEL, dtype=np.int8)
+        pior_solo = np.full(n, SEM_NIVEL, dtype=np.int8)
+        np.maximum.at(pior_chuva, grupo, nivel_chuva)
+        np.maximum.at(pior_solo, grupo, nivel_solo)
+        resultado = {"pior_chuva": pior_chuva, "pior_solo": pior_solo,
+                     "sem_status": np.bincount(grupo, weights=(nivel_chuva == SEM_NIVEL), minlength=n).astype(np.int64)}
+        with self._lock:
+            if self._niveis is niveis:
+                self._niveis_cluster[zoom] = (niveis, resultado)
+        return resultado
+
+    def consultar(self, oeste, sul, leste, norte, zoom):
+        """Itens do viewport: estações individuais ou clusters com o pior nível, conforme o zoom."""
+        zoom = max(0, min(int(zoom), 22))
+        niveis = self._niveis
+        nivel_chuva, nivel_solo = niveis
+        if zoom < ZOOM_DETALHE:
+            geometria = self._geometria_do_zoom(zoom)
+            dentro = np.flatnonzero((geometria["lon"] >= oeste) & (geometria["lon"] <= leste)
+                                    & (geometria["lat"] >= sul) & (geometria["lat"] <= norte))
+            total = int(geometria["quantidade"][dentro].sum())
+            if total > MAX_ESTACOES_SEM_CLUSTER:
+                clusters = {**geometria, **self._niveis_do_zoom(zoom, geometria, niveis)}
+                return {"modo": "clusters", "zoom": zoom, "estacoes": total,
+                        "itens": [self._item_cluster(clusters, c) for c in dentro]}
+        posicoes = self.no_bbox(oeste, sul, leste, norte)
+        return {"modo": "estacoes", "zoom": zoom, "estacoes": len(posicoes),
+                "itens": [self._item_estacao(p, nivel_chuva, nivel_solo) for p in posicoes]}
+
+    def _item_estacao(self, posicao, nivel_chuva, nivel_solo):
+        chuva, solo = int(nivel_chuva[posicao]), int(nivel_solo[posicao])
+        pior = max(chuva, solo)
+        estacao = self.estacoes[posicao]
+        return {"tipo": "estacao", "id": estacao.id, "nome": estacao.nome, "lat": estacao.lat, "lon": estacao.lon,
+                "nivel": _nome_nivel(pior), "cor": _cor_nivel(pior),
+                "nivel_chuva": _nome_nivel(chuva), "nivel_solo": _nome_nivel(solo)}
+
+    @staticmethod
+    def _item_cluster(clusters, c):
+        chuva, solo = int(clusters["pior_chuva"][c]), int(clusters["pior_solo"][c])
+        pior = max(chuva, solo)
+        return {"tipo": "cluster", "lat": round(float(clusters["lat"][c]), 6), "lon": round(float(clusters["lon"][c]), 6),
+                "quantidade": int(clusters["quantidade"][c]), "sem_status": int(clusters["sem_status"][c]),
+                "nivel": _nome_nivel(pior), "cor": _cor_nivel(pior),
+                "nivel_chuva": _nome_nivel(chuva), "nivel_solo": _nome_nivel(solo),
+                "bbox": [float(clusters["oeste"][c]), float(clusters["sul"][c]),
+                         float(clusters["leste"][c]), float(clusters["norte"][c])]}
+
+
+def ler_bbox(texto):
+    """"oeste,sul,leste,norte" (ordem do Leaflet toBBoxString) -> tupla de floats. Lança ValueError."""
+    try:
+        partes = [float(parte) for parte in texto.split(",")]
+    except ValueError:
+        partes = []
+    if len(partes) != 4 or not all(math.isfinite(p) for p in partes):
+        raise ValueError("bbox deve ser 'oeste,sul,leste,norte'.")
+    oeste, sul, leste, norte = partes
+    if sul > norte or oeste > leste:
+        raise ValueError("bbox com limites invertidos.")
+    return oeste, sul, leste, norte
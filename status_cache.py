@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli  # Opcional: só usado se estiver instalado
+except ImportError:
+    brotli = None
+
+# --- Cache do Status das Estações ---
+# O status (chuva 72h, nível/cor/altura de solo e chuva) é recalculado uma vez
+# por nova leitura. Cada combinação de estações pedida é serializada e
+# comprimida uma única vez por versão; as requisições seguintes só copiam bytes
+# prontos ou respondem 304 pelo ETag.
+# As threads da simulação/agendador atualizam e os handlers do loop leem ao
+# mesmo tempo: status e variantes ficam sob um lock.
+
+MAX_VARIANTES_CACHE = 64
+TAMANHO_MINIMO_COMPRESSAO = 256
+
+
+class _CorpoSerializado:
+    __slots__ = ("identidade", "gzip", "br", "etag")
+
+    def __init__(self, payload):
+        self.identidade = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = 'W/"' + hashlib.blake2b(self.identidade, digest_size=8).hexdigest() + '"'
+        self.gzip = None
+        self.br = None
+        if len(self.identidade) >= TAMANHO_MINIMO_COMPRESSAO:
+            self.gzip = gzip.compress(self.identidade, compresslevel=6)
+            if brotli is not None:
+                self.br = brotli.compress(self.identidade, quality=5)
+
+
+def _aceita(accept_encoding, codificacao):
+    for item in (accept_encoding or "").split(","):
+        partes = item.strip().split(";")
+        if partes[0].strip().lower() != codificacao:
+            continue
+        for parametro in partes[1:]:
+            chave, _, valor = parametro.strip().partition("=")
+            if chave == "q" and valor.strip() in ("0", "0.0", "0.00", "0.000"):
+                return False
+        return True
+    return False
+
+
+def etag_corresponde(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    valor = etag[2:] if etag.startswith("W/") else etag
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == valor:
+            return True
+    return False
+
+
+class StatusCache:
+    def __init__(self):
+        self.versao = None
+        self._status = {}
+        self._corpos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def atualizar(self, versao, status_por_estacao):
+        """Substitui o status de todas as estações e pré-serializa a resposta completa."""
+        status = dict(status_por_estacao)
+        chave = tuple(sorted(status))
+        # Serializa fora do lock: os leitores seguem com a versão anterior até a troca
+        corpo = _CorpoSerializado({"estacoes": {estacao: status[estacao] for estacao in chave}})
+        with self._lock:
+            self._status = status
+            self._corpos = OrderedDict([(chave, corpo)])
+            self.versao = versao
+
+    def estacoes(self):
+        with self._lock:
+            return list(self._status)
+
+    def status(self, estacao):
+        with self._lock:
+            return self._status.get(estacao)
+
+    def _corpo(self, chave):
+        # Chamado com self._lock adquirido
+        corpo = self._corpos.get(chave)
+        if corpo is None:
+            corpo = _CorpoSerializado({"estacoes": {estacao: self._status[estacao] for estacao in chave}})
+            self._corpos[chave] = corpo
+            if len(self._corpos) > MAX_VARIANTES_CACHE:
+                self._corpos.popitem(last=False)
+        else:
+            self._corpos.move_to_end(chave)
+        return corpo
+
+    def resposta(self, estacoes=None, accept_encoding=None):
+        """Retorna (bytes, etag, content_encoding|None) para as estações pedidas (None = todas).
+
+        Lança KeyError se nenhuma das estações pedidas existir.
+        """
+        with self._lock:
+            if estacoes is None:
+                chave = tuple(sorted(self._status))
+            else:
+                chave = tuple(sorted({e for e in estacoes if e in self._status}))
+                if not chave:
+                    raise KeyError("Nenhuma estação conhecida na requisição.")
+            corpo = self._corpo(chave)
+        if corpo.br is not None and _aceita(accept_encoding, "br"):
+            return corpo.br, corpo.etag, "br"
+        if corpo.gzip is not None and _aceita(accept_encoding, "gzip"):
+            return corpo.gzip, corpo.etag, "gzip"
+        return corpo.identidade, corpo.etag, None
@@ -0,0 +1,46 @@
+import os
+
+from alert_history import NOME_ARQUIVO, HistoricoAlertas
+
+DIA = 24 * 3600
+BASE = 1_700_000_000
+
+
+def _historico(diretorio=None):
+    historico = HistoricoAlertas(diretorio)
+    historico.registrar("a", "chuva", "Livre", "Atenção", BASE, (60.0,))
+    historico.registrar("a", "solo", "Livre", "Alerta", BASE + DIA, (40.0, 30.0, 25.0))
+    historico.registrar("a", "chuva", "Atenção", "Alerta", BASE + 2 * DIA, (90.0,))
+    historico.registrar("a", "chuva", "Alerta", "Livre", BASE + 10 * DIA, (10.0,))
+    return historico
+
+
+def test_sem_diretorio_nada_vai_para_o_disco(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    historico = _historico()
+    assert historico.bytes_em_disco() == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_expurgar_mantem_o_nivel_em_vigor_no_corte(tmp_path):
+    historico = _historico(str(tmp_path))
+    assert historico.expurgar(BASE + 5 * DIA) == 1  # Sai só o primeiro evento de chuva
+    eventos = historico.eventos("a")
+    assert list(eventos["timestamp"]) == [BASE + DIA, BASE + 2 * DIA, BASE + 10 * DIA]
+    assert historico.nivel_em("a", "chuva", BASE + 5 * DIA) == 2
+    assert historico.nivel_em("a", "solo", BASE + 5 * DIA) == 2
+    assert historico.expurgar(BASE + 5 * DIA) == 0
+
+    # Arquivo reescrito: um leitor novo vê o mesmo conteúdo
+    assert os.path.getsize(tmp_path / "a" / NOME_ARQUIVO) == historico.bytes_em_disco()
+    leitor = HistoricoAlertas(str(tmp_path))
+    assert leitor.eventos("a").tobytes() == eventos.tobytes()
+
+
+def test_leitor_recarrega_depois_da_reescrita(tmp_path):
+    historico = _historico(str(tmp_path))
+    leitor = HistoricoAlertas(str(tmp_path))
+    historico.expurgar(BASE + 5 * DIA)
+    historico.registrar("a", "solo", "Alerta", "Livre", BASE + 11 * DIA)
+    leitor.recarregar()
+    assert leitor.eventos("a").tobytes() == historico.eventos("a").tobytes()
@@ -0,0 +1,53 @@
+import datetime
+import os
+from datetime import timezone
+
+import numpy as np
+import pytest
+
+import batch_reports
+from readings import DTYPE_LEITURA
+from shared_store import SharedRingBuffer
+
+INICIO = datetime.datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class _GeradorFalso:
+    """Registra os jobs em vez de renderizar (sem pool nem kaleido)."""
+
+    jobs = None
+
+    def __init__(self, diretorio, processos=None):
+        self.processos = processos or 1
+
+    def aquecer(self):
+        pass
+
+    def gerar(self, jobs, fonte_blocos):
+        _GeradorFalso.jobs = list(jobs)
+        return {"processos": self.processos, "relatorios": len(jobs), "falhas": 0,
+                "duracao_seg": 0.0, "relatorios_por_minuto": None}
+
+    def desligar(self):
+        pass
+
+
+@pytest.fixture
+def segmento():
+    # Dois dias inteiros e meio dia, como o produtor publicaria
+    registros = np.zeros(6 * 24 * 2 + 72, dtype=DTYPE_LEITURA)
+    registros["timestamp"] = int(INICIO.timestamp()) + 600 * np.arange(len(registros))
+    produtor = SharedRingBuffer.criar(f"teste_lote_{os.getpid()}", capacidade=len(registros))
+    produtor.escrever(registros)
+    yield produtor
+    produtor.fechar()
+
+
+def test_cli_le_a_memoria_compartilhada_do_produtor(segmento, monkeypatch, tmp_path):
+    registros = batch_reports._dados_memoria_compartilhada(segmento.nome)
+    assert registros.dtype == DTYPE_LEITURA
+    assert batch_reports.dias_completos(registros) == (INICIO.date(), INICIO.date() + datetime.timedelta(days=1))
+
+    monkeypatch.setattr(batch_reports, "GeradorLote", _GeradorFalso)
+    batch_reports.main(["--memoria", segmento.nome, "--diretorio", str(tmp_path), "--periodos", "diario"])
+    assert [job.inicio for job in _GeradorFalso.jobs] == [INICIO.date() + datetime.timedelta(days=1)]
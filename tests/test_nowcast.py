@@ -0,0 +1,93 @@
+import datetime
+from datetime import timezone
+
+import numpy as np
+import pytest
+
+import nowcast
+import simulator
+from nowcast import _I, _Membros, _passo_chuva, _passo_umidade, estado_do_simulador
+from simulator import SensorSimulator
+from windows import JanelasAgregadas
+
+# Paridade entre o passo vetorizado do nowcast e o SensorSimulator: um membro,
+# os dois lados recebem os mesmos sorteios a cada passo e devem gerar a mesma
+# chuva e o mesmo estado do solo. Se alguém mudar uma regra ou constante de um
+# lado só, este teste quebra.
+
+INICIO = datetime.datetime(2024, 1, 1, tzinfo=timezone.utc)
+PASSOS = 2500
+
+
+class _Sorteios:
+    """Sorteios de um passo, servidos às duas APIs (random do simulador e Generator do nowcast)."""
+
+    def __init__(self, semente):
+        self._rng = np.random.default_rng(semente)
+        self.proximo_passo()
+
+    def proximo_passo(self):
+        self.u = float(self._rng.random())
+        self._inteiros = {}
+
+    def _inteiro(self, a, b):
+        if (a, b) not in self._inteiros:
+            self._inteiros[(a, b)] = int(self._rng.integers(a, b + 1))
+        return self._inteiros[(a, b)]
+
+    # API do módulo random (simulador)
+    def random(self, size=None):
+        return self.u if size is None else np.full(size, self.u)
+
+    def randint(self, a, b):
+        return self._inteiro(a, b)
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.u
+
+    # API do numpy Generator (nowcast): integers(low, high) exclui `high`
+    def integers(self, low, high, size=None):
+        return np.full(size, self._inteiro(low, high - 1))
+
+
+@pytest.mark.parametrize("semente", range(3))
+def test_passo_vetorizado_igual_ao_simulador(semente, monkeypatch):
+    sorteios = _Sorteios(semente)
+    monkeypatch.setattr(simulator, "random", sorteios)
+    sensor = SensorSimulator()
+    historico = []
+    membro = _Membros(estado_do_simulador(sensor, INICIO.timestamp()), 1)
+    estados_vistos = set()
+
+    for passo in range(1, PASSOS + 1):
+        sorteios.proximo_passo()
+        agora = INICIO + datetime.timedelta(minutes=10 * passo)
+        t = int(agora.timestamp())
+        anterior = historico[-1].precipitacao_acumulada_mm if historico else 0.0
+        leitura = sensor.gerar_novo_dado(anterior, agora, historico)
+
+        janelas = JanelasAgregadas([h.timestamp for h in historico], [h.pluviometria_mm for h in historico])
+        chuva = _passo_chuva(membro, t, janelas.soma([t], nowcast.JANELA_24H_SEG),
+                             janelas.soma([t], nowcast.JANELA_72H_SEG), sorteios)
+        _passo_umidade(membro, chuva)
+        historico.append(leitura)
+
+        assert chuva[0] == pytest.approx(leitura.pluviometria_mm, abs=1e-9), f"passo {passo}"
+        estado = estado_do_simulador(sensor, t)
+        for campo, valor in (("umidade_1m", membro.u1), ("umidade_2m", membro.u2), ("umidade_3m", membro.u3),
+                             ("agua_buffer_2m", membro.buffer_2m), ("agua_buffer_3m", membro.buffer_3m),
+                             ("acc_rain_since_dry_1m", membro.acc_desde_seco),
+                             ("intensidade_tempestade", membro.intensidade), ("ciclos_no_estado", membro.ciclos)):
+            assert valor[0] == pytest.approx(estado[_I[campo]], abs=1e-9), f"{campo} no passo {passo}"
+        assert membro.clima[0] == estado[_I["estado_clima"]]
+        assert membro.manter_saturacao[0] == bool(estado[_I["manter_saturacao_1m"]])
+        assert membro.limiar_atingido[0] == bool(estado[_I["threshold_1m_met"]])
+        assert membro.seca_forcada[0] == bool(estado[_I["modo_seca_forcada"]])
+        if sensor.modo_seca_forcada:
+            assert membro.fim_seca[0] == estado[_I["tempo_fim_seca"]]
+        estados_vistos.add((sensor.estado_clima, sensor.modo_seca_forcada, sensor.manter_saturacao_1m))
+
+    # A série passa pelos três estados do clima, pela seca forçada e pela saturação de S1
+    assert {clima for clima, _, _ in estados_vistos} == set(nowcast.ESTADOS_CLIMA)
+    assert any(seca for _, seca, _ in estados_vistos)
+    assert any(saturado for _, _, saturado in estados_vistos)
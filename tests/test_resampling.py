@@ -0,0 +1,36 @@
+import numpy as np
+
+from readings import ArmazemLeituras, Leitura, para_array
+from resampling import ordenar_e_deduplicar
+
+BASE = 1_700_000_000 - 1_700_000_000 % 600
+
+
+def _leitura(k, chuva=0.0):
+    return Leitura(BASE + k * 600, chuva, 0.0, 30.0, 25.0, 23.0)
+
+
+def test_separa_novas_atrasadas_e_repetidas():
+    armazenados = np.array([BASE + k * 600 for k in (0, 1, 3, 5)])
+    lote = [_leitura(6), _leitura(2, 1.0), _leitura(3), _leitura(4), _leitura(2, 2.0), _leitura(7), _leitura(-1)]
+    novas, atrasadas, descartadas = ordenar_e_deduplicar(lote, armazenados)
+    assert [l.timestamp for l in novas] == [BASE + 6 * 600, BASE + 7 * 600]
+    assert [l.timestamp for l in atrasadas] == [BASE - 600, BASE + 2 * 600, BASE + 4 * 600]
+    assert atrasadas[1].pluviometria_mm == 2.0  # Entre repetidas do lote, fica a última recebida
+    assert descartadas == 2  # A repetida do lote e a que já estava armazenada
+
+
+def test_sem_armazenamento_tudo_e_novo():
+    novas, atrasadas, descartadas = ordenar_e_deduplicar([_leitura(2), _leitura(1), _leitura(2)])
+    assert [l.timestamp for l in novas] == [BASE + 600, BASE + 1200]
+    assert atrasadas == [] and descartadas == 1
+
+
+def test_inserir_atrasadas_mantem_ordem_e_views_antigas():
+    armazem = ArmazemLeituras()
+    armazem.estender(para_array([_leitura(k) for k in (0, 1, 3, 5, 6)]))
+    antes = armazem.registros()
+    deslocadas = armazem.inserir(para_array([_leitura(2), _leitura(4)]))
+    assert deslocadas == 3  # 3, 5 e 6 ficaram depois da primeira inserida
+    assert list((armazem.registros()["timestamp"] - BASE) // 600) == [0, 1, 2, 3, 4, 5, 6]
+    assert list((antes["timestamp"] - BASE) // 600) == [0, 1, 3, 5, 6]
@@ -0,0 +1,31 @@
+import asyncio
+import threading
+import time
+
+from scheduler import Agendador, TarefaPeriodica
+
+
+def test_reiniciar_espera_execucao_em_thread_que_passa_do_timeout():
+    rodando = threading.Event()
+    preparado_durante_execucao = []
+
+    def lenta():
+        rodando.set()
+        time.sleep(0.5)
+        rodando.clear()
+
+    def preparar():
+        preparado_durante_execucao.append(rodando.is_set())
+
+    async def cenario():
+        agendador = Agendador()
+        agendador.registrar(TarefaPeriodica("lenta", lenta, 60, em_thread=True, atraso_inicial_seg=0))
+        agendador.iniciar()
+        while not rodando.is_set():
+            await asyncio.sleep(0.01)
+        await agendador.reiniciar(preparar=preparar, timeout=0.05)
+        await agendador.parar(timeout=0.05)
+        agendador.desligar()
+
+    asyncio.run(cenario())
+    assert preparado_durante_execucao == [False]
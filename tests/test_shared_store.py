@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+import pytest
+
+from readings import DTYPE_LEITURA
+from shared_store import SegmentoFechado, SharedRingBuffer
+
+
+def _registros(ks):
+    registros = np.zeros(len(ks), dtype=DTYPE_LEITURA)
+    registros["timestamp"] = ks
+    return registros
+
+
+@pytest.fixture
+def buffer():
+    produtor = SharedRingBuffer.criar(f"teste_ring_{os.getpid()}", capacidade=5)
+    yield produtor
+    produtor.fechar()
+
+
+def test_substituir_reescreve_o_fim_do_buffer(buffer):
+    buffer.escrever(_registros([1, 2, 4, 5]))
+    # Leitura atrasada 3: o trecho final mudou a partir dela (4 e 5 deslocadas)
+    buffer.escrever(_registros([3, 4, 5, 6]), substituir=2)
+    assert list(buffer.ler_registros()[1]["timestamp"]) == [2, 3, 4, 5, 6]
+
+
+def test_substituir_alem_do_conteudo_do_buffer(buffer):
+    buffer.escrever(_registros([10, 11, 12, 13, 14, 15, 16]))
+    # Atrasada anterior a tudo o que o buffer guarda: só o trecho que ainda cabe é reescrito
+    buffer.escrever(_registros([1, 10, 11, 12, 13, 14, 15, 16, 17]), substituir=7)
+    assert list(buffer.ler_registros()[1]["timestamp"]) == [13, 14, 15, 16, 17]
+    assert not buffer.substituido()
+
+
+def test_fechar_com_leitura_em_andamento(buffer):
+    buffer.escrever(_registros([1, 2, 3]))
+    leitor = SharedRingBuffer.anexar(buffer.nome)
+    # Outra thread no meio de uma leitura: fechar() não desmapeia o segmento debaixo dela
+    with leitor._views_abertas() as (_, _, registros):
+        leitor.fechar()
+        assert list(registros["timestamp"][:3]) == [1, 2, 3]
+    assert leitor._registros is None
+    # O buffer fechado pede reanexo e recusa leituras com um erro próprio
+    assert leitor.substituido()
+    with pytest.raises(SegmentoFechado):
+        leitor.ler_registros()
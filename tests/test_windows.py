@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import pytest
+
+from windows import INTERVALO_LEITURA_SEG, JANELA_CHUVA_72H_SEG, JanelasAgregadas, limites_janela, slot_de
+
+# Propriedades de JanelasAgregadas contra uma referência de força bruta:
+# máscara fim - D < t <= fim sobre a série inteira, soma/máximo com NaN ignorado
+# e slots contados pelo conjunto de slot_de() das leituras da janela.
+
+BASE = 1_700_000_000 - 1_700_000_000 % INTERVALO_LEITURA_SEG
+
+
+def _serie(rng, n, regular):
+    if regular:
+        # Na grade, com repetições (gateway que reenvia) e buracos
+        timestamps = BASE + np.sort(rng.choice(np.arange(80) * INTERVALO_LEITURA_SEG, n, replace=True))
+    else:
+        timestamps = BASE + np.sort(rng.integers(0, 80 * INTERVALO_LEITURA_SEG, n))
+    valores = rng.random(n) * 10
+    valores[rng.random(n) < 0.15] = np.nan
+    return timestamps, valores
+
+
+def _referencia(timestamps, valores, fim, duracao):
+    dentro = (timestamps > fim - duracao) & (timestamps <= fim)
+    janela = valores[dentro]
+    validos = janela[~np.isnan(janela)]
+    slots = len(set(slot_de(timestamps[dentro]).tolist()))
+    return validos.sum(), (validos.max() if len(validos) else math.nan), len(validos), slots
+
+
+@pytest.mark.parametrize("semente", range(20))
+def test_agregados_iguais_a_forca_bruta(semente):
+    rng = np.random.default_rng(semente)
+    for _ in range(150):
+        n = int(rng.integers(0, 60))
+        timestamps, valores = _serie(rng, n, regular=bool(rng.random() < 0.5))
+        janelas = JanelasAgregadas(timestamps, valores)
+        # Fins dentro, antes e depois da série (janelas vazias e fora do alcance)
+        fins = BASE + rng.integers(-10 * INTERVALO_LEITURA_SEG, 95 * INTERVALO_LEITURA_SEG, 8)
+        for duracao in (int(rng.integers(0, 40 * INTERVALO_LEITURA_SEG)),
+                        INTERVALO_LEITURA_SEG * int(rng.integers(1, 30))):
+            soma = janelas.soma(fins, duracao)
+            maximo = janelas.maximo(fins, duracao)
+            contagem = janelas.contagem(fins, duracao)
+            presentes, esperados = janelas.slots(fins, duracao)
+            for k, fim in enumerate(fins):
+                soma_ref, maximo_ref, contagem_ref, slots_ref = _referencia(timestamps, valores, fim, duracao)
+                assert soma[k] == pytest.approx(soma_ref, abs=1e-9)
+                assert contagem[k] == contagem_ref
+                if math.isnan(maximo_ref):
+                    assert math.isnan(maximo[k])
+                else:
+                    assert maximo[k] == maximo_ref
+                assert presentes[k] == slots_ref
+                assert esperados[k] == duracao // INTERVALO_LEITURA_SEG
+
+
+def test_serie_vazia():
+    janelas = JanelasAgregadas(np.zeros(0, dtype=np.int64), np.zeros(0))
+    assert janelas.soma(BASE, JANELA_CHUVA_72H_SEG) == 0.0
+    assert math.isnan(janelas.maximo(BASE, JANELA_CHUVA_72H_SEG))
+    resumo = janelas.resumo(BASE, JANELA_CHUVA_72H_SEG)
+    assert resumo["leituras"] == 0
+    assert resumo["slots_faltantes"] == JANELA_CHUVA_72H_SEG // INTERVALO_LEITURA_SEG
+
+
+def test_janela_72h_regular_tem_432_leituras():
+    # A borda inferior fica de fora: mesma regra do simulador (timestamp > agora - 72h)
+    timestamps = BASE + np.arange(1000) * INTERVALO_LEITURA_SEG + 7
+    inicio, fim = limites_janela(timestamps, timestamps[-1], JANELA_CHUVA_72H_SEG)
+    assert fim - inicio == 432
+    resumo = JanelasAgregadas(timestamps, np.ones(len(timestamps))).resumo(timestamps[-1], JANELA_CHUVA_72H_SEG)
+    assert resumo["soma"] == 432.0
+    assert resumo["slots_faltantes"] == 0
+
+
+def test_tamanhos_diferentes():
+    with pytest.raises(ValueError):
+        JanelasAgregadas(np.arange(3), np.zeros(2))
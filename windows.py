@@ -0,0 +1,120 @@
+import numpy as np
+
+# --- Janelas de Tempo Agregadas ---
+# Uma única definição de janela para todo o projeto: a janela de duração D que
+# termina em `fim` contém as leituras com  fim - D < timestamp <= fim.
+# Com leituras a cada 10 min, a janela de 72h até a leitura mais recente tem
+# exatamente 432 leituras (a mesma regra do simulador, que soma as leituras
+# com timestamp > agora - 72h).
+#
+# JanelasAgregadas guarda somas e contagens de prefixo: cada consulta são duas
+# buscas binárias nos timestamps (O(log n)) e uma subtração. Máximos usam uma
+# sparse table (montada na primeira consulta). Todas as consultas aceitam um
+# array de `fim` e respondem para todos de uma vez.
+#
+# Lacunas: cada leitura ocupa o slot de 10 min (k-1)*10min < t <= k*10min
+# (leituras repetidas no mesmo slot contam uma vez). Uma janela de D segundos
+# espera D // 10min slots; os que faltam são lacunas. Valores NaN ficam fora
+# da soma, do máximo e da contagem, mas o slot conta como presente.
+
+INTERVALO_LEITURA_SEG = 10 * 60
+JANELA_CHUVA_72H_SEG = 72 * 3600
+
+
+def limites_janela(timestamps, fim, duracao_seg):
+    """Índices [inicio, fim) das leituras com fim - duracao < timestamp <= fim (`fim` escalar ou array)."""
+    fim = np.asarray(fim)
+    return (np.searchsorted(timestamps, fim - duracao_seg, side="right"),
+            np.searchsorted(timestamps, fim, side="right"))
+
+
+def slot_de(timestamps, intervalo_seg=INTERVALO_LEITURA_SEG):
+    """Número do slot de cada timestamp: (k-1)*intervalo < t <= k*intervalo -> k."""
+    return -(-np.asarray(timestamps, dtype=np.int64) // intervalo_seg)
+
+
+class JanelasAgregadas:
+    """Soma, máximo, contagem e lacunas de uma série em janelas de tempo arbitrárias.
+
+    `timestamps` (epoch, em ordem não decrescente) e `valores` do mesmo tamanho.
+    """
+
+    def __init__(self, timestamps, valores, intervalo_seg=INTERVALO_LEITURA_SEG):
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.valores = np.asarray(valores, dtype=np.float64)
+        if self.timestamps.shape != self.valores.shape:
+            raise ValueError("timestamps e valores devem ter o mesmo tamanho.")
+        self.intervalo_seg = int(intervalo_seg)
+        presentes = ~np.isnan(self.valores)
+        self._soma = np.concatenate(([0.0], np.cumsum(np.where(presentes, self.valores, 0.0))))
+        self._contagem = np.concatenate(([0], np.cumsum(presentes)))
+        # Primeira leitura de cada slot (timestamps duplicados ou no mesmo slot contam uma vez)
+        slots = slot_de(self.timestamps, self.intervalo_seg)
+        self._abre_slot = np.concatenate(([True], slots[1:] != slots[:-1])) if len(slots) else np.zeros(0, bool)
+        self._slots = np.concatenate(([0], np.cumsum(self._abre_slot)))
+        self._tabela_max = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def indices(self, fim, duracao_seg):
+        return limites_janela(self.timestamps, fim, duracao_seg)
+
+    def soma(self, fim, duracao_seg):
+        inicio, fim = self.indices(fim, duracao_seg)
+        return self._soma[fim] - self._soma[inicio]
+
+    def contagem(self, fim, duracao_seg):
+        """Leituras com valor (não NaN) na janela."""
+        inicio, fim = self.indices(fim, duracao_seg)
+        return self._contagem[fim] - self._contagem[inicio]
+
+    def maximo(self, fim, duracao_seg):
+        """Maior valor na janela (NaN se a janela não tiver valores)."""
+        inicio, fim = self.indices(fim, duracao_seg)
+        tabela = self._tabela()
+        tamanho = fim - inicio
+        vazia = tamanho <= 0
+        nivel = np.where(vazia, 0, np.log2(np.maximum(tamanho, 1)).astype(np.int64))
+        ultimo = max(len(self) - 1, 0)
+        a = tabela[nivel, np.minimum(inicio, ultimo)] if len(self) else np.full(np.shape(inicio), np.nan)
+        b = tabela[nivel, np.clip(fim - (1 << nivel), 0, ultimo)] if len(self) else a
+        return np.where(vazia, np.nan, np.fmax(a, b))
+
+    def _tabela(self):
+        # tabela[k, i] = máximo de valores[i : i + 2**k] (NaN ignorado)
+        if self._tabela_max is None:
+            n = len(self)
+            linhas = [self.valores]
+            largura = 1
+            while 2 * largura <= n:
+                anterior = linhas[-1]
+                linha = anterior.copy()
+                linha[:n - largura] = np.fmax(anterior[:n - largura], anterior[largura:])
+                linhas.append(linha)
+                largura *= 2
+            self._tabela_max = np.vstack(linhas) if n else np.zeros((1, 0))
+        return self._tabela_max
+
+    def slots(self, fim, duracao_seg):
+        """(slots com leitura, slots esperados) na janela."""
+        inicio, fim_indice = self.indices(fim, duracao_seg)
+        presentes = self._slots[fim_indice] - self._slots[inicio]
+        if len(self):
+            # A primeira leitura da janela pode estar num slot aberto antes do início
+            primeira = np.minimum(inicio, len(self) - 1)
+            presentes = presentes + ((inicio < fim_indice) & ~self._abre_slot[primeira])
+        # Uma janela de D segundos comporta D // intervalo leituras regulares, em qualquer fase do relógio
+        return presentes, np.full(np.shape(presentes), duracao_seg // self.intervalo_seg)
+
+    def resumo(self, fim, duracao_seg):
+        """Agregados de uma janela (fim escalar) em tipos Python."""
+        presentes, esperados = self.slots(fim, duracao_seg)
+        maximo = float(self.maximo(fim, duracao_seg))
+        return {
+            "soma": float(self.soma(fim, duracao_seg)),
+            "maximo": None if np.isnan(maximo) else maximo,
+            "leituras": int(self.contagem(fim, duracao_seg)),
+            "slots_esperados": int(esperados),
+            "slots_faltantes": int(max(esperados - presentes, 0)),
+        }